@@ -1,3 +1,10 @@
 from django.contrib import admin
+from .models import Movie
 
-# Register your models here.
+
+@admin.register(Movie)
+class MovieAdmin(admin.ModelAdmin):
+    list_display = ('title', 'director', 'year', 'genre', 'rating', 'created_at')
+    list_filter = ('genre', 'year')
+    search_fields = ('title', 'director')
+    readonly_fields = ('file_id', 'updated_at')
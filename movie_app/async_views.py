@@ -0,0 +1,88 @@
+# Async версии представлений списка, экспорта, файлов хранилища и загрузки.
+# Используются под ASGI (MOVIE_ASYNC_VIEWS). Блокирующая работа - каталог,
+# stat и чтение файлов, рендеринг - идет в ограниченном пуле utils.aio, а не
+# в единственном потоке, через который Django выполняет sync представления
+# под ASGI, поэтому параллельные запросы не ждут друг друга.
+from calendar import timegm
+from functools import wraps
+from django.http import JsonResponse
+from django.urls import reverse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from . import views
+from .utils.aio import run_io, iterate_in_pool
+from .utils.files import alist_json_files
+
+
+def async_condition(etag_func=None, last_modified_func=None):
+    """
+    Аналог django.views.decorators.http.condition для async представлений.
+
+    etag_func и last_modified_func синхронные и могут обращаться к диску,
+    поэтому вызываются в пуле.
+    """
+    def decorator(view):
+        @wraps(view)
+        async def inner(request, *args, **kwargs):
+            def validators():
+                etag = etag_func(request, *args, **kwargs) if etag_func else None
+                last_modified = last_modified_func(request, *args, **kwargs) if last_modified_func else None
+                return (
+                    quote_etag(etag) if etag else None,
+                    timegm(last_modified.utctimetuple()) if last_modified else None,
+                )
+
+            etag, last_modified = await run_io(validators)
+            response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+            if response is None:
+                response = await view(request, *args, **kwargs)
+
+            if request.method in ('GET', 'HEAD'):
+                if last_modified and not response.has_header('Last-Modified'):
+                    response.headers['Last-Modified'] = http_date(last_modified)
+                if etag:
+                    response.headers.setdefault('ETag', etag)
+            return response
+        return inner
+    return decorator
+
+
+def _stream_in_pool(response):
+    # Чтение файла и сериализация следующего куска идут в пуле, цикл событий свободен
+    if getattr(response, 'streaming', False) and not response.is_async:
+        response.streaming_content = iterate_in_pool(response.streaming_content)
+    return response
+
+
+@async_condition(etag_func=views._list_etag, last_modified_func=views._list_last_modified)
+async def movie_list(request):
+    """Главная страница со списком фильмов"""
+    return await run_io(views.movie_list_response, request)
+
+
+async def json_file_list(request):
+    """Список JSON файлов хранилища (только метаданные)"""
+    # stat файлов выполняется кусками параллельно
+    files = await alist_json_files()
+    for file_info in files:
+        file_info['url'] = reverse('movie_app:view_json_file', args=[file_info['name']])
+    return JsonResponse({'files': files})
+
+
+@async_condition(etag_func=views._export_etag, last_modified_func=views._export_last_modified)
+async def export_all_movies(request):
+    """Экспорт всех фильмов в один JSON файл (потоково)"""
+    return _stream_in_pool(await run_io(views.export_response, request))
+
+
+@async_condition(etag_func=views._json_file_etag, last_modified_func=views._json_file_last_modified)
+async def view_json_file(request, filename):
+    """Просмотр содержимого JSON файла (потоково, с поддержкой Range и 304)"""
+    return _stream_in_pool(await run_io(views.json_file_response, request, filename))
+
+
+async def upload_json(request):
+    """Загрузка JSON файлов с импортом фильмов"""
+    # Разбор формы и копирование файла - блокирующий ввод-вывод
+    return await run_io(views.upload_json, request)
+
@@ -0,0 +1,6 @@
+"""
+Бенчмарки каталога: синтетические данные, микро-замеры помощников
+хранилища и нагрузочные прогоны представлений через тестовый клиент.
+
+Запуск и сравнение с базовым прогоном: python manage.py run_benchmarks
+"""
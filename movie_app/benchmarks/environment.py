@@ -0,0 +1,63 @@
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+from django.core.cache import caches
+from django.test.utils import override_settings
+from movie_app.utils import catalog as catalog_module
+from movie_app.utils import posters as posters_module
+from movie_app.utils import storage as storage_module
+from movie_app.utils.catalog import get_catalog
+from movie_app.utils.storage import get_storage
+from .generators import populate
+
+
+@contextmanager
+def benchmark_environment(backend, count, keep=False):
+    """
+    Изолированный каталог из count синтетических фильмов.
+
+    MEDIA_ROOT подменяется временным каталогом, кеш страниц очищается.
+    База данных должна быть тестовой (команда создает ее через
+    setup_databases), поэтому рабочие данные не затрагиваются. На выходе
+    общие для процесса хранилище, индекс и кеш постеров этого окружения
+    забываются.
+    """
+    media_root = tempfile.mkdtemp(prefix='movie-bench-')
+    try:
+        with override_settings(
+            MEDIA_ROOT=media_root,
+            MOVIE_STORAGE_BACKEND=backend,
+            MOVIE_STORAGE_OPTIONS={},
+            MOVIE_PROFILING=False,
+            MOVIE_IMPORT_MANIFEST_DIR=None,
+            MOVIE_POSTER_DIR=None,
+        ):
+            os.makedirs(os.path.join(media_root, 'json_files'))
+            _clear_cache()
+            storage = get_storage()
+            populate(storage, count)
+            try:
+                yield storage, get_catalog()
+            finally:
+                # Индекс и хранилище кешируются по расположению; база для
+                # database одна на все окружения, поэтому ее таблица очищается,
+                # а индекс и хранилище забываются
+                if hasattr(storage, 'objects'):
+                    storage.objects.all().delete()
+                catalog_module._catalogs.pop(storage.key, None)
+                for key, value in list(storage_module._storages.items()):
+                    if value is storage:
+                        del storage_module._storages[key]
+                for key in list(posters_module._poster_caches):
+                    if key[1].startswith(media_root):
+                        del posters_module._poster_caches[key]
+                _clear_cache()
+    finally:
+        if not keep:
+            shutil.rmtree(media_root, ignore_errors=True)
+
+
+def _clear_cache():
+    for cache in caches.all():
+        cache.clear()
@@ -0,0 +1,70 @@
+import json
+import random
+from datetime import timedelta
+from django.utils import timezone
+
+# GIF 1x1 для кеша постеров
+POSTER_IMAGE = (
+    b'GIF89a\x01\x00\x01\x00\x80\x00\x00\x00\x00\x00\xff\xff\xff!\xf9\x04\x01\x00\x00\x00\x00'
+    b',\x00\x00\x00\x00\x01\x00\x01\x00\x00\x02\x02D\x01\x00;'
+)
+GENRES = ('Драма', 'Комедия', 'Триллер', 'Фантастика', 'Боевик', 'Мелодрама', 'Ужасы', 'Документальный')
+
+
+def synthetic_movies(count, seed=0, prefix='Фильм'):
+    """
+    Воспроизводимые фильмы для бенчмарков: одинаковые count и seed дают
+    одинаковые записи. Даты добавления идут от текущего момента назад.
+    """
+    rng = random.Random(seed)
+    directors = [f'Режиссер {i}' for i in range(max(count // 50, 1))]
+    now = timezone.now()
+    for i in range(count):
+        yield {
+            'title': f'{prefix} {i}',
+            'director': rng.choice(directors),
+            'year': rng.randint(1920, 2025),
+            'genre': rng.choice(GENRES),
+            'duration': rng.randint(70, 200),
+            'rating': round(rng.uniform(1, 10), 1),
+            'description': 'Описание фильма. ' * rng.randint(2, 8),
+            'cast': 'Актер А, Актер Б, Актер В',
+            'image_url': '',
+            'created_at': str(now - timedelta(minutes=i)),
+        }
+
+
+def populate(storage, count, seed=0, batch_size=1000):
+    """Заполнить хранилище count синтетическими фильмами, вернуть их id"""
+    file_ids = []
+    batch = []
+    for movie in synthetic_movies(count, seed):
+        batch.append(movie)
+        if len(batch) >= batch_size:
+            file_ids += storage.save_many(batch)
+            batch = []
+    if batch:
+        file_ids += storage.save_many(batch)
+    return file_ids
+
+
+def write_upload_file(path, count, catalog_count=0, duplicate_ratio=0.2, seed=1, json_lines=False):
+    """
+    Записать файл загрузки из count фильмов, вернуть путь.
+
+    Доля duplicate_ratio - копии фильмов каталога, заполненного populate()
+    с catalog_count записями, остальные - новые. json_lines=True пишет
+    JSON Lines вместо массива.
+    """
+    rng = random.Random(seed)
+    duplicates = min(int(count * duplicate_ratio), catalog_count)
+    existing = list(synthetic_movies(catalog_count)) if duplicates else []
+    movies = rng.sample(existing, duplicates) + list(synthetic_movies(count - duplicates, seed, prefix='Новый фильм'))
+    rng.shuffle(movies)
+    with open(path, 'w', encoding='utf-8') as f:
+        if json_lines:
+            for movie in movies:
+                f.write(json.dumps(movie, ensure_ascii=False) + '\n')
+        else:
+            json.dump(movies, f, ensure_ascii=False, indent=2)
+    return path
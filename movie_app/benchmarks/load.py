@@ -0,0 +1,132 @@
+import json
+import os
+import time
+from django.conf import settings
+from django.test import Client
+from django.urls import get_resolver, reverse
+from movie_app.utils.files import list_json_files
+from movie_app.utils.jobs import get_job_queue
+from movie_app.utils.posters import get_poster_cache
+from .generators import POSTER_IMAGE, write_upload_file
+from .report import peak_memory, summarize
+
+# Сценарий на каждый URL приложения: (метод, адрес, данные) по контексту прогона.
+# POST только для неразрушающих запросов; адреса, которые меняют каталог,
+# не нагружаются
+SCENARIOS = {
+    'movie_list': lambda ctx: ('get', reverse('movie_app:movie_list'), {}),
+    'search_movies': lambda ctx: ('get', reverse('movie_app:search_movies'), {'q': 'Фильм 1', 'genre': 'Драма'}),
+    'catalog_stats': lambda ctx: ('get', reverse('movie_app:catalog_stats'), {'format': 'json', 'year_min': 1990}),
+    'add_movie': lambda ctx: ('get', reverse('movie_app:add_movie'), {}),
+    'upload_json': lambda ctx: ('get', reverse('movie_app:upload_json'), {}),
+    'import_status': lambda ctx: ('get', reverse('movie_app:import_status', args=[ctx['job_id']]), {'format': 'json'}),
+    'cancel_import': lambda ctx: ('get', reverse('movie_app:cancel_import', args=[ctx['job_id']]), {}),
+    'import_batches': lambda ctx: ('get', reverse('movie_app:import_batches'), {}),
+    'import_batch': lambda ctx: ('get', reverse('movie_app:import_batch', args=[ctx['job_id']]), {}),
+    'export_all_movies': lambda ctx: ('get', reverse('movie_app:export_all_movies'), {'format': 'compact'}),
+    'json_file_list': lambda ctx: ('get', reverse('movie_app:json_file_list'), {}),
+    'view_json_file': lambda ctx: ('get', reverse('movie_app:view_json_file', args=[ctx['filename']]), {}),
+    'bulk_movies': lambda ctx: ('post', reverse('movie_app:bulk_movies'), {
+        'data': json.dumps({'action': 'update', 'filter': {'genre': 'Драма'}, 'set': {'genre': 'Драма'}, 'dry_run': True}),
+        'content_type': 'application/json',
+    }),
+    'edit_movie': lambda ctx: ('get', reverse('movie_app:edit_movie', args=[ctx['file_id']]), {}),
+    'delete_movie': lambda ctx: ('get', reverse('movie_app:delete_movie', args=[ctx['file_id']]), {}),
+    'render_cache_stats': lambda ctx: ('get', reverse('movie_app:render_cache_stats'), {}),
+    'prometheus_metrics': lambda ctx: ('get', reverse('movie_app:prometheus_metrics'), {}),
+    'poster': lambda ctx: ('get', reverse('movie_app:poster', args=[ctx['poster']]), {}),
+}
+# Меняют данные - в нагрузочный прогон не входят
+DESTRUCTIVE = ('rollback_import',)
+
+
+def url_names():
+    """Имена всех URL приложения movie_app"""
+    resolver = get_resolver()
+    namespace = resolver.namespace_dict['movie_app'][1]
+    return sorted(pattern.name for pattern in namespace.url_patterns if pattern.name)
+
+
+def prepare_context(catalog, count, upload_count=100, timeout=60):
+    """
+    Данные для адресов с параметрами: фильм, файл загрузки, задача импорта, постер.
+
+    Файл загружается через /upload/, поэтому в прогон попадают реальная
+    задача импорта и ее партия в манифесте.
+    """
+    client = Client()
+    path = write_upload_file(os.path.join(settings.MEDIA_ROOT, 'bench_load_upload.json'), upload_count, count)
+    with open(path, 'rb') as f:
+        response = client.post(reverse('movie_app:upload_json'), {'json_file': f}, HTTP_ACCEPT='application/json')
+    os.remove(path)
+    job_id = response.json()['job_id']
+    deadline = time.monotonic() + timeout
+    while not get_job_queue().get(job_id).is_finished and time.monotonic() < deadline:
+        time.sleep(0.05)
+
+    catalog.refresh(force=True)
+    first = next(catalog.iter_movies(), None)
+    files = list_json_files()
+    poster_cache = get_poster_cache()
+    return {
+        'poster': poster_cache.store('bench://poster.gif', POSTER_IMAGE) if poster_cache else f'{"0" * 32}.gif',
+        'job_id': job_id,
+        'file_id': first['file_id'] if first else 'missing.json',
+        'filename': max(files, key=lambda x: x['size'])['name'] if files else 'missing.json',
+    }
+
+
+def run_load(catalog, count, requests=200, memory_requests=20, only=None):
+    """
+    Прогнать каждый URL приложения через тестовый клиент.
+
+    Для каждого адреса: перцентили задержки по requests запросам
+    (потоковые ответы читаются до конца), коды ответов, запросы в
+    секунду и пик памяти на memory_requests запросах. URL без сценария
+    и меняющие данные попадают в skipped, чтобы новые адреса не терялись.
+    """
+    context = prepare_context(catalog, count)
+    client = Client()
+    results = {}
+    skipped = {}
+    for name in url_names():
+        if only and name not in only:
+            continue
+        if name in DESTRUCTIVE:
+            skipped[name] = 'меняет данные'
+            continue
+        if name not in SCENARIOS:
+            skipped[name] = 'нет сценария'
+            continue
+        method, path, kwargs = SCENARIOS[name](context)
+
+        def request():
+            if method == 'post':
+                response = client.post(path, **kwargs)
+            else:
+                response = client.get(path, kwargs)
+            if response.streaming:
+                for _ in response.streaming_content:
+                    pass
+            return response
+
+        request()  # Прогрев: холодные кеши не входят в замер
+        durations = []
+        statuses = {}
+        started = time.perf_counter()
+        for _ in range(requests):
+            request_started = time.perf_counter()
+            response = request()
+            durations.append(time.perf_counter() - request_started)
+            statuses[str(response.status_code)] = statuses.get(str(response.status_code), 0) + 1
+        elapsed = time.perf_counter() - started
+
+        result = summarize(durations)
+        result['rps'] = round(requests / elapsed, 1) if elapsed else None
+        result['statuses'] = statuses
+        result['path'] = path
+        result['peak_kb'] = peak_memory(lambda: [request() for _ in range(memory_requests)])
+        results[name] = result
+    if skipped:
+        results['skipped'] = skipped
+    return results
@@ -0,0 +1,69 @@
+import os
+from django.conf import settings
+from movie_app.utils.catalog import MovieCatalog
+from movie_app.utils.export import EXPORT_FORMATS, iter_export
+from movie_app.utils.importer import MovieImporter
+from movie_app.utils.json_validator import iter_movies, validate_movie_json
+from .generators import synthetic_movies, write_upload_file
+from .report import measure
+
+
+def run_micro(storage, catalog, count, upload_count=None, repeat=5, save_count=100):
+    """
+    Микро-замеры помощников каталога на заполненном хранилище.
+
+    scan_cold - загрузка нового индекса с нуля, scan_warm - сверка
+    отметок без изменений, validate и dedup - проверка и поиск дубликатов
+    файла загрузки, save_one/save_batch - запись в хранилище (созданные
+    записи удаляются), export_* - сериализация всего каталога.
+    """
+    upload_count = upload_count or count
+    upload_path = write_upload_file(
+        os.path.join(settings.MEDIA_ROOT, f'bench_upload_{upload_count}.json'),
+        upload_count,
+        catalog_count=count,
+    )
+    upload_movies = list(iter_movies(upload_path))
+    created = []
+
+    def cleanup():
+        if created:
+            storage.delete_many(created)
+            created.clear()
+            catalog.refresh(force=True)
+
+    def save_one():
+        for movie in synthetic_movies(save_count, seed=2, prefix='Сохраненный фильм'):
+            created.append(storage.save(movie))
+
+    def save_batch():
+        created.extend(storage.save_many(list(synthetic_movies(save_count, seed=3, prefix='Пачка'))))
+
+    def dedup():
+        importer = MovieImporter(lambda batch: [None] * len(batch), catalog=catalog)
+        for movie in upload_movies:
+            importer.add(dict(movie))
+        importer.flush()
+
+    def export(export_format):
+        def run():
+            for _ in iter_export(catalog.iter_movies(), export_format):
+                pass
+        return run
+
+    catalog.refresh(force=True)
+    results = {
+        'scan_cold': measure(lambda: MovieCatalog(storage).refresh(force=True), repeat),
+        'scan_warm': measure(lambda: catalog.refresh(force=True), repeat),
+        'validate': measure(lambda: validate_movie_json(upload_path), repeat),
+        'dedup': measure(dedup, repeat),
+        'save_one': measure(save_one, repeat, setup=cleanup),
+        'save_batch': measure(save_batch, repeat, setup=cleanup),
+    }
+    cleanup()
+    for export_format in EXPORT_FORMATS:
+        results[f'export_{export_format}'] = measure(export(export_format), repeat)
+    results['save_one']['ops'] = results['save_batch']['ops'] = save_count
+    results['validate']['file_bytes'] = os.path.getsize(upload_path)
+    os.remove(upload_path)
+    return results
@@ -0,0 +1,126 @@
+import gc
+import json
+import math
+import time
+import platform
+import statistics
+import tracemalloc
+import django
+
+# Показатели, по которым прогон сравнивается с базовым
+COMPARED_METRICS = ('median', 'p50', 'p95', 'p99', 'peak_kb')
+# Разница меньше этих значений считается шумом (мс для времени, КБ для памяти)
+NOISE_FLOOR = {'peak_kb': 64}
+TIME_NOISE_FLOOR = 0.5
+
+
+def percentile(values, q):
+    """Перцентиль q (0-100) методом ближайшего ранга по отсортированному списку"""
+    if not values:
+        return None
+    rank = max(math.ceil(q / 100 * len(values)), 1)
+    return values[rank - 1]
+
+
+def summarize(durations):
+    """Сводка по длительностям в секундах: миллисекунды, перцентили"""
+    values = sorted(d * 1000 for d in durations)
+    return {
+        'runs': len(values),
+        'min': round(values[0], 3),
+        'median': round(statistics.median(values), 3),
+        'mean': round(statistics.fmean(values), 3),
+        'p50': round(percentile(values, 50), 3),
+        'p95': round(percentile(values, 95), 3),
+        'p99': round(percentile(values, 99), 3),
+        'max': round(values[-1], 3),
+    }
+
+
+def peak_memory(func):
+    """Пик выделенной Python памяти за один вызов func, КБ (tracemalloc)"""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return round(peak / 1024, 1)
+
+
+def measure(func, repeat=5, setup=None):
+    """
+    Замерить func repeat раз и отдельным прогоном - пик памяти.
+
+    Память меряется вне замеров времени: tracemalloc сильно замедляет код.
+    setup вызывается перед каждым прогоном и в замер не входит.
+    """
+    durations = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        started = time.perf_counter()
+        func()
+        durations.append(time.perf_counter() - started)
+    if setup is not None:
+        setup()
+    result = summarize(durations)
+    result['peak_kb'] = peak_memory(func)
+    return result
+
+
+def environment_info(**extra):
+    """Описание окружения прогона для файла результатов"""
+    info = {
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'platform': platform.platform(),
+    }
+    info.update(extra)
+    return info
+
+
+def save_results(results, path):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+
+
+def load_results(path):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def flatten(results):
+    """Плоский словарь 'размер/набор/замер/показатель' -> значение для сравнения"""
+    flat = {}
+    for size, suites in results.get('sizes', {}).items():
+        for suite, cases in suites.items():
+            for case, values in cases.items():
+                for metric in COMPARED_METRICS:
+                    if isinstance(values, dict) and isinstance(values.get(metric), (int, float)):
+                        flat[f'{size}/{suite}/{case}/{metric}'] = values[metric]
+    return flat
+
+
+def compare(baseline, current, threshold=0.1):
+    """
+    Сравнить прогон с базовым.
+
+    Возвращает списки (ключ, было, стало, отношение) для ухудшений и
+    улучшений больше threshold; мелкие абсолютные разницы - шум.
+    """
+    before, after = flatten(baseline), flatten(current)
+    regressions, improvements = [], []
+    for key in sorted(before.keys() & after.keys()):
+        old, new = before[key], after[key]
+        floor = NOISE_FLOOR.get(key.rsplit('/', 1)[1], TIME_NOISE_FLOOR)
+        if old <= 0 or abs(new - old) < floor:
+            continue
+        ratio = new / old
+        if ratio > 1 + threshold:
+            regressions.append((key, old, new, ratio))
+        elif ratio < 1 - threshold:
+            improvements.append((key, old, new, ratio))
+    return regressions, improvements
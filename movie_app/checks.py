@@ -0,0 +1,16 @@
+from django.conf import settings
+from django.core.checks import Warning, register
+from .utils import posters
+
+
+@register()
+def check_poster_thumbnails(app_configs, **kwargs):
+    """Кеш постеров включен, но Pillow для миниатюр не установлен"""
+    if not getattr(settings, 'MOVIE_POSTER_FETCHER', 'http') or posters.Image is not None:
+        return []
+    return [Warning(
+        'Pillow не установлен: миниатюры постеров не создаются, карточки загружают '
+        'постеры в полном размере с исходных адресов.',
+        hint='pip install -r requirements.txt или MOVIE_POSTER_FETCHER = None.',
+        id='movie_app.W001',
+    )]
@@ -51,5 +51,5 @@ class MovieForm(forms.Form):
 class JSONUploadForm(forms.Form):
     json_file = forms.FileField(
         label='Выберите JSON файл',
-        widget=forms.FileInput(attrs={'class': 'form-control', 'accept': '.json'})
+        widget=forms.FileInput(attrs={'class': 'form-control', 'accept': '.json,.jsonl,.ndjson'})
     )
\ No newline at end of file
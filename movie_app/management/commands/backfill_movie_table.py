@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+from movie_app.utils.storage import JSONFilesStorage, DatabaseStorage, default_location
+
+
+class Command(BaseCommand):
+    help = 'Заполнить таблицу Movie из файлов json_files/movie_<id>.json (повторный запуск обновляет записи)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--location', help='Каталог с файлами фильмов')
+        parser.add_argument('--database', default='default', help='Псевдоним базы данных')
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        source = JSONFilesStorage(options['location'] or default_location(JSONFilesStorage))
+        # Файлы уже есть, поэтому дублирование в JSON при заполнении не нужно
+        target = DatabaseStorage(options['database'], json_dual_write=False)
+
+        count = 0
+        batch = []
+        for file_id, movie in source.items():
+            batch.append((file_id, movie))
+            if len(batch) >= options['batch_size']:
+                count += self._flush(target, batch)
+                self.stdout.write(f'Загружено {count}...')
+        count += self._flush(target, batch)
+
+        self.stdout.write(self.style.SUCCESS(f'Загружено фильмов в таблицу: {count}'))
+
+    def _flush(self, target, batch):
+        if batch:
+            target.save_many([movie for _, movie in batch], file_ids=[file_id for file_id, _ in batch])
+        count = len(batch)
+        batch.clear()
+        return count
@@ -0,0 +1,58 @@
+import gc
+import json
+import tracemalloc
+from django.core.management.base import BaseCommand
+from movie_app.benchmarks import generators
+from movie_app.utils.records import MovieRecord
+
+
+def synthetic_movies(count, seed=0):
+    """Фильмы в JSON форме; каждый разбирается из своей строки, как при чтении файлов"""
+    for movie in generators.synthetic_movies(count, seed):
+        movie['version'] = 1
+        yield json.loads(json.dumps(movie, ensure_ascii=False))
+
+
+class Command(BaseCommand):
+    help = 'Сравнить память индекса каталога: словари фильмов против MovieRecord'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=100000)
+
+    def measure(self, build):
+        gc.collect()
+        tracemalloc.start()
+        items = build()
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del items
+        return current, peak
+
+    def handle(self, *args, **options):
+        count = options['count']
+
+        def build_dicts():
+            movies = {}
+            for i, movie in enumerate(synthetic_movies(count)):
+                movie['file_id'] = f'movie_{i:012x}.json'
+                movies[movie['file_id']] = movie
+            return movies
+
+        def build_records():
+            return {
+                f'movie_{i:012x}.json': MovieRecord.from_dict(movie, f'movie_{i:012x}.json')
+                for i, movie in enumerate(synthetic_movies(count))
+            }
+
+        results = {
+            'dict': self.measure(build_dicts),
+            'MovieRecord': self.measure(build_records),
+        }
+        self.stdout.write(f'Фильмов: {count}')
+        for name, (current, peak) in results.items():
+            self.stdout.write(
+                f'{name:>12}: {current / 2 ** 20:8.1f} МБ '
+                f'({current / count:6.0f} байт на фильм), пик {peak / 2 ** 20:8.1f} МБ'
+            )
+        ratio = results['MovieRecord'][0] / results['dict'][0]
+        self.stdout.write(self.style.SUCCESS(f'MovieRecord / dict: {ratio:.2f}'))
@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand, CommandError
+from movie_app.utils.storage import build_storage, STORAGE_ALIASES
+
+
+class Command(BaseCommand):
+    help = 'Перенести фильмы из одного хранилища в другое с сохранением id (например, files -> segment)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('source', help=f'Исходное хранилище: {", ".join(STORAGE_ALIASES)} или путь к классу')
+        parser.add_argument('target', help='Целевое хранилище')
+        parser.add_argument('--source-location', help='Каталог исходного хранилища')
+        parser.add_argument('--target-location', help='Каталог целевого хранилища')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--delete-source', action='store_true', help='Удалить перенесенные записи из исходного хранилища')
+        parser.add_argument('--compact', action='store_true', help='Сжать целевой журнал после переноса')
+
+    def handle(self, *args, **options):
+        try:
+            source = build_storage(options['source'], options['source_location'])
+            target = build_storage(options['target'], options['target_location'])
+        except ImportError as e:
+            raise CommandError(f'Неизвестное хранилище: {e}')
+
+        if source.key == target.key:
+            raise CommandError('Исходное и целевое хранилище совпадают')
+
+        copied = []
+        batch = []
+        for file_id, movie in source.items():
+            batch.append((file_id, movie))
+            if len(batch) >= options['batch_size']:
+                copied += self._flush(target, batch)
+                self.stdout.write(f'Перенесено {len(copied)}...')
+        copied += self._flush(target, batch)
+
+        if options['compact'] and hasattr(target, 'compact'):
+            target.compact()
+
+        if options['delete_source']:
+            for file_id in copied:
+                source.delete(file_id)
+
+        self.stdout.write(self.style.SUCCESS(f'Перенесено фильмов: {len(copied)}'))
+        self.stdout.write('Укажите MOVIE_STORAGE_BACKEND в settings.py, чтобы переключиться на новое хранилище')
+
+    def _flush(self, target, batch):
+        file_ids = [file_id for file_id, _ in batch]
+        target.save_many([movie for _, movie in batch], file_ids=file_ids)
+        batch.clear()
+        return file_ids
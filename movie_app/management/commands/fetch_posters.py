@@ -0,0 +1,49 @@
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from django.core.management.base import BaseCommand, CommandError
+from movie_app.utils.catalog import get_catalog
+from movie_app.utils.posters import PosterFetchError, get_poster_cache
+from movie_app.utils.render_cache import get_render_cache
+
+
+class Command(BaseCommand):
+    help = 'Загрузить миниатюры постеров фильмов каталога, которых еще нет в кеше, и освободить место сверх лимита'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4, help='Параллельных загрузок')
+        parser.add_argument('--evict-only', action='store_true', help='Только удалить постеры сверх лимита')
+
+    def handle(self, *args, **options):
+        cache = get_poster_cache()
+        if cache is None:
+            raise CommandError('Кеш постеров отключен: MOVIE_POSTER_FETCHER = None')
+
+        if not options['evict_only']:
+            file_ids = {}
+            for movie in get_catalog().iter_movies():
+                if movie.get('image_url'):
+                    file_ids.setdefault(movie['image_url'], []).append(movie['file_id'])
+
+            def fetch(url):
+                if cache.lookup(url):
+                    return 'cached'
+                try:
+                    cache.ensure(url)
+                except (PosterFetchError, OSError) as e:
+                    self.stderr.write(str(e))
+                    return 'failed'
+                return 'fetched'
+
+            with ThreadPoolExecutor(max_workers=max(options['workers'], 1)) as executor:
+                states = dict(zip(file_ids, executor.map(fetch, file_ids)))
+            fetched = [file_id for url, state in states.items() if state == 'fetched' for file_id in file_ids[url]]
+            get_render_cache().invalidate(fetched)
+            for state, count in sorted(Counter(states.values()).items()):
+                self.stdout.write(f'  {state}: {count}')
+
+        removed = cache.evict()
+        stats = cache.stats()
+        self.stdout.write(self.style.SUCCESS(
+            f"Постеров: {stats['count']}, {stats['bytes'] / 1024 / 1024:.1f} из "
+            f"{stats['max_bytes'] / 1024 / 1024:.1f} МБ, удалено: {removed}"
+        ))
@@ -0,0 +1,39 @@
+from collections import Counter
+from django.core.management.base import BaseCommand, CommandError
+from movie_app.utils.catalog import get_catalog
+from movie_app.utils.imports import get_import_manifest
+from movie_app.views import delete_movie_files
+
+
+class Command(BaseCommand):
+    help = 'Партии импорта из манифеста: список, сравнение с каталогом и откат'
+
+    def add_arguments(self, parser):
+        parser.add_argument('action', choices=('list', 'diff', 'rollback'))
+        parser.add_argument('batch_id', nargs='?', help='id партии (для diff и rollback)')
+        parser.add_argument('--force', action='store_true', help='Откатить и записи, измененные после импорта')
+
+    def handle(self, *args, **options):
+        manifest = get_import_manifest()
+        if options['action'] == 'list':
+            for meta in manifest.batches():
+                rolled_back = f", откачено {meta['rolled_back']}" if meta.get('rolled_back') else ''
+                self.stdout.write(
+                    f"{meta['id']}  {meta.get('created_at', '')}  {meta.get('status', '')}  "
+                    f"{meta.get('file', '')}: {meta['records']} записей{rolled_back}"
+                )
+            return
+
+        batch_id = options['batch_id']
+        if not batch_id or manifest.get(batch_id) is None:
+            raise CommandError(f'Партия импорта не найдена: {batch_id}')
+
+        if options['action'] == 'diff':
+            states = manifest.diff(batch_id, get_catalog())
+            for file_id, state in states.items():
+                if state != 'unchanged':
+                    self.stdout.write(f'{file_id}: {state}')
+        else:
+            states = manifest.rollback(batch_id, get_catalog(), delete_movie_files, force=options['force'])
+        for state, count in sorted(Counter(states.values()).items()):
+            self.stdout.write(f'  {state}: {count}')
@@ -0,0 +1,49 @@
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from movie_app.utils.catalog import MovieCatalog
+from movie_app.utils.loader import EXECUTORS, ParallelLoader
+from movie_app.utils.storage import JSONFilesStorage, build_storage
+
+
+class Command(BaseCommand):
+    help = 'Холодная загрузка каталога с отчетом по фазам (список, чтение, разбор, слияние, индекс)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, help='Размер пула (по умолчанию из MOVIE_PARALLEL_LOADER)')
+        parser.add_argument('--shard-size', type=int, help='Файлов в одном куске')
+        parser.add_argument('--executor', choices=sorted(EXECUTORS), help='Потоки или процессы')
+        parser.add_argument('--sequential', action='store_true', help='Для сравнения: чтение файлов по одному')
+
+    def handle(self, *args, **options):
+        storage_options = dict(getattr(settings, 'MOVIE_STORAGE_OPTIONS', {}))
+        storage = build_storage(
+            getattr(settings, 'MOVIE_STORAGE_BACKEND', 'files'),
+            storage_options.pop('location', None),
+            **storage_options,
+        )
+
+        if isinstance(storage, JSONFilesStorage):
+            loader_options = dict(getattr(settings, 'MOVIE_PARALLEL_LOADER', {}))
+            for key in ('workers', 'shard_size', 'executor'):
+                if options[key] is not None:
+                    loader_options[key] = options[key]
+            storage.loader = ParallelLoader(**loader_options)
+            storage.parallel_load_min = float('inf') if options['sequential'] else 0
+
+        # Новый каталог: загрузка всегда холодная, общий индекс процесса не трогаем
+        catalog = MovieCatalog(storage)
+        started = time.perf_counter()
+        catalog.refresh(force=True)
+        total = time.perf_counter() - started
+
+        self.stdout.write(f'Хранилище: {type(storage).__name__} {storage.location}')
+        self.stdout.write(f'Загружено фильмов: {len(catalog)} за {total:.3f} с')
+        report = catalog.load_report
+        if report is None:
+            return
+        for key, value in report.items():
+            if key != 'phases':
+                self.stdout.write(f'  {key}: {value}')
+        for phase, seconds in report['phases'].items():
+            self.stdout.write(f'  {phase:>12}: {seconds:.3f} с')
@@ -0,0 +1,89 @@
+import time
+import asyncio
+import statistics
+from asgiref.sync import sync_to_async
+from django.core.management.base import BaseCommand, CommandError
+from django.test import AsyncRequestFactory
+from movie_app import views, async_views
+from movie_app.utils.files import list_json_files
+
+VIEWS = {
+    'list': ('movie_list', lambda options: ('/', (), {})),
+    'export': ('export_all_movies', lambda options: ('/export/', (), {})),
+    'files': ('json_file_list', lambda options: ('/json/', (), {})),
+    'json': ('view_json_file', lambda options: (f"/json/{options['filename']}/", (options['filename'],), {})),
+}
+
+
+class Command(BaseCommand):
+    help = 'Нагрузочный тест: sync и async версии представления при параллельных клиентах (как под ASGI)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--view', choices=sorted(VIEWS), default='list')
+        parser.add_argument('--clients', type=int, default=32, help='Число одновременных клиентов')
+        parser.add_argument('--requests', type=int, default=400, help='Всего запросов на каждый режим')
+        parser.add_argument('--filename', help='Файл для --view json (по умолчанию самый большой)')
+
+    def handle(self, *args, **options):
+        if options['view'] == 'json' and not options['filename']:
+            files = list_json_files()
+            if not files:
+                raise CommandError('Нет JSON файлов для --view json')
+            options['filename'] = max(files, key=lambda x: x['size'])['name']
+
+        name, build = VIEWS[options['view']]
+        path, view_args, view_kwargs = build(options)
+        modes = {
+            # Так Django вызывает sync представление под ASGI: через один поток
+            'sync': sync_to_async(getattr(views, name)),
+            'async': getattr(async_views, name),
+        }
+
+        self.stdout.write(f"{path}: {options['clients']} клиентов, {options['requests']} запросов")
+        results = {}
+        for mode, view in modes.items():
+            results[mode] = asyncio.run(self._run(view, path, view_args, view_kwargs, options))
+            self._report(mode, results[mode])
+
+        speedup = results['async']['rps'] / results['sync']['rps'] if results['sync']['rps'] else 0
+        self.stdout.write(self.style.SUCCESS(f'async / sync: {speedup:.2f}x'))
+
+    async def _run(self, view, path, view_args, view_kwargs, options):
+        factory = AsyncRequestFactory()
+        queue = asyncio.Queue()
+        for _ in range(options['requests']):
+            queue.put_nowait(None)
+        latencies = []
+        statuses = {}
+
+        async def client():
+            while not queue.empty():
+                queue.get_nowait()
+                started = time.perf_counter()
+                response = await view(factory.get(path), *view_args, **view_kwargs)
+                if response.streaming:
+                    async for _ in response:
+                        pass
+                latencies.append(time.perf_counter() - started)
+                statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+        # Прогрев: холодная загрузка каталога не входит в замер
+        await view(factory.get(path), *view_args, **view_kwargs)
+        started = time.perf_counter()
+        await asyncio.gather(*(client() for _ in range(options['clients'])))
+        elapsed = time.perf_counter() - started
+
+        latencies.sort()
+        return {
+            'rps': len(latencies) / elapsed if elapsed else 0,
+            'p50': statistics.median(latencies),
+            'p95': latencies[int(len(latencies) * 0.95) - 1],
+            'statuses': statuses,
+        }
+
+    def _report(self, mode, result):
+        self.stdout.write(
+            f"{mode:>5}: {result['rps']:8.1f} запр/с, "
+            f"p50 {result['p50'] * 1000:7.1f} мс, p95 {result['p95'] * 1000:7.1f} мс, "
+            f"ответы {result['statuses']}"
+        )
@@ -0,0 +1,113 @@
+import os
+import resource
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import setup_databases, setup_test_environment, teardown_databases, teardown_test_environment
+from movie_app.benchmarks.environment import benchmark_environment
+from movie_app.benchmarks.load import run_load
+from movie_app.benchmarks.micro import run_micro
+from movie_app.benchmarks.report import compare, environment_info, load_results, save_results
+from movie_app.utils.loader import JSON_BACKEND
+from movie_app.utils.storage import STORAGE_ALIASES
+
+
+class Command(BaseCommand):
+    help = (
+        'Бенчмарки на синтетическом каталоге: микро-замеры (scan, dedup, validate, save, export) '
+        'и нагрузка на каждый URL; результат в JSON и сравнение с базовым прогоном'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[1000], help='Размеры каталога, например 1000 10000 100000')
+        parser.add_argument('--suite', choices=('all', 'micro', 'load'), default='all')
+        parser.add_argument('--backend', choices=sorted(STORAGE_ALIASES), default='files', help='Хранилище каталога')
+        parser.add_argument('--repeat', type=int, default=5, help='Повторов каждого микро-замера')
+        parser.add_argument('--requests', type=int, default=200, help='Запросов на каждый URL')
+        parser.add_argument('--upload-count', type=int, help='Фильмов в файле загрузки (по умолчанию как в каталоге)')
+        parser.add_argument('--url', action='append', dest='urls', help='Нагружать только этот URL (имя), можно несколько')
+        parser.add_argument('--output', help='Файл результатов (по умолчанию benchmark_results/<время>.json)')
+        parser.add_argument('--baseline', help='Файл базового прогона для сравнения')
+        parser.add_argument('--threshold', type=float, default=0.1, help='Допустимое ухудшение, доля (0.1 = 10%%)')
+        parser.add_argument('--fail-on-regression', action='store_true', help='Код ошибки при ухудшениях')
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options['baseline']:
+            try:
+                baseline = load_results(options['baseline'])
+            except (OSError, ValueError) as e:
+                raise CommandError(f'Не удалось прочитать базовый прогон: {e}')
+
+        results = {
+            'environment': environment_info(
+                backend=options['backend'],
+                json_backend=JSON_BACKEND,
+                async_views=getattr(settings, 'MOVIE_ASYNC_VIEWS', False),
+                repeat=options['repeat'],
+                requests=options['requests'],
+            ),
+            'sizes': {},
+        }
+
+        # Тестовая база и окружение: рабочие данные и настройки хостов не трогаются
+        setup_test_environment()
+        old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            for size in options['sizes']:
+                results['sizes'][str(size)] = self._run_size(size, options)
+        finally:
+            teardown_databases(old_config, verbosity=0)
+            teardown_test_environment()
+        results['environment']['max_rss_kb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+        output = options['output'] or os.path.join(
+            settings.BASE_DIR, 'benchmark_results', f"{time.strftime('%Y%m%d-%H%M%S')}.json"
+        )
+        os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+        save_results(results, output)
+        self.stdout.write(self.style.SUCCESS(f'Результаты: {output}'))
+
+        if baseline is not None:
+            self._compare(baseline, results, options)
+
+    def _run_size(self, size, options):
+        self.stdout.write(f"Каталог {size} фильмов ({options['backend']})...")
+        started = time.perf_counter()
+        size_results = {}
+        with benchmark_environment(options['backend'], size) as (storage, catalog):
+            self.stdout.write(f'  заполнение: {time.perf_counter() - started:.1f} с')
+            if options['suite'] in ('all', 'micro'):
+                size_results['micro'] = run_micro(
+                    storage, catalog, size,
+                    upload_count=options['upload_count'],
+                    repeat=options['repeat'],
+                )
+                self._report('micro', size_results['micro'])
+            if options['suite'] in ('all', 'load'):
+                size_results['load'] = run_load(catalog, size, requests=options['requests'], only=options['urls'])
+                self._report('load', size_results['load'])
+        return size_results
+
+    def _report(self, suite, cases):
+        for name, values in cases.items():
+            if name == 'skipped':
+                for skipped, reason in values.items():
+                    self.stdout.write(f'  {suite:>5} {skipped:<22} пропущен: {reason}')
+                continue
+            extra = f", {values['rps']} запр/с, ответы {values['statuses']}" if 'rps' in values else ''
+            self.stdout.write(
+                f"  {suite:>5} {name:<22} p50 {values['p50']:9.2f} мс  p95 {values['p95']:9.2f} мс  "
+                f"p99 {values['p99']:9.2f} мс  пик {values['peak_kb']:9.1f} КБ{extra}"
+            )
+
+    def _compare(self, baseline, results, options):
+        regressions, improvements = compare(baseline, results, options['threshold'])
+        for key, old, new, ratio in improvements:
+            self.stdout.write(self.style.SUCCESS(f'  лучше  {key}: {old} -> {new} ({ratio:.2f}x)'))
+        for key, old, new, ratio in regressions:
+            self.stdout.write(self.style.ERROR(f'  хуже   {key}: {old} -> {new} ({ratio:.2f}x)'))
+        if not regressions:
+            self.stdout.write(self.style.SUCCESS('Ухудшений относительно базового прогона нет'))
+        elif options['fail_on_regression']:
+            raise CommandError(f'Ухудшений: {len(regressions)}')
@@ -0,0 +1,125 @@
+import io
+import os
+import re
+import time
+import uuid
+import random
+import pstats
+import cProfile
+import threading
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseBadRequest
+from .utils import metrics
+from .utils.metrics import get_registry, server_timing
+
+_unsafe_name_re = re.compile(r'[^\w.-]')
+# cProfile не умеет профилировать несколько запросов одного потока сразу
+_profile_lock = threading.Lock()
+
+
+class RequestMetricsMiddleware:
+    """
+    Метрики каждого запроса: время, открытые файлы, прочитанные байты,
+    разбор JSON, рендеринг шаблонов, попадания в кеш.
+
+    Хуки хранилища, шаблонов и кеша пишут в объект метрик из contextvar
+    запроса; итог уходит в заголовок Server-Timing и в реестр процесса,
+    который отдает /metrics/. Для потоковых ответов учитывается время
+    до отдачи заголовков.
+
+    При MOVIE_PROFILING запрос с ?profile=1 выполняется под cProfile и
+    вместо ответа возвращается отчет pstats (?profile_sort=, ?profile_limit=).
+    MOVIE_PROFILE_SAMPLE_RATE - доля запросов, профиль которых сохраняется
+    в MOVIE_PROFILE_DIR. Одновременно профилируется не больше одного запроса.
+    Профилируются только sync (WSGI) запросы: в async цепочке cProfile видит
+    лишь поток цикла событий, поэтому ?profile=1 там отклоняется с 400.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.profiling = getattr(settings, 'MOVIE_PROFILING', False)
+        self.sample_rate = getattr(settings, 'MOVIE_PROFILE_SAMPLE_RATE', 0)
+        self.profile_dir = getattr(settings, 'MOVIE_PROFILE_DIR', None) or os.path.join(settings.MEDIA_ROOT, 'profiles')
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        request_metrics, token = metrics.start()
+        profiler = self._start_profile(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            self._stop_profile(profiler)
+            metrics.finish(token)
+        return self.process_response(request, response, request_metrics, profiler)
+
+    async def __acall__(self, request):
+        request_metrics, token = metrics.start()
+        try:
+            if self.profiling and request.GET.get('profile') == '1':
+                # Профиль потока цикла событий не содержит работы в пуле run_io
+                # и только ввел бы в заблуждение
+                response = HttpResponseBadRequest(
+                    'Профилирование ?profile=1 доступно только для синхронных (WSGI) запросов'
+                )
+            else:
+                response = await self.get_response(request)
+        finally:
+            metrics.finish(token)
+        return self.process_response(request, response, request_metrics)
+
+    def _start_profile(self, request):
+        if not self.profiling:
+            return None
+        if request.GET.get('profile') == '1':
+            mode = 'response'
+        elif self.sample_rate and random.random() < self.sample_rate:
+            mode = 'sample'
+        else:
+            return None
+        if not _profile_lock.acquire(blocking=False):
+            return None
+        profiler = cProfile.Profile()
+        profiler.mode = mode
+        profiler.enable()
+        return profiler
+
+    def _stop_profile(self, profiler):
+        if profiler is not None:
+            profiler.disable()
+            _profile_lock.release()
+
+    def process_response(self, request, response, request_metrics, profiler=None):
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match else 'unresolved'
+        if profiler is not None:
+            response = self._profile_response(request, response, profiler, view)
+        get_registry().observe(view, request.method, response.status_code, request_metrics)
+        response['Server-Timing'] = server_timing(request_metrics)
+        return response
+
+    def _profile_response(self, request, response, profiler, view):
+        if profiler.mode == 'sample':
+            os.makedirs(self.profile_dir, exist_ok=True)
+            view_name = _unsafe_name_re.sub('_', view)
+            name = f"{time.strftime('%Y%m%d-%H%M%S')}-{view_name}-{uuid.uuid4().hex[:6]}.prof"
+            profiler.dump_stats(os.path.join(self.profile_dir, name))
+            return response
+
+        sort = request.GET.get('profile_sort', 'cumulative')
+        try:
+            limit = int(request.GET.get('profile_limit', 40))
+        except ValueError:
+            limit = 40
+        output = io.StringIO()
+        try:
+            pstats.Stats(profiler, stream=output).sort_stats(sort).print_stats(limit)
+        except KeyError:
+            return HttpResponseBadRequest(f'Неизвестная сортировка профиля: {sort}')
+        return HttpResponse(output.getvalue(), content_type='text/plain; charset=utf-8')
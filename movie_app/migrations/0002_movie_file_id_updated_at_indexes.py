@@ -0,0 +1,67 @@
+# Generated by Django 5.2.7 on 2026-10-18 05:54
+
+import uuid
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def fill_file_ids(apps, schema_editor):
+    Movie = apps.get_model('movie_app', 'Movie')
+    for movie in Movie.objects.filter(file_id__isnull=True).only('id'):
+        movie.file_id = f"movie_{uuid.uuid4().hex[:12]}.json"
+        movie.save(update_fields=['file_id'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movie_app', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='movie',
+            options={'ordering': ['-created_at']},
+        ),
+        migrations.AddField(
+            model_name='movie',
+            name='file_id',
+            field=models.CharField(max_length=64, null=True, verbose_name='Идентификатор'),
+        ),
+        migrations.RunPython(fill_file_ids, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='movie',
+            name='file_id',
+            field=models.CharField(max_length=64, unique=True, verbose_name='Идентификатор'),
+        ),
+        migrations.AddField(
+            model_name='movie',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.AlterField(
+            model_name='movie',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddIndex(
+            model_name='movie',
+            index=models.Index(fields=['created_at'], name='movie_app_m_created_714b85_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='movie',
+            index=models.Index(fields=['title', 'director', 'year'], name='movie_app_m_title_88aef4_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='movie',
+            index=models.Index(fields=['genre'], name='movie_app_m_genre_a113ba_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='movie',
+            index=models.Index(fields=['year'], name='movie_app_m_year_3d4981_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='movie',
+            index=models.Index(fields=['rating'], name='movie_app_m_rating_7fd168_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-18 05:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movie_app', '0002_movie_file_id_updated_at_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='movie',
+            name='version',
+            field=models.PositiveIntegerField(default=1),
+        ),
+    ]
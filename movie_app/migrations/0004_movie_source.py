@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-18 06:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movie_app', '0003_movie_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='movie',
+            name='source',
+            field=models.CharField(blank=True, db_index=True, default='', max_length=255, verbose_name='Загруженный файл'),
+        ),
+    ]
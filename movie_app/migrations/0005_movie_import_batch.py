@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-18 06:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movie_app', '0004_movie_source'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='movie',
+            name='import_batch',
+            field=models.CharField(blank=True, db_index=True, default='', max_length=32, verbose_name='Партия импорта'),
+        ),
+    ]
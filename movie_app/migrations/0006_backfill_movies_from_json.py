@@ -0,0 +1,47 @@
+import os
+from django.conf import settings
+from django.db import migrations
+
+BATCH_SIZE = 500
+
+
+def backfill_from_json_files(apps, schema_editor):
+    """
+    Перенести фильмы из MEDIA_ROOT/json_files в таблицу Movie.
+
+    Таблица - основное хранилище, поэтому фильмы, которые до перехода жили
+    только в файлах, не должны пропасть из каталога. Записи, которые уже
+    есть в таблице, и файлы, не прошедшие проверку полей, пропускаются.
+    """
+    from movie_app.utils.json_validator import validate_movie
+    from movie_app.utils.storage import DatabaseStorage, JSONFilesStorage
+
+    location = os.path.join(settings.MEDIA_ROOT, 'json_files')
+    if not os.path.isdir(location):
+        return
+    Movie = apps.get_model('movie_app', 'Movie')
+    objects = Movie.objects.using(schema_editor.connection.alias)
+    existing = set(objects.values_list('file_id', flat=True))
+
+    batch = []
+    for file_id, movie in JSONFilesStorage(location, fsync='none').items():
+        if file_id in existing or not validate_movie(movie, 0)[0]:
+            continue
+        fields = DatabaseStorage._normalize_fields({field: movie.get(field) for field in DatabaseStorage.fields})
+        fields['version'] = fields['version'] or 1
+        batch.append(Movie(file_id=file_id, **fields))
+        if len(batch) >= BATCH_SIZE:
+            objects.bulk_create(batch)
+            batch = []
+    objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movie_app', '0005_movie_import_batch'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_from_json_files, migrations.RunPython.noop),
+    ]
@@ -1 +1,34 @@
-# FEFEFE
+from django.db import models
+from django.utils import timezone
+
+
+class Movie(models.Model):
+    """Фильм каталога"""
+    file_id = models.CharField(max_length=64, unique=True, verbose_name='Идентификатор')
+    title = models.CharField(max_length=200, verbose_name='Название фильма')
+    director = models.CharField(max_length=100, verbose_name='Режиссер')
+    year = models.IntegerField(verbose_name='Год выпуска')
+    genre = models.CharField(max_length=100, verbose_name='Жанр')
+    duration = models.IntegerField(verbose_name='Продолжительность (мин)')
+    rating = models.FloatField(verbose_name='Рейтинг')
+    description = models.TextField(verbose_name='Описание')
+    cast = models.TextField(verbose_name='Актерский состав')
+    image_url = models.URLField(blank=True, null=True, verbose_name='Ссылка на постер')
+    created_at = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+    version = models.PositiveIntegerField(default=1)
+    source = models.CharField(max_length=255, blank=True, default='', db_index=True, verbose_name='Загруженный файл')
+    import_batch = models.CharField(max_length=32, blank=True, default='', db_index=True, verbose_name='Партия импорта')
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['created_at']),
+            models.Index(fields=['title', 'director', 'year']),
+            models.Index(fields=['genre']),
+            models.Index(fields=['year']),
+            models.Index(fields=['rating']),
+        ]
+
+    def __str__(self):
+        return f'{self.title} ({self.year})'
@@ -0,0 +1,10 @@
+from django import template
+from movie_app.utils.posters import poster_url as _poster_url
+
+register = template.Library()
+
+
+@register.filter
+def poster_url(movie):
+    """Локальная миниатюра постера фильма, пока ее нет - исходный image_url"""
+    return _poster_url(movie) or movie.get('image_url')
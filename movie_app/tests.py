@@ -1,3 +1,1534 @@
-from django.test import TestCase
+import io
+import gzip
+import os
+import json
+import re
+import shutil
+import tempfile
+import threading
+import http.server
+import importlib
+from unittest import mock
+from django.apps import apps as django_apps
+from django.core.cache import caches
+from django.db import connection
+from django.test import AsyncClient, RequestFactory, TestCase, override_settings
+from django.urls import reverse
+from movie_app.utils import catalog as catalog_module
+from movie_app.utils import posters as posters_module
+from movie_app.utils import stats as stats_module
+from movie_app.utils import storage as storage_module
+from movie_app.utils.aio import run_io
+from movie_app.utils.catalog import MovieCatalog, encode_cursor, get_catalog
+from movie_app.utils.importer import IMPORTED, INVALID
+from movie_app.utils.imports import DELETED, MODIFIED, ROLLED_BACK, UNCHANGED, get_import_manifest
+from movie_app.utils.jobs import CANCELLED, DONE, ERROR, ImportJob, ImportJobQueue, run_import_job
+from movie_app.utils.filters import MovieFilter
+from movie_app.utils.json_validator import CHUNK_SIZE, iter_json_array
+from movie_app.utils.search import SearchIndex, get_search_index, search_catalog
+from movie_app.utils.records import MovieRecord
+from movie_app.utils.render_cache import RenderCache, get_render_cache
+from movie_app.utils.posters import HTTPFetcher, LocalFetcher, PosterCache, PosterFetchError, POSTER_NAME_RE, get_poster_cache
+from movie_app.utils.stats import CatalogStats, get_catalog_stats
+from movie_app.utils.storage import DatabaseStorage, SegmentLogStorage, VersionConflict, get_storage
+from movie_app.utils.writes import FSYNC_MODES, WriteBatcher, get_fsync_mode
+from movie_app.views import delete_movie_file, delete_movie_files, get_expected_version, save_movies_to_json, update_movie_in_json
 
-# Create your tests here.
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+
+def movie(title='Фильм', **fields):
+    """Минимальная запись фильма, проходящая проверку формы"""
+    data = {
+        'title': title,
+        'director': 'Режиссер',
+        'year': 2000,
+        'genre': 'Драма',
+        'duration': 100,
+        'rating': 7.5,
+        'description': 'Описание',
+        'cast': 'Актер',
+        'image_url': '',
+    }
+    data.update(fields)
+    return data
+
+
+def image_bytes(size=(1200, 1800), color=(200, 30, 30), image_format='PNG'):
+    image = Image.new('RGB', size, color)
+    output = io.BytesIO()
+    image.save(output, image_format)
+    return output.getvalue()
+
+
+class IsolatedMediaMixin:
+    """
+    Временный MEDIA_ROOT и свежие общие для процесса хранилище, индекс и кеши.
+
+    Хранилища, индексы и кеш постеров кешируются по расположению, поэтому
+    они забываются до и после каждого теста.
+    """
+
+    backend = 'files'
+    settings_overrides = {}
+
+    def setUp(self):
+        super().setUp()
+        self.media_root = tempfile.mkdtemp(prefix='movie-test-')
+        self.addCleanup(shutil.rmtree, self.media_root, True)
+        os.makedirs(os.path.join(self.media_root, 'json_files'))
+        overrides = {
+            'MEDIA_ROOT': self.media_root,
+            'MOVIE_STORAGE_BACKEND': self.backend,
+            'MOVIE_STORAGE_OPTIONS': {},
+            'MOVIE_JSON_DUAL_WRITE': False,
+            'MOVIE_IMPORT_MANIFEST_DIR': None,
+            'MOVIE_POSTER_FETCHER': None,
+            'MOVIE_POSTER_DIR': None,
+            'MOVIE_PROFILING': False,
+            'MOVIE_FSYNC': 'none',
+        }
+        overrides.update(self.settings_overrides)
+        settings_override = override_settings(**overrides)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self._forget()
+        self.addCleanup(self._forget)
+
+    def _forget(self):
+        storage_module._storages.clear()
+        catalog_module._catalogs.clear()
+        posters_module._poster_caches.clear()
+        for cache in caches.all():
+            cache.clear()
+
+
+class CountingFetcher(LocalFetcher):
+    def __init__(self, root):
+        super().__init__(root)
+        self.urls = []
+
+    def fetch(self, url):
+        self.urls.append(url)
+        return super().fetch(url)
+
+
+@mock.patch.object(posters_module, 'get_render_cache')
+class PosterCacheTests(IsolatedMediaMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        if Image is None:
+            self.skipTest('Pillow не установлен')
+        self.source = os.path.join(self.media_root, 'source')
+        os.makedirs(self.source)
+        self.fetcher = CountingFetcher(self.source)
+        self.cache = PosterCache(os.path.join(self.media_root, 'posters'), self.fetcher, workers=0)
+
+    def add_source(self, name, data=None):
+        with open(os.path.join(self.source, name), 'wb') as f:
+            f.write(data if data is not None else image_bytes())
+        return f'https://posters.example.com/img/{name}'
+
+    def test_ensure_stores_bounded_jpeg_once(self, get_render_cache):
+        url = self.add_source('big.png')
+        name = self.cache.ensure(url)
+        self.assertRegex(name, POSTER_NAME_RE)
+        with Image.open(self.cache.path(name)) as thumbnail:
+            self.assertEqual(thumbnail.format, 'JPEG')
+            self.assertLessEqual(thumbnail.size[0], 300)
+            self.assertLessEqual(thumbnail.size[1], 450)
+
+        self.assertEqual(self.cache.ensure(url), name)
+        self.assertEqual(self.cache.lookup(url), name)
+        self.assertEqual(self.fetcher.urls, [url])
+
+    def test_small_image_is_reencoded(self, get_render_cache):
+        url = self.add_source('small.gif', image_bytes((10, 10), image_format='GIF'))
+        with Image.open(self.cache.path(self.cache.ensure(url))) as thumbnail:
+            self.assertEqual(thumbnail.format, 'JPEG')
+
+    def test_store_deduplicates_same_content(self, get_render_cache):
+        data = image_bytes()
+        first = self.cache.store('https://a.example.com/1.png', data)
+        second = self.cache.store('https://b.example.com/2.png', data)
+        self.assertEqual(first, second)
+        self.assertEqual(self.cache.stats()['count'], 1)
+
+    def test_schedule_fetches_and_invalidates_waiting_cards(self, get_render_cache):
+        url = self.add_source('poster.png')
+        self.cache.schedule(url, ['movie_1'])
+        self.assertIsNotNone(self.cache.lookup(url))
+        get_render_cache.return_value.invalidate.assert_called_once_with({'movie_1'})
+
+        self.cache.schedule(url, ['movie_2'])
+        self.assertEqual(self.fetcher.urls, [url])
+
+    def test_failed_url_is_not_retried_immediately(self, get_render_cache):
+        url = self.add_source('broken.png', b'not an image')
+        self.cache.schedule(url, ['movie_1'])
+        self.cache.schedule(url, ['movie_1'])
+        self.assertIsNone(self.cache.lookup(url))
+        self.assertEqual(self.fetcher.urls, [url])
+        get_render_cache.return_value.invalidate.assert_not_called()
+
+        self.cache.retry_after = 0
+        self.cache.schedule(url, ['movie_1'])
+        self.assertEqual(self.fetcher.urls, [url, url])
+
+    def test_evict_removes_least_recently_used(self, get_render_cache):
+        urls = [self.add_source(f'{i}.png', image_bytes(color=(i * 40, 0, 0))) for i in range(3)]
+        names = [self.cache.ensure(url) for url in urls]
+        sizes = [os.path.getsize(self.cache.path(name)) for name in names]
+        # Постер 0 показан недавно, постер 1 - самый старый
+        for name, age in zip(names, (100, 30000, 20000)):
+            stamp = os.stat(self.cache.path(name)).st_mtime - age
+            os.utime(self.cache.path(name), (stamp, stamp))
+        self.cache.touch(names[0])
+        epoch = self.cache.epoch()
+
+        self.cache.max_bytes = sum(sizes) - 1
+        self.assertGreaterEqual(self.cache.evict(), 1)
+        self.assertIsNone(self.cache.lookup(urls[1]))
+        self.assertEqual(self.cache.lookup(urls[0]), names[0])
+        self.assertNotEqual(self.cache.epoch(), epoch)
+
+        # Вытесненный постер загружается заново
+        self.assertEqual(self.cache.ensure(urls[1]), names[1])
+        self.assertEqual(self.fetcher.urls.count(urls[1]), 2)
+
+    def test_store_evicts_over_budget(self, get_render_cache):
+        self.cache.max_bytes = 1
+        self.cache.ensure(self.add_source('one.png'))
+        self.assertEqual(self.cache.stats()['count'], 0)
+
+    def test_local_fetcher_reports_missing_file(self, get_render_cache):
+        with self.assertRaises(PosterFetchError):
+            LocalFetcher(self.source).fetch('https://posters.example.com/missing.png')
+
+
+class HTTPFetcherTests(TestCase):
+    def test_rejects_non_public_addresses(self):
+        fetcher = HTTPFetcher(timeout=1)
+        for url in (
+            'http://127.0.0.1/poster.jpg',
+            'http://localhost/poster.jpg',
+            'http://10.0.0.1/poster.jpg',
+            'http://169.254.169.254/latest/meta-data/',
+            'http://[::1]/poster.jpg',
+            'http://[::ffff:127.0.0.1]/poster.jpg',
+            'file:///etc/passwd',
+        ):
+            with self.subTest(url=url), self.assertRaises(PosterFetchError):
+                fetcher.fetch(url)
+
+    def test_checks_redirect_targets_and_size(self):
+        requests = []
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                requests.append(self.path)
+                if self.path == '/redirect':
+                    self.send_response(302)
+                    self.send_header('Location', 'http://169.254.169.254/latest/meta-data/')
+                    self.end_headers()
+                elif self.path == '/huge':
+                    self.send_response(200)
+                    self.send_header('Content-Length', str(10 ** 9))
+                    self.end_headers()
+                else:
+                    self.send_response(200)
+                    self.end_headers()
+                    self.wfile.write(b'x' * 100)
+
+            def log_message(self, *args):
+                pass
+
+        server = http.server.HTTPServer(('127.0.0.1', 0), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        base = f'http://127.0.0.1:{server.server_address[1]}'
+
+        # Тестовый сервер на loopback считается публичным, остальные проверки - настоящие
+        is_public = posters_module.is_public_address
+        with mock.patch.object(posters_module, 'is_public_address', lambda address: address == '127.0.0.1' or is_public(address)):
+            fetcher = HTTPFetcher(timeout=5, max_bytes=1000)
+            self.assertEqual(len(fetcher.fetch(f'{base}/poster')[0]), 100)
+            with self.assertRaisesMessage(PosterFetchError, '169.254.169.254'):
+                fetcher.fetch(f'{base}/redirect')
+            with self.assertRaises(PosterFetchError):
+                fetcher.fetch(f'{base}/huge')
+            with self.assertRaises(PosterFetchError):
+                HTTPFetcher(max_bytes=10).fetch(f'{base}/poster')
+        self.assertEqual(requests, ['/poster', '/redirect', '/huge', '/poster'])
+
+
+class PosterViewTests(IsolatedMediaMixin, TestCase):
+    def setUp(self):
+        if Image is None:
+            self.skipTest('Pillow не установлен')
+        self.source = tempfile.mkdtemp(prefix='movie-test-posters-')
+        self.addCleanup(shutil.rmtree, self.source, True)
+        self.settings_overrides = {
+            'MOVIE_POSTER_FETCHER': 'local',
+            'MOVIE_POSTER_FETCHER_OPTIONS': {'root': self.source},
+            'MOVIE_POSTER_OPTIONS': {'workers': 0},
+        }
+        super().setUp()
+        with open(os.path.join(self.source, 'poster.png'), 'wb') as f:
+            f.write(image_bytes())
+
+    def img_sources(self, response):
+        return re.findall(r'<img src="([^"]+)"', response.content.decode())
+
+    def test_added_movie_uses_local_thumbnail(self):
+        url = 'https://posters.example.com/poster.png'
+        self.client.post(reverse('movie_app:add_movie'), movie(image_url=url))
+        name = get_poster_cache().lookup(url)
+        self.assertIsNotNone(name)
+
+        response = self.client.get(reverse('movie_app:movie_list'))
+        self.assertEqual(self.img_sources(response), [reverse('movie_app:poster', args=[name])])
+        self.assertContains(response, 'loading="lazy"')
+
+        poster = self.client.get(reverse('movie_app:poster', args=[name]))
+        self.assertEqual(poster.status_code, 200)
+        self.assertEqual(poster['Content-Type'], 'image/jpeg')
+        self.assertIn('immutable', poster['Cache-Control'])
+        revalidated = self.client.get(reverse('movie_app:poster', args=[name]), HTTP_IF_NONE_MATCH=poster['ETag'])
+        self.assertEqual(revalidated.status_code, 304)
+
+    def test_missing_poster_falls_back_to_remote_url(self):
+        url = 'https://posters.example.com/missing.png'
+        self.client.post(reverse('movie_app:add_movie'), movie(image_url=url))
+        response = self.client.get(reverse('movie_app:movie_list'))
+        self.assertEqual(self.img_sources(response), [url])
+
+    def test_eviction_refreshes_cached_page_and_etag(self):
+        url = 'https://posters.example.com/poster.png'
+        self.client.post(reverse('movie_app:add_movie'), movie(image_url=url))
+        self.client.get(reverse('movie_app:movie_list'))
+        response = self.client.get(reverse('movie_app:movie_list'))
+        self.assertNotEqual(self.img_sources(response), [url])
+
+        cache = get_poster_cache()
+        cache.max_bytes = 0
+        cache.evict()
+        response_after = self.client.get(reverse('movie_app:movie_list'), HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response_after.status_code, 200)
+        self.assertEqual(self.img_sources(response_after), [url])
+
+    def test_invalid_poster_name_is_not_found(self):
+        for name in ('..', '0' * 32 + '.png', '0' * 32 + '.jpg'):
+            with self.subTest(name=name):
+                self.assertEqual(self.client.get(reverse('movie_app:poster', args=[name])).status_code, 404)
+
+
+class JSONFileRangeTests(IsolatedMediaMixin, TestCase):
+    content = b'[{"title": "0123456789"}]'
+
+    def setUp(self):
+        super().setUp()
+        with open(os.path.join(self.media_root, 'json_files', 'upload.json'), 'wb') as f:
+            f.write(self.content)
+        self.url = reverse('movie_app:view_json_file', args=['upload.json'])
+
+    def get(self, **headers):
+        response = self.client.get(self.url, headers=headers)
+        return response, b''.join(response.streaming_content) if response.streaming else response.content
+
+    def test_whole_file(self):
+        response, body = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(body, self.content)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+
+    def test_byte_range(self):
+        response, body = self.get(Range='bytes=2-6')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(body, self.content[2:7])
+        self.assertEqual(response['Content-Range'], f'bytes 2-6/{len(self.content)}')
+        self.assertEqual(response['Content-Length'], '5')
+
+    def test_open_and_suffix_ranges(self):
+        size = len(self.content)
+        response, body = self.get(Range='bytes=20-')
+        self.assertEqual((response.status_code, body), (206, self.content[20:]))
+        response, body = self.get(Range='bytes=-4')
+        self.assertEqual((response.status_code, body), (206, self.content[-4:]))
+        self.assertEqual(response['Content-Range'], f'bytes {size - 4}-{size - 1}/{size}')
+        response, body = self.get(Range=f'bytes=-{size * 2}')
+        self.assertEqual((response.status_code, body), (206, self.content))
+
+    def test_unsatisfiable_range(self):
+        for header in (f'bytes={len(self.content)}-', 'bytes=-0', 'bytes=5-2'):
+            with self.subTest(header=header):
+                response, _ = self.get(Range=header)
+                self.assertEqual(response.status_code, 416)
+                self.assertEqual(response['Content-Range'], f'bytes */{len(self.content)}')
+
+    def test_if_range(self):
+        etag = self.client.get(self.url)['ETag']
+        response, body = self.get(Range='bytes=0-1', **{'If-Range': etag})
+        self.assertEqual((response.status_code, body), (206, self.content[:2]))
+        response, body = self.get(Range='bytes=0-1', **{'If-Range': '"other"'})
+        self.assertEqual((response.status_code, body), (200, self.content))
+
+
+class MovieCatalogRefreshTests(IsolatedMediaMixin, TestCase):
+    """Изменения файлов в обход приложения попадают в каталог"""
+
+    def setUp(self):
+        super().setUp()
+        self.storage = get_storage()
+        self.file_id = self.storage.save(movie('Сталкер'))
+        self.path = os.path.join(self.media_root, 'json_files', self.file_id)
+
+    def rewrite(self, path, data, bump=1):
+        # Сдвиг mtime на секунды: несколько записей подряд могут попасть в один тик часов
+        stat = os.stat(path) if os.path.exists(path) else None
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump([data], f, ensure_ascii=False)
+        if stat is not None:
+            mtime = stat.st_mtime_ns + bump * 10 ** 9
+            os.utime(path, ns=(mtime, mtime))
+
+    def bump_directory(self):
+        directory = os.path.dirname(self.path)
+        mtime = os.stat(directory).st_mtime_ns + 10 ** 9
+        os.utime(directory, ns=(mtime, mtime))
+
+    def test_refresh_picks_up_file_changed_in_place(self):
+        catalog = MovieCatalog(self.storage)
+        self.assertEqual(catalog.get(self.file_id)['title'], 'Сталкер')
+        generation = catalog.generation
+        self.rewrite(self.path, movie('Солярис', version=2))
+        # Запись на месте не меняет mtime каталога: до пересканирования индекс прежний
+        self.assertEqual(catalog.get(self.file_id)['title'], 'Сталкер')
+        catalog.refresh(force=True)
+        self.assertEqual(catalog.get(self.file_id)['title'], 'Солярис')
+        self.assertGreater(catalog.generation, generation)
+
+    def test_rescan_interval_picks_up_file_changed_in_place(self):
+        catalog = MovieCatalog(self.storage, rescan_interval=0)
+        fingerprint = catalog.fingerprint
+        self.rewrite(self.path, movie('Солярис', version=2))
+        self.assertEqual(catalog.get(self.file_id)['title'], 'Солярис')
+        self.assertNotEqual(catalog.fingerprint, fingerprint)
+
+    def test_reload_file(self):
+        catalog = MovieCatalog(self.storage)
+        catalog.refresh()
+        self.rewrite(self.path, movie('Солярис', version=2))
+        catalog.reload_file(self.file_id)
+        self.assertEqual(catalog.get(self.file_id)['title'], 'Солярис')
+        os.remove(self.path)
+        catalog.reload_file(self.file_id)
+        self.assertIsNone(catalog.get(self.file_id))
+        self.assertEqual(len(catalog), 0)
+
+    def test_refresh_picks_up_added_and_removed_files(self):
+        catalog = MovieCatalog(self.storage)
+        catalog.refresh()
+        added = os.path.join(self.media_root, 'json_files', 'movie_external.json')
+        self.rewrite(added, movie('Зеркало', created_at='2030-01-01 00:00:00+00:00'))
+        os.remove(self.path)
+        self.bump_directory()
+        catalog.refresh()
+        self.assertIsNone(catalog.get(self.file_id))
+        self.assertEqual([m['title'] for m in catalog.movies()], ['Зеркало'])
+        self.assertEqual(catalog.page()[0][0]['file_id'], 'movie_external.json')
+
+
+class DuplicateIndexTests(IsolatedMediaMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.file_id = get_storage().save(movie('Сталкер', director='Андрей Тарковский', year=1979))
+        self.catalog = get_catalog()
+
+    def order_ids(self):
+        return [file_id for _, file_id in self.catalog._order]
+
+    def test_duplicate_found_after_normalisation(self):
+        for candidate in (
+            movie('  СТАЛКЕР ', director='андрей   тарковский', year=1979),
+            movie('Сталкер', director='Андрей\tТарковский', year='1979'),
+        ):
+            with self.subTest(candidate=candidate):
+                self.assertEqual(self.catalog.find_duplicate(candidate), self.file_id)
+        self.assertIsNone(self.catalog.find_duplicate(movie('Сталкер', director='Андрей Тарковский', year=1980)))
+
+    def test_delete_removes_record_from_order_and_index(self):
+        other = get_storage().save(movie('Солярис', director='Андрей Тарковский', year=1972))
+        self.catalog.refresh(force=True)
+        self.assertEqual(sorted(self.order_ids()), sorted([self.file_id, other]))
+
+        response = self.client.post(reverse('movie_app:delete_movie', args=[self.file_id]), {'version': 1})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.order_ids(), [other])
+        self.assertIsNone(self.catalog.find_duplicate(movie('Сталкер', director='Андрей Тарковский', year=1979)))
+        self.assertNotIn(('сталкер', 'андрей тарковский', 1979), self.catalog._dedup)
+
+    def test_edit_moves_record_to_new_key(self):
+        edit_url = reverse('movie_app:edit_movie', args=[self.file_id])
+        self.client.post(edit_url, {**movie('Сталкер', director='Андрей Тарковский', year=1980), 'version': 1})
+        self.assertIsNone(self.catalog.find_duplicate(movie('Сталкер', director='Андрей Тарковский', year=1979)))
+        self.assertEqual(self.catalog.find_duplicate(movie('сталкер', director='Андрей Тарковский', year=1980)), self.file_id)
+        self.assertEqual(self.order_ids(), [self.file_id])
+
+    def test_import_skips_normalised_duplicate(self):
+        job = ImportJob(self.upload([movie('сталкер ', director='АНДРЕЙ ТАРКОВСКИЙ', year=1979)]), 'dup.json')
+        run_import_job(job, get_storage().save_many)
+        self.assertEqual(job.to_dict()['duplicates'], 1)
+        self.assertEqual(len(self.catalog), 1)
+
+    def upload(self, movies):
+        path = os.path.join(self.media_root, 'dup.json')
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(movies, f, ensure_ascii=False)
+        return path
+
+
+class RenderCacheTests(IsolatedMediaMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.file_id = get_storage().save(movie('Сталкер'))
+        self.catalog = get_catalog()
+        self.render_cache = RenderCache(caches['movies'])
+
+    def card(self):
+        return self.render_cache.cards(self.catalog.get_many([self.file_id]), self.catalog)[0]
+
+    def test_card_is_cached_until_edit(self):
+        self.assertIn('СТАЛКЕР', self.card())
+        self.assertIn('СТАЛКЕР', self.card())
+        self.assertEqual(self.render_cache.stats()['card_hits'], 1)
+
+        update_movie_in_json(self.file_id, movie('Солярис'), expected_version=1)
+        self.assertIn('СОЛЯРИС', self.card())
+        self.assertEqual(self.render_cache.stats()['card_misses'], 2)
+
+    def test_card_revision_changes_without_invalidate(self):
+        self.card()
+        # Запись в обход представлений: карточку отсекает ревизия записи
+        get_storage().save(movie('Солярис'), self.file_id)
+        self.catalog.reload_file(self.file_id)
+        self.assertIn('СОЛЯРИС', self.card())
+
+    def test_invalidate_drops_cached_pages(self):
+        key = self.render_cache.page_key('movie_list', self.catalog, 'a', 20)
+        self.render_cache.set_page(key, b'old')
+        self.assertEqual(self.render_cache.get_page(key), b'old')
+        self.render_cache.invalidate([self.file_id])
+        new_key = self.render_cache.page_key('movie_list', self.catalog, 'a', 20)
+        self.assertNotEqual(new_key, key)
+        self.assertIsNone(self.render_cache.get_page(new_key))
+
+    def test_list_page_shows_edit_and_delete(self):
+        url = reverse('movie_app:movie_list')
+        stats = get_render_cache().stats()
+        self.client.get(url)
+        self.assertContains(self.client.get(url), 'СТАЛКЕР')
+        self.assertEqual(get_render_cache().stats()['page_hits'], stats['page_hits'] + 1)
+
+        edit_url = reverse('movie_app:edit_movie', args=[self.file_id])
+        self.client.post(edit_url, {**movie('Солярис'), 'version': 1})
+        response = self.client.get(url)
+        self.assertContains(response, 'СОЛЯРИС')
+        self.assertNotContains(response, 'СТАЛКЕР')
+
+        self.client.post(reverse('movie_app:delete_movie', args=[self.file_id]), {'version': 2})
+        self.client.get(url)
+        self.assertNotContains(self.client.get(url), 'СОЛЯРИС')
+
+
+class CatalogStatsTests(IsolatedMediaMixin, TestCase):
+    """Инкрементальная статистика совпадает с пересчетом с нуля"""
+
+    filters = [
+        {},
+        {'genre': 'драма'},
+        {'director': 'тарков', 'year_min': 1970},
+        {'rating_min': 7.5, 'rating_max': 8.5},
+        {'duration_min': 100, 'duration_max': 160, 'year_max': 1990},
+    ]
+
+    def setUp(self):
+        super().setUp()
+        storage = get_storage()
+        self.ids = [
+            storage.save(movie('Сталкер', director='Андрей Тарковский', year=1979, genre='Фантастика', rating=8.1, duration=163)),
+            storage.save(movie('Зеркало', director='Андрей Тарковский', year=1975, genre='Драма', rating=8.0, duration=107)),
+            storage.save(movie('Брат', director='Алексей Балабанов', year=1997, genre='Драма', rating=8.4, duration=100)),
+            storage.save(movie('Кин-дза-дза!', director='Георгий Данелия', year=1986, genre='Комедия', rating=7.9, duration=135)),
+        ]
+        self.stats = get_catalog_stats()
+
+    def expected(self):
+        fresh = CatalogStats()
+        for file_id, data in get_storage().items():
+            fresh.put(file_id, data)
+        return fresh
+
+    def assertStatsMatch(self):
+        get_catalog().refresh(force=True)
+        fresh = self.expected()
+        self.assertEqual(self.stats.summary(), fresh.summary())
+        self.assertEqual(self.stats.facets(), fresh.facets())
+        movies = get_catalog().movies()
+        for params in self.filters:
+            with self.subTest(params=params):
+                movie_filter = MovieFilter(**params)
+                selected = [m for m in movies if movie_filter(m)]
+                result = self.stats.aggregate(movie_filter)
+                self.assertEqual(result['count'], len(selected))
+                self.assertEqual(result['total_duration'], sum(m['duration'] for m in selected))
+                expected_rating = round(sum(m['rating'] for m in selected) / len(selected), 2) if selected else None
+                self.assertEqual(result['avg_rating'], expected_rating)
+
+    def test_initial(self):
+        self.assertStatsMatch()
+
+    def test_add(self):
+        self.stats.aggregate(MovieFilter(genre='драма'))
+        save_movies_to_json([movie('Солярис', director='Андрей Тарковский', year=1972, genre='Драма', rating=8.0, duration=167)])
+        self.assertStatsMatch()
+
+    def test_edit(self):
+        self.stats.aggregate(MovieFilter(genre='драма'))
+        update_movie_in_json(self.ids[2], movie('Брат 2', director='Алексей Балабанов', year=2000, genre='Боевик', rating=7.8, duration=127), 1)
+        self.assertStatsMatch()
+
+    def test_delete(self):
+        self.stats.aggregate(MovieFilter(genre='драма'))
+        delete_movie_file(self.ids[0], 1)
+        delete_movie_files([self.ids[1]])
+        self.assertStatsMatch()
+        self.assertEqual(self.stats.summary()['count'], 2)
+
+
+class PythonCatalogStatsTests(CatalogStatsTests):
+    """То же без numpy: диапазоны считаются циклом по массивам"""
+
+    def setUp(self):
+        patcher = mock.patch.object(stats_module, 'numpy', None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        super().setUp()
+
+
+class ExportTests(IsolatedMediaMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        storage = get_storage()
+        storage.save(movie('Сталкер', director='Тарковский', year=1979, genre='Фантастика'))
+        storage.save(movie('Солярис', director='Тарковский', year=1972, genre='Фантастика'))
+        storage.save(movie('Брат', director='Балабанов', year=1997, genre='Драма'))
+
+    def export(self, **params):
+        response = self.client.get(reverse('movie_app:export_all_movies'), params)
+        body = b''.join(response.streaming_content) if response.streaming else response.content
+        return response, body
+
+    def titles(self, movies):
+        return sorted(movie['title'] for movie in movies)
+
+    def test_pretty(self):
+        response, body = self.export()
+        self.assertEqual(response['Content-Type'], 'application/json; charset=utf-8')
+        self.assertIn('filename="all_movies.json"', response['Content-Disposition'])
+        movies = json.loads(body)
+        self.assertEqual(self.titles(movies), ['Брат', 'Солярис', 'Сталкер'])
+        self.assertEqual(body.decode(), json.dumps(movies, ensure_ascii=False, indent=2))
+        self.assertFalse({'file_id', 'version'} & set(movies[0]))
+
+    def test_compact(self):
+        response, body = self.export(format='compact')
+        movies = json.loads(body)
+        self.assertEqual(len(movies), 3)
+        self.assertEqual(body.decode(), json.dumps(movies, ensure_ascii=False, separators=(',', ':')))
+
+    def test_ndjson(self):
+        response, body = self.export(format='ndjson')
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson; charset=utf-8')
+        lines = body.decode().splitlines()
+        self.assertEqual(self.titles(json.loads(line) for line in lines), ['Брат', 'Солярис', 'Сталкер'])
+
+    def test_gzip(self):
+        response, body = self.export(format='ndjson', gzip='1')
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        self.assertIn('filename="all_movies.ndjson.gz"', response['Content-Disposition'])
+        _, plain = self.export(format='ndjson')
+        self.assertEqual(gzip.decompress(body), plain)
+
+    def test_filters(self):
+        _, body = self.export(director='тарковский', year_max='1975')
+        self.assertEqual(self.titles(json.loads(body)), ['Солярис'])
+        _, body = self.export(genre='Комедия')
+        self.assertEqual(json.loads(body), [])
+
+    def test_bad_parameters(self):
+        for params in ({'format': 'xml'}, {'year_min': 'давно'}):
+            with self.subTest(params=params):
+                response, _ = self.export(**params)
+                self.assertEqual(response.status_code, 400)
+
+
+class MovieListPaginationTests(IsolatedMediaMixin, TestCase):
+    titles = [f'Фильм {i}' for i in range(1, 6)]
+
+    def setUp(self):
+        super().setUp()
+        for i, title in enumerate(self.titles, 1):
+            get_storage().save(movie(title, created_at=f'2024-01-0{i} 10:00:00+00:00'))
+
+    def page(self, **params):
+        response = self.client.get(reverse('movie_app:movie_list'), params)
+        self.assertEqual(response.status_code, 200)
+        content = response.content.decode()
+        shown = sorted((content.index(title.upper()), title) for title in self.titles if title.upper() in content)
+        match = re.search(r'after=([\w-]+)&limit=', content)
+        return [title for _, title in shown], match.group(1) if match else None, content
+
+    def test_next_pages_cross_page_boundary(self):
+        titles, cursor, content = self.page(limit='2')
+        self.assertEqual(titles, ['Фильм 5', 'Фильм 4'])
+        self.assertNotIn('В НАЧАЛО', content)
+        titles, cursor, content = self.page(after=cursor, limit='2')
+        self.assertEqual(titles, ['Фильм 3', 'Фильм 2'])
+        self.assertIn('?limit=2', content)
+        titles, cursor, content = self.page(after=cursor, limit='2')
+        self.assertEqual(titles, ['Фильм 1'])
+        self.assertIsNone(cursor)
+        self.assertIn('В НАЧАЛО', content)
+
+    def test_cursor_is_stable_when_movies_are_added(self):
+        _, cursor, _ = self.page(limit='2')
+        get_storage().save(movie('Новый', created_at='2024-02-01 10:00:00+00:00'))
+        titles, _, _ = self.page(after=cursor, limit='2')
+        self.assertEqual(titles, ['Фильм 3', 'Фильм 2'])
+
+    def test_bad_cursor_falls_back_to_first_page(self):
+        for cursor in ('не-курсор', encode_cursor(('вчера', 'movie_x.json')), 'W10'):
+            with self.subTest(cursor=cursor):
+                titles, _, content = self.page(after=cursor, limit='2')
+                self.assertEqual(titles, ['Фильм 5', 'Фильм 4'])
+                self.assertNotIn('В НАЧАЛО', content)
+
+    def test_bad_limit_falls_back(self):
+        with override_settings(MOVIE_LIST_PAGE_SIZE=3):
+            titles, _, _ = self.page(limit='много')
+        self.assertEqual(titles, ['Фильм 5', 'Фильм 4', 'Фильм 3'])
+        titles, _, _ = self.page(limit='0')
+        self.assertEqual(titles, ['Фильм 5'])
+        titles, _, _ = self.page(limit='1000')
+        self.assertEqual(len(titles), 5)
+
+
+class ConditionalGetTests(IsolatedMediaMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.file_id = get_storage().save(movie('Сталкер'))
+
+    def assertNotModified(self, url, etag):
+        response = self.client.get(url, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+
+    def test_list_matching_etag_returns_304(self):
+        url = reverse('movie_app:movie_list')
+        etag = self.client.get(url)['ETag']
+        self.assertNotModified(url, etag)
+        self.assertEqual(self.client.get(url, headers={'If-None-Match': '"other"'}).status_code, 200)
+
+    def test_list_etag_changes_after_write(self):
+        url = reverse('movie_app:movie_list')
+        etag = self.client.get(url)['ETag']
+        get_storage().save(movie('Солярис'))
+        response = self.client.get(url, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertNotModified(url, response['ETag'])
+
+    def test_list_etag_changes_after_edit(self):
+        url = reverse('movie_app:movie_list')
+        etag = self.client.get(url)['ETag']
+        edit_url = reverse('movie_app:edit_movie', args=[self.file_id])
+        self.client.post(edit_url, {**movie('Сталкер', year=1979), 'version': 1})
+        # Первая страница после редиректа показывает сообщение и не получает ETag
+        self.assertNotIn('ETag', self.client.get(url))
+        response = self.client.get(url, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_export_etag(self):
+        url = reverse('movie_app:export_all_movies')
+        etag = self.client.get(url, {'format': 'ndjson'})['ETag']
+        response = self.client.get(url, {'format': 'ndjson'}, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertNotEqual(self.client.get(url, {'format': 'compact'})['ETag'], etag)
+        get_storage().delete(self.file_id)
+        response = self.client.get(url, {'format': 'ndjson'}, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+
+class OptimisticConcurrencyTests(IsolatedMediaMixin, TestCase):
+    """Устаревшая версия записи не затирает чужое изменение"""
+
+    def setUp(self):
+        super().setUp()
+        self.file_id = get_storage().save(movie(title='Исходный'))
+
+    def edit(self, version=None, **headers):
+        data = movie(title='Новый')
+        if version is not None:
+            data['version'] = version
+        return self.client.post(reverse('movie_app:edit_movie', args=[self.file_id]), data, headers=headers)
+
+    def delete(self, version=None, **headers):
+        data = {} if version is None else {'version': version}
+        return self.client.post(reverse('movie_app:delete_movie', args=[self.file_id]), data, headers=headers)
+
+    def current(self):
+        return get_storage().load(self.file_id)
+
+    def test_stale_version_on_edit_returns_conflict(self):
+        self.assertEqual(self.edit(version=1).status_code, 302)
+        self.assertEqual(self.current()['version'], 2)
+
+        response = self.edit(version=1)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response['ETag'], '"2"')
+        self.assertEqual(self.current()['version'], 2)
+
+    def test_stale_version_on_delete_returns_conflict(self):
+        self.edit(version=1)
+
+        response = self.delete(version=1)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response['ETag'], '"2"')
+        self.assertContains(response, 'value="2"', status_code=409)
+        self.assertIsNotNone(self.current())
+
+        self.assertEqual(self.delete(version=2).status_code, 302)
+        self.assertIsNone(self.current())
+
+    def test_delete_of_already_deleted_movie_redirects(self):
+        view_version = self.current()['version']
+        get_storage().delete(self.file_id)
+        get_catalog().reload_file(self.file_id)
+        self.assertEqual(self.delete(version=view_version).status_code, 302)
+
+    def test_if_match_header(self):
+        self.assertEqual(self.edit(**{'If-Match': '"1"'}).status_code, 302)
+        self.assertEqual(self.edit(**{'If-Match': '"1"'}).status_code, 409)
+        self.assertEqual(self.edit(**{'If-Match': 'W/"2"'}).status_code, 302)
+        # '*' не задает версию: запись сохраняется без проверки
+        self.assertEqual(self.edit(**{'If-Match': '*'}).status_code, 302)
+        self.assertEqual(self.current()['version'], 4)
+        self.assertEqual(self.delete(**{'If-Match': '"3"'}).status_code, 409)
+        self.assertEqual(self.delete(**{'If-Match': '"4"'}).status_code, 302)
+
+    def test_form_version_takes_precedence_over_if_match(self):
+        self.assertEqual(self.edit(version=1, **{'If-Match': '"7"'}).status_code, 302)
+
+    def test_if_match_parsing(self):
+        factory = RequestFactory()
+        cases = {
+            '"12"': 12, 'W/"12"': 12, ' "12" ': 12, '12': 12,
+            '*': None, '"1", "2"': None, '"W/12"': None, '"abc"': None, '': None,
+        }
+        for header, expected in cases.items():
+            with self.subTest(header=header):
+                request = factory.post('/', headers={'If-Match': header} if header else {})
+                self.assertEqual(get_expected_version(request), expected)
+
+    def test_stale_delete_of_missing_record_conflicts(self):
+        storage = get_storage()
+        self.assertTrue(storage.delete(self.file_id, expected_version=1))
+        self.assertFalse(storage.delete(self.file_id))
+        with self.assertRaises(VersionConflict) as conflict:
+            storage.delete(self.file_id, expected_version=1)
+        self.assertIsNone(conflict.exception.current_version)
+
+
+class DatabaseConcurrencyTests(OptimisticConcurrencyTests):
+    backend = 'database'
+
+    def test_second_saver_with_same_version_conflicts(self):
+        storage = get_storage()
+        self.assertIsInstance(storage, DatabaseStorage)
+        first = storage.load(self.file_id)
+        second = storage.load(self.file_id)
+
+        first['title'] = 'Первый'
+        storage.save(first, self.file_id, expected_version=first['version'])
+        second['title'] = 'Второй'
+        with self.assertRaises(VersionConflict) as conflict:
+            storage.save(second, self.file_id, expected_version=second['version'])
+
+        self.assertEqual(conflict.exception.current_version, 2)
+        self.assertEqual(storage.load(self.file_id)['title'], 'Первый')
+        with self.assertRaises(VersionConflict):
+            storage.delete(self.file_id, expected_version=1)
+
+
+class SegmentLogStorageTests(TestCase):
+    def setUp(self):
+        self.location = tempfile.mkdtemp(prefix='movie-test-log-')
+        self.addCleanup(shutil.rmtree, self.location, True)
+
+    def storage(self, **options):
+        options.setdefault('fsync', 'none')
+        return SegmentLogStorage(self.location, **options)
+
+    def test_second_instance_reads_appended_tail(self):
+        writer, reader = self.storage(), self.storage()
+        first = writer.save(movie('Первый'))
+        self.assertEqual(reader.load(first)['title'], 'Первый')
+        size = reader._size
+
+        second = writer.save(movie('Второй'))
+        writer.save(movie('Первый, правка'), first, expected_version=1)
+        self.assertEqual(reader.load_many([first, second]), {
+            first: writer.load(first),
+            second: writer.load(second),
+        })
+        self.assertEqual(reader.load(first)['version'], 2)
+        self.assertGreater(reader._size, size)
+
+    def test_compaction_keeps_latest_versions_and_tombstones(self):
+        storage = self.storage(compact_min_size=0, compact_ratio=10)
+        kept = storage.save(movie('Живой'))
+        deleted = storage.save(movie('Удаленный'))
+        for version in range(1, 4):
+            storage.save(movie(f'Живой {version}'), kept, expected_version=version)
+        storage.delete(deleted)
+        inode = storage._inode
+
+        storage.compact_ratio = 0.1
+        storage.save(movie('Новый'))
+        self.assertNotEqual(storage._inode, inode)
+        self.assertEqual(storage._dead, 0)
+
+        reopened = self.storage()
+        self.assertEqual(reopened.load(kept)['title'], 'Живой 3')
+        self.assertEqual(reopened.load(kept)['version'], 4)
+        self.assertIsNone(reopened.load(deleted))
+        self.assertEqual(len(reopened.stamps()), 2)
+
+    def test_writer_waiting_for_lock_follows_compacted_log(self):
+        writer, compactor = self.storage(), self.storage()
+        file_id = writer.save(movie('Первый'))
+        writer.save(movie('Первый, правка'), file_id, expected_version=1)
+        flock = storage_module.fcntl.flock
+        compacted = []
+
+        def compact_then_lock(f, operation):
+            # Другой процесс сжимает журнал, пока писатель ждет блокировку
+            if not compacted:
+                compacted.append(True)
+                compactor.compact()
+            return flock(f, operation)
+
+        with mock.patch.object(storage_module.fcntl, 'flock', side_effect=compact_then_lock):
+            writer.save(movie('Первый, вторая правка'), file_id, expected_version=2)
+
+        self.assertTrue(compacted)
+        reopened = self.storage()
+        self.assertEqual(reopened.load(file_id)['title'], 'Первый, вторая правка')
+        self.assertEqual(reopened.load(file_id)['version'], 3)
+        with open(writer.path, 'rb') as f:
+            # Сжатая версия 2 и дописанная после сжатия версия 3
+            self.assertEqual(len(f.readlines()), 2)
+
+    def test_truncated_last_line_is_ignored_and_replaced(self):
+        storage = self.storage()
+        kept = storage.save(movie('Целый'))
+        with open(storage.path, 'ab') as f:
+            f.write(storage._encode('crashed', 'put', movie('Оборванный'))[:20])
+
+        reader = self.storage()
+        self.assertEqual(reader.load(kept)['title'], 'Целый')
+        self.assertIsNone(reader.load('crashed'))
+
+        added = reader.save(movie('После сбоя'))
+        reopened = self.storage()
+        self.assertEqual(reopened.load(added)['title'], 'После сбоя')
+        self.assertEqual(reopened.load(kept)['title'], 'Целый')
+        self.assertEqual(reopened._dead, 0)
+        self.assertEqual(reopened._size, os.path.getsize(storage.path))
+
+
+class IterJSONArrayTests(TestCase):
+    def parse(self, text, **options):
+        return list(iter_json_array(io.StringIO(text), **options))
+
+    def test_records_straddling_chunk_boundary(self):
+        movies = [movie(f'Фильм {i}', description='x' * (1000 + i)) for i in range(200)]
+        text = json.dumps(movies, ensure_ascii=False, indent=2)
+        self.assertGreater(len(text), 3 * CHUNK_SIZE)
+        self.assertEqual(self.parse(text), movies)
+
+    def test_every_chunk_size_splits_the_same(self):
+        text = ' [1, 23, {"a": "b]c"}, [4.5e1], "x,y", 678 ] '
+        for chunk_size in range(1, len(text) + 1):
+            with self.subTest(chunk_size=chunk_size):
+                self.assertEqual(self.parse(text, chunk_size=chunk_size), [1, 23, {'a': 'b]c'}, [45.0], 'x,y', 678])
+
+    def test_truncated_array(self):
+        for text in ('[{"a": 1}, {"b"', '[{"a": 1}', '[{"a": 1},'):
+            with self.subTest(text=text):
+                items = iter_json_array(io.StringIO(text), chunk_size=4)
+                self.assertEqual(next(items), {'a': 1})
+                with self.assertRaises(json.JSONDecodeError):
+                    next(items)
+
+    def test_trailing_garbage(self):
+        for text in ('[1] x', '[1]]', '[1][2]'):
+            with self.subTest(text=text):
+                items = iter_json_array(io.StringIO(text), chunk_size=2)
+                self.assertEqual(next(items), 1)
+                with self.assertRaises(json.JSONDecodeError):
+                    next(items)
+
+    def test_empty_and_non_array(self):
+        with self.assertRaises(ValueError):
+            self.parse('  \n')
+        with self.assertRaises(TypeError):
+            self.parse('{"title": "Фильм"}')
+
+    def test_item_over_size_limit(self):
+        with self.assertRaises(json.JSONDecodeError):
+            self.parse('[' + '"' + 'x' * 100, chunk_size=8, max_item_size=32)
+
+
+class MovieRecordTests(TestCase):
+    def test_round_trip_keeps_dict(self):
+        samples = [
+            movie('Стандарт', created_at='2024-01-01 10:00:00+00:00', version=2),
+            movie('Формат ISO', created_at='2024-01-01T10:00:00', version=1),
+            movie('Только дата', created_at='2024-01-01', version=1),
+            movie('Микросекунды', created_at='2024-01-01 10:00:00.123456+03:00', version=1),
+            movie('Неразборчиво', created_at='вчера', version=1),
+            movie('Импорт', created_at='2024-01-01', version=5, source='upload.json',
+                  import_batch='abc123', file_id='movie_x.json', extra_field=[1, 2]),
+        ]
+        for data in samples:
+            with self.subTest(title=data['title']):
+                self.assertEqual(MovieRecord.from_dict(data).to_dict(), data)
+
+    def test_created_at_orders_by_parsed_value(self):
+        iso = MovieRecord.from_dict(movie(created_at='2024-01-01T10:00:00'))
+        date_only = MovieRecord.from_dict(movie(created_at='2024-01-01'))
+        self.assertLess(date_only.created_ts, iso.created_ts)
+
+    def test_record_is_unhashable(self):
+        with self.assertRaises(TypeError):
+            hash(MovieRecord.from_dict(movie()))
+
+
+class ImportJobTests(IsolatedMediaMixin, TestCase):
+    def run_job(self, text, batch_size=500):
+        path = os.path.join(self.media_root, 'json_files', 'uploaded.json')
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(text)
+        job = ImportJob(path, 'movies.json')
+        run_import_job(job, get_storage().save_many, batch_size=batch_size)
+        return job
+
+    def test_invalid_records_are_reported_by_index(self):
+        broken = movie('Без года')
+        del broken['year']
+        job = self.run_job(json.dumps([movie('Первый'), broken, 'строка', movie('Второй', rating=11)]))
+
+        self.assertEqual(job.status, DONE)
+        data = job.to_dict()
+        self.assertEqual((data['processed'], data['imported'], data['invalid']), (4, 1, 3))
+        self.assertEqual([(r['index'], r['status']) for r in data['skipped']], [(1, INVALID), (2, INVALID), (3, INVALID)])
+        self.assertIn("'year'", data['skipped'][0]['error'])
+        self.assertEqual(data['skipped'][0]['title'], 'Без года')
+        self.assertEqual(len(get_storage().stamps()), 1)
+
+    def test_broken_json_keeps_saved_batches_in_manifest(self):
+        text = json.dumps([movie('Первый'), movie('Второй')])[:-1] + ', {"title": '
+        job = self.run_job(text, batch_size=1)
+
+        self.assertEqual(job.status, ERROR)
+        self.assertIn('после записи 2', job.message)
+        self.assertIn('откатить', job.message)
+        self.assertEqual(job.importer.counts()[IMPORTED], 2)
+        self.assertEqual(len(job.batch.manifest.record_ids(job.id)), 2)
+
+    def test_empty_file_is_an_error(self):
+        for text in ('[]', ''):
+            with self.subTest(text=text):
+                job = self.run_job(text)
+                self.assertEqual(job.status, ERROR)
+                self.assertIn('пуст', job.message)
+
+
+class BulkMoviesTests(IsolatedMediaMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        storage = get_storage()
+        self.ids = [storage.save(movie(f'Фильм {i}', source='first.json')) for i in range(3)]
+        self.other = storage.save(movie('Другой', source='second.json'))
+
+    def bulk(self, **payload):
+        response = self.client.post(reverse('movie_app:bulk_movies'), json.dumps(payload), content_type='application/json')
+        return response.status_code, response.json()
+
+    def snapshot(self):
+        return dict(get_storage().items())
+
+    def test_dry_run_leaves_storage_unchanged(self):
+        before = self.snapshot()
+        for action, extra in (('update', {'set': {'genre': 'Комедия'}}), ('delete', {})):
+            with self.subTest(action=action):
+                status, data = self.bulk(action=action, filter={'source': 'first.json'}, dry_run=True, **extra)
+                self.assertEqual(status, 200)
+                self.assertEqual(data['counts'], {'matched': 3})
+                self.assertEqual(self.snapshot(), before)
+
+    def test_update_and_delete_by_filter(self):
+        status, data = self.bulk(action='update', filter={'source': 'first.json'}, set={'genre': 'Комедия'})
+        self.assertEqual(status, 200)
+        self.assertEqual(data['results'][self.ids[0]], {'status': 'updated', 'version': 2})
+        movies = get_storage().load_many(self.ids + [self.other])
+        self.assertEqual({movies[file_id]['genre'] for file_id in self.ids}, {'Комедия'})
+        self.assertEqual(movies[self.other]['genre'], 'Драма')
+
+        status, data = self.bulk(action='delete', ids=self.ids[:2] + ['movie_missing.json'], filter={'source': 'first.json'})
+        self.assertEqual(data['counts'], {'deleted': 2, 'not_found': 1})
+        self.assertEqual(len(get_catalog()), 2)
+
+    def test_partial_version_conflicts(self):
+        get_storage().save(movie('Фильм 1, правка', source='first.json'), self.ids[1], expected_version=1)
+        versions = dict.fromkeys(self.ids, 1)
+
+        status, data = self.bulk(action='update', ids=self.ids, versions=versions, set={'genre': 'Комедия'})
+        self.assertEqual(status, 200)
+        self.assertEqual(data['counts'], {'updated': 2, 'conflict': 1})
+        self.assertEqual(data['results'][self.ids[1]], {'status': 'conflict', 'version': 2})
+        edited = get_storage().load(self.ids[1])
+        self.assertEqual((edited['title'], edited['genre']), ('Фильм 1, правка', 'Драма'))
+        self.assertEqual(get_catalog().get(self.ids[1])['version'], 2)
+
+        status, data = self.bulk(action='delete', ids=self.ids, versions={self.ids[0]: 2, self.ids[1]: 2, self.ids[2]: 1})
+        self.assertEqual(data['counts'], {'deleted': 2, 'conflict': 1})
+        self.assertEqual(data['results'][self.ids[2]], {'status': 'conflict', 'version': 2})
+        self.assertIsNotNone(get_storage().load(self.ids[2]))
+        self.assertEqual([m['file_id'] for m in get_catalog().get_many(self.ids)], [self.ids[2]])
+
+    def test_invalid_versions(self):
+        for versions in (['1'], {self.ids[0]: '1'}, {self.ids[0]: True}):
+            with self.subTest(versions=versions):
+                status, data = self.bulk(action='delete', ids=self.ids, versions=versions)
+                self.assertEqual(status, 400)
+        self.assertEqual(len(self.snapshot()), 4)
+
+
+class SegmentBulkMoviesTests(BulkMoviesTests):
+    backend = 'segment'
+
+
+class DatabaseBulkMoviesTests(BulkMoviesTests):
+    backend = 'database'
+
+
+class BackfillMigrationTests(IsolatedMediaMixin, TestCase):
+    """Миграция 0006 переносит фильмы из json_files в таблицу Movie"""
+
+    def backfill(self):
+        migration = importlib.import_module('movie_app.migrations.0006_backfill_movies_from_json')
+        migration.backfill_from_json_files(django_apps, mock.Mock(connection=connection))
+
+    def write_movie(self, file_id, data):
+        with open(os.path.join(self.media_root, 'json_files', file_id), 'w', encoding='utf-8') as file:
+            json.dump([data], file, ensure_ascii=False)
+
+    def test_copies_files_into_table(self):
+        self.write_movie('movie_old.json', movie('Старый', created_at='2024-01-01 10:00:00+00:00', version=3))
+        self.write_movie('movie_new.json', movie('Новый'))
+        self.backfill()
+        storage = DatabaseStorage('default', json_dual_write=False)
+        self.assertEqual(storage.load('movie_old.json')['title'], 'Старый')
+        self.assertEqual(storage.load('movie_old.json')['version'], 3)
+        self.assertEqual(storage.load('movie_new.json')['version'], 1)
+
+    def test_skips_existing_and_invalid_records(self):
+        storage = DatabaseStorage('default', json_dual_write=False)
+        storage.save(movie('Из базы'), file_id='movie_a.json')
+        self.write_movie('movie_a.json', movie('Из файла'))
+        self.write_movie('movie_bad.json', movie('Без года', year='давно'))
+        self.backfill()
+        self.assertEqual(storage.load('movie_a.json')['title'], 'Из базы')
+        self.assertIsNone(storage.load('movie_bad.json'))
+
+
+class ImportRollbackTests(IsolatedMediaMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        path = os.path.join(self.media_root, 'json_files', 'uploaded.json')
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump([movie(f'Фильм {i}', year=2000 + i) for i in range(3)], f)
+        job = ImportJob(path, 'movies.json')
+        run_import_job(job, get_storage().save_many)
+        self.batch_id = job.id
+        self.kept, self.edited, self.removed = get_import_manifest().record_ids(self.batch_id)
+        storage = get_storage()
+        edited = storage.load(self.edited)
+        edited['title'] = 'Фильм 1, правка'
+        storage.save(edited, self.edited, expected_version=1)
+        storage.delete(self.removed)
+
+    def rollback(self, **data):
+        response = self.client.post(reverse('movie_app:rollback_import', args=[self.batch_id]), data)
+        self.assertEqual(response.status_code, 200)
+        return response.json()['results']
+
+    def test_diff_and_rollback_keep_edited_records(self):
+        diff = self.client.get(reverse('movie_app:import_batch', args=[self.batch_id])).json()['diff']
+        self.assertEqual(diff, {self.kept: UNCHANGED, self.edited: MODIFIED, self.removed: DELETED})
+
+        results = self.rollback()
+        self.assertEqual(results, {self.kept: ROLLED_BACK, self.edited: MODIFIED, self.removed: DELETED})
+        self.assertIsNone(get_storage().load(self.kept))
+        self.assertEqual(get_storage().load(self.edited)['title'], 'Фильм 1, правка')
+
+        results = self.rollback(force='1')
+        self.assertEqual(results[self.edited], ROLLED_BACK)
+        self.assertIsNone(get_storage().load(self.edited))
+        self.assertEqual(len(get_catalog()), 0)
+        self.assertEqual(get_import_manifest().get(self.batch_id)['rolled_back'], 2)
+
+    def test_record_edited_after_diff_is_kept(self):
+        def edit_then_delete(file_ids, expected_versions):
+            # Правка попадает между сверкой с каталогом и удалением
+            get_storage().save(movie('Правка в последний момент'), self.kept, expected_version=1)
+            return delete_movie_files(file_ids, expected_versions)
+
+        results = get_import_manifest().rollback(self.batch_id, get_catalog(), edit_then_delete)
+        self.assertEqual(results[self.kept], MODIFIED)
+        self.assertEqual(get_storage().load(self.kept)['title'], 'Правка в последний момент')
+        self.assertEqual(get_catalog().get(self.kept)['version'], 2)
+
+    def test_invalid_batch_ids(self):
+        for batch_id in ('..', 'ZZZZZZZZZZZZ', 'abc', 'deadbeefdeadbeef', self.batch_id + '.ids'):
+            with self.subTest(batch_id=batch_id):
+                self.assertEqual(self.client.get(reverse('movie_app:import_batch', args=[batch_id])).status_code, 404)
+                response = self.client.post(reverse('movie_app:rollback_import', args=[batch_id]))
+                self.assertEqual(response.status_code, 404)
+        self.assertIsNotNone(get_storage().load(self.kept))
+
+
+class WriteBatcherTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix='movie-test-writes-')
+        self.addCleanup(shutil.rmtree, self.directory, True)
+        with open(os.path.join(self.directory, 'a.json'), 'wb') as f:
+            f.write(b'old')
+
+    def files(self):
+        contents = {}
+        for name in sorted(os.listdir(self.directory)):
+            with open(os.path.join(self.directory, name), 'rb') as f:
+                contents[name] = f.read()
+        return contents
+
+    def test_error_inside_group_removes_temp_files(self):
+        for mode in FSYNC_MODES:
+            if mode == 'each':
+                continue
+            with self.subTest(mode=mode), mock.patch('os.fsync'):
+                with self.assertRaises(RuntimeError):
+                    with WriteBatcher(self.directory, mode) as batch:
+                        batch.add('a.json', b'new')
+                        batch.add('b.json', b'new')
+                        raise RuntimeError('сбой посреди группы')
+                self.assertEqual(self.files(), {'a.json': b'old'})
+
+    def test_failed_write_removes_its_temp_file(self):
+        with self.assertRaises(TypeError):
+            with WriteBatcher(self.directory, 'none') as batch:
+                batch.add('b.json', b'new')
+                batch.add('c.json', 'не bytes')
+        self.assertEqual(self.files(), {'a.json': b'old'})
+
+    def test_failed_fsync_in_commit_keeps_old_files(self):
+        calls = []
+
+        def fsync(fd):
+            calls.append(fd)
+            if len(calls) == 2:
+                raise OSError('диск недоступен')
+
+        with mock.patch('os.fsync', side_effect=fsync), self.assertRaises(OSError):
+            with WriteBatcher(self.directory, 'batch') as batch:
+                batch.add('a.json', b'new')
+                batch.add('b.json', b'new')
+                batch.add('c.json', b'new')
+        self.assertEqual(self.files(), {'a.json': b'old'})
+
+    def test_failed_rename_removes_remaining_temp_files(self):
+        replace = os.replace
+
+        def replace_once(src, dst):
+            if dst.endswith('b.json'):
+                raise OSError('нет места')
+            return replace(src, dst)
+
+        with mock.patch('os.replace', side_effect=replace_once), self.assertRaises(OSError):
+            with WriteBatcher(self.directory, 'none') as batch:
+                batch.add('a.json', b'new')
+                batch.add('b.json', b'new')
+                batch.add('c.json', b'new')
+        self.assertEqual(self.files(), {'a.json': b'new'})
+
+    def test_fsync_calls_per_mode(self):
+        # 3 файла: batch - fsync каждого файла и один каталога, each - пара на файл
+        expected = {'none': 0, 'batch': 4, 'each': 6}
+        self.assertEqual(set(expected), set(FSYNC_MODES))
+        for mode, count in expected.items():
+            with self.subTest(mode=mode), mock.patch('os.fsync') as fsync:
+                with WriteBatcher(self.directory, mode) as batch:
+                    for name in ('a.json', 'b.json', 'c.json'):
+                        batch.add(name, mode.encode())
+                self.assertEqual(fsync.call_count, count)
+                self.assertEqual(set(self.files().values()), {mode.encode()})
+
+    def test_unknown_mode(self):
+        with self.assertRaises(ValueError):
+            WriteBatcher(self.directory, 'always')
+        with override_settings(MOVIE_FSYNC='always'), self.assertRaises(ValueError):
+            get_fsync_mode()
+
+
+class SearchCatalogTests(IsolatedMediaMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        storage = get_storage()
+        genres = ('Драма', 'Драма', 'Комедия', 'Фантастика')
+        directors = ('Тарковский', 'Андрей Тарковский', 'Рязанов', 'Нолан')
+        self.ids = [
+            storage.save(movie(
+                f'Тарковский {i}' if i % 5 == 0 else f'Фильм {i}',
+                genre=genres[i % 4],
+                director=directors[i % 3 if i % 7 else 3],
+                year=1950 + i * 3,
+                rating=round(3 + i * 0.27, 1),
+                duration=70 + i * 4,
+                created_at=f'2024-01-{i + 1:02d} 10:00:00+00:00',
+            ))
+            for i in range(25)
+        ]
+
+    def test_empty_search_matches_full_index_without_scanning(self):
+        expected = [get_search_index().search('', None, limit=10, offset=offset) for offset in (0, 10, 20)]
+        with mock.patch.object(SearchIndex, 'search') as search:
+            found = [search_catalog('', MovieFilter(), limit=10, offset=offset) for offset in (0, 10, 20)]
+        search.assert_not_called()
+        self.assertEqual(found, expected)
+        self.assertEqual(found[0]['file_ids'][0], self.ids[-1])
+        self.assertEqual(found[2]['file_ids'], list(reversed(self.ids[:5])))
+
+    def test_director_filter_uses_director_index(self):
+        movie_filter = MovieFilter(director='тарковский')
+        expected = [m['file_id'] for m in get_catalog().iter_movies(movie_filter)]
+        found = search_catalog('', movie_filter, limit=100)
+        self.assertEqual(found['file_ids'], expected)
+        self.assertEqual(found['total'], len(expected))
+
+        storage = get_storage()
+        changed = storage.load(expected[0])
+        changed['director'] = 'Нолан'
+        storage.save(changed, expected[0])
+        storage.delete(expected[1])
+        found = search_catalog('', movie_filter, limit=100)
+        self.assertEqual(found['file_ids'], expected[2:])
+
+    def test_ranked_pages_match_full_sort(self):
+        index = get_search_index()
+        everything = index.search('тарковский', None, limit=100)['file_ids']
+        # Совпадение в названии весит больше, чем в режиссере
+        self.assertEqual(everything[:5], [self.ids[i] for i in (20, 15, 10, 5, 0)])
+        self.assertGreater(len(everything), 10)
+        pages = [index.search('тарковский', None, limit=7, offset=offset)['file_ids'] for offset in range(0, 25, 7)]
+        self.assertEqual(sum(pages, []), everything)
+
+    def test_search_view_serves_empty_query(self):
+        response = self.client.get(reverse('movie_app:search_movies'), {'format': 'json'})
+        data = response.json()
+        self.assertEqual(data['total'], 25)
+        self.assertEqual(data['facets'], get_search_index().search()['facets'])
+        self.assertEqual(data['facets']['genre'][0], {'value': 'Драма', 'count': 13})
+
+    def test_filter_normalizes_like_index(self):
+        storage = get_storage()
+        storage.save(movie('Ирония судьбы', director='Эльдар Рязанов', genre='Комедия'))
+        file_id = storage.save(movie('Пёс', director='Семён Ёлкин', genre='Чёрная комедия'))
+        for params in ({'director': 'семен елкин'}, {'director': 'СЁМЕН'}, {'genre': 'черная КОМЕДИЯ'}):
+            with self.subTest(params=params):
+                movie_filter = MovieFilter(**params)
+                self.assertEqual([m['file_id'] for m in get_catalog().iter_movies(movie_filter)], [file_id])
+                self.assertEqual(search_catalog('', movie_filter)['file_ids'], [file_id])
+
+    def test_rating_facets_are_half_open(self):
+        storage = get_storage()
+        edge = storage.save(movie('Почти девять', rating=8.995))
+        top = storage.save(movie('Десять', rating=10))
+        facets = get_search_index().search()['facets']['rating']
+        self.assertEqual({key: facets[0][key] for key in ('label', 'min', 'max')}, {'label': '9-10', 'min': 9, 'max': 10})
+        eight = next(item for item in facets if item['min'] == 8)
+        self.assertEqual(eight['below'], 9)
+        self.assertNotIn('max', eight)
+
+        for item, file_id in ((eight, edge), (facets[0], top)):
+            params = {key: item[key] for key in ('min', 'max', 'below') if key in item}
+            movie_filter = MovieFilter(**{f'rating_{key}': value for key, value in params.items()})
+            expected = [m['file_id'] for m in get_catalog().iter_movies(movie_filter)]
+            self.assertIn(file_id, expected)
+            found = search_catalog('', movie_filter, limit=100)
+            self.assertEqual(sorted(found['file_ids']), sorted(expected))
+            self.assertEqual(found['total'], item['count'])
+            self.assertEqual(get_catalog_stats().aggregate(movie_filter)['count'], item['count'])
+
+    def test_facet_links_replace_range_bounds(self):
+        response = self.client.get(reverse('movie_app:search_movies'), {'rating_max': '5'})
+        self.assertEqual(response.status_code, 200)
+        links = [item['url'] for item in response.context['facets']['rating']]
+        self.assertTrue(links)
+        for url in links:
+            self.assertNotIn('rating_max=5', url)
+        self.assertTrue(any('rating_below=' in url for url in links))
+        response = self.client.get(reverse('movie_app:search_movies'), {'rating_min': '8', 'rating_below': '9', 'format': 'json'})
+        self.assertTrue(all(8 <= m['rating'] < 9 for m in response.json()['results']))
+
+
+class ProfilingTests(IsolatedMediaMixin, TestCase):
+    settings_overrides = {'MOVIE_PROFILING': True}
+
+    def test_sync_request_returns_profile(self):
+        response = self.client.get(reverse('movie_app:movie_list'), {'profile': '1', 'profile_limit': '5'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/plain; charset=utf-8')
+        self.assertIn('function calls', response.content.decode())
+
+    async def test_async_request_rejects_profile(self):
+        response = await AsyncClient().get(reverse('movie_app:movie_list'), {'profile': '1'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('Server-Timing', response)
+
+    async def test_async_requests_are_not_sampled(self):
+        profile_dir = os.path.join(self.media_root, 'profiles')
+        with override_settings(MOVIE_PROFILE_SAMPLE_RATE=1, MOVIE_PROFILE_DIR=profile_dir):
+            response = await AsyncClient().get(reverse('movie_app:movie_list'))
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(os.path.exists(profile_dir))
+
+
+class RunIOTests(TestCase):
+    # Тестовая база sqlite в памяти не закрывает соединения, поэтому проверяются вызовы
+    @mock.patch('movie_app.utils.aio.close_old_connections')
+    async def test_closes_old_connections_around_call(self, close_old_connections):
+        calls = []
+        close_old_connections.side_effect = lambda: calls.append('close')
+        self.assertEqual(await run_io(lambda: calls.append('call') or 6), 6)
+        self.assertEqual(calls, ['close', 'call', 'close'])
+
+    @mock.patch('movie_app.utils.aio.close_old_connections')
+    async def test_closes_connections_when_call_raises(self, close_old_connections):
+        with self.assertRaises(ZeroDivisionError):
+            await run_io(divmod, 1, 0)
+        self.assertEqual(close_old_connections.call_count, 2)
+
+
+class ImportJobQueueTests(IsolatedMediaMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.queue = ImportJobQueue(max_workers=1)
+        self.addCleanup(self.queue._executor.shutdown, True)
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.addCleanup(self.release.set)
+
+    def upload(self, name, text):
+        path = os.path.join(self.media_root, 'json_files', name)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(text)
+        return path
+
+    def blocking_save(self, movies):
+        self.started.set()
+        self.release.wait(5)
+        return get_storage().save_many(movies)
+
+    def wait(self, job):
+        for _ in range(500):
+            if job.is_finished:
+                return
+            threading.Event().wait(0.01)
+        self.fail(f'Задача {job.id} не завершилась')
+
+    def test_cancel_in_queue_keeps_upload(self):
+        running = self.queue.submit(self.upload('a.json', json.dumps([movie('А')])), 'a.json', self.blocking_save, batch_size=1)
+        self.assertTrue(self.started.wait(5))
+        queued = self.queue.submit(self.upload('b.json', json.dumps([movie('Б')])), 'b.json', self.blocking_save)
+
+        self.assertTrue(self.queue.cancel(queued.id))
+        self.assertEqual(queued.status, CANCELLED)
+        self.assertTrue(os.path.exists(queued.file_path))
+        self.assertFalse(self.queue.cancel(queued.id))
+
+        self.release.set()
+        self.wait(running)
+        self.assertEqual(running.status, DONE)
+        self.assertTrue(os.path.exists(running.file_path))
+        self.assertIsNone(queued.batch)
+        self.assertEqual(len(get_storage().stamps()), 1)
+
+    def test_every_finished_job_keeps_upload(self):
+        self.release.set()
+        uploads = {
+            DONE: json.dumps([movie('А')]),
+            ERROR: '[{"title": ',
+        }
+        for status, text in uploads.items():
+            with self.subTest(status=status):
+                job = self.queue.submit(self.upload(f'{status}.json', text), f'{status}.json', self.blocking_save)
+                self.wait(job)
+                self.assertEqual(job.status, status)
+                self.assertTrue(os.path.exists(job.file_path))
+
+    def test_cancel_while_running_keeps_upload(self):
+        job = self.queue.submit(
+            self.upload('c.json', json.dumps([movie(f'Фильм {i}', year=2000 + i) for i in range(3)])),
+            'c.json', self.blocking_save, batch_size=1,
+        )
+        self.assertTrue(self.started.wait(5))
+        self.assertTrue(self.queue.cancel(job.id))
+        self.release.set()
+        self.wait(job)
+        self.assertEqual(job.status, CANCELLED)
+        self.assertTrue(os.path.exists(job.file_path))
+
+    def test_delete_uploads_removes_finished_and_cancelled_uploads(self):
+        queue = ImportJobQueue(max_workers=1, delete_uploads=True)
+        self.addCleanup(queue._executor.shutdown, True)
+        running = queue.submit(self.upload('a.json', json.dumps([movie('А')])), 'a.json', self.blocking_save, batch_size=1)
+        self.assertTrue(self.started.wait(5))
+        queued = queue.submit(self.upload('b.json', json.dumps([movie('Б')])), 'b.json', self.blocking_save)
+
+        self.assertTrue(queue.cancel(queued.id))
+        self.assertFalse(os.path.exists(queued.file_path))
+        self.assertTrue(os.path.exists(running.file_path))
+
+        self.release.set()
+        self.wait(running)
+        self.assertEqual(running.status, DONE)
+        self.assertFalse(os.path.exists(running.file_path))
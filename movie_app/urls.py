@@ -1,14 +1,30 @@
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import views, async_views
+
+# Под ASGI список, экспорт, файлы хранилища и загрузка обслуживаются async версиями
+io_views = async_views if getattr(settings, 'MOVIE_ASYNC_VIEWS', False) else views
 
 app_name = 'movie_app'
 
 urlpatterns = [
-    path('', views.movie_list, name='movie_list'),
+    path('', io_views.movie_list, name='movie_list'),
+    path('search/', views.search_movies, name='search_movies'),
+    path('stats/', views.catalog_stats, name='catalog_stats'),
     path('add/', views.add_movie, name='add_movie'),
-    path('upload/', views.upload_json, name='upload_json'),
-    path('export/', views.export_all_movies, name='export_all_movies'),
-    path('json/<str:filename>/', views.view_json_file, name='view_json_file'),
+    path('upload/', io_views.upload_json, name='upload_json'),
+    path('upload/<str:job_id>/', views.import_status, name='import_status'),
+    path('upload/<str:job_id>/cancel/', views.cancel_import, name='cancel_import'),
+    path('imports/', views.import_batches, name='import_batches'),
+    path('imports/<str:batch_id>/', views.import_batch, name='import_batch'),
+    path('imports/<str:batch_id>/rollback/', views.rollback_import, name='rollback_import'),
+    path('export/', io_views.export_all_movies, name='export_all_movies'),
+    path('json/', io_views.json_file_list, name='json_file_list'),
+    path('json/<str:filename>/', io_views.view_json_file, name='view_json_file'),
+    path('movies/bulk/', views.bulk_movies, name='bulk_movies'),
     path('movie/<str:file_id>/edit/', views.edit_movie, name='edit_movie'),
     path('movie/<str:file_id>/delete/', views.delete_movie, name='delete_movie'),
+    path('cache/stats/', views.render_cache_stats, name='render_cache_stats'),
+    path('metrics/', views.prometheus_metrics, name='prometheus_metrics'),
+    path('posters/<str:name>/', views.poster, name='poster'),
 ]
\ No newline at end of file
@@ -0,0 +1,88 @@
+import asyncio
+import threading
+import contextvars
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.db import close_old_connections
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_io_executor():
+    """
+    Общий ограниченный пул потоков для блокирующего ввода-вывода async представлений.
+
+    Размер - MOVIE_ASYNC_IO_WORKERS. Каталог и хранилища защищены своими
+    блокировками, поэтому их методы можно вызывать из любого потока пула,
+    а цикл событий никогда не ждет на этих блокировках сам.
+    """
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=getattr(settings, 'MOVIE_ASYNC_IO_WORKERS', 8),
+                    thread_name_prefix='movie-io',
+                )
+    return _executor
+
+
+def _call_with_connections(func, *args, **kwargs):
+    # Потоки пула живут дольше запроса, а сигналы request_started/finished
+    # закрывают соединения только в своем потоке: здесь это делается вручную
+    close_old_connections()
+    try:
+        return func(*args, **kwargs)
+    finally:
+        close_old_connections()
+
+
+async def run_io(func, *args, **kwargs):
+    """
+    Выполнить блокирующую функцию в пуле, не занимая цикл событий.
+
+    Функция выполняется в копии контекста, поэтому метрики запроса
+    учитывают и работу в пуле. До и после вызова устаревшие соединения
+    с базой этого потока закрываются, как в обработчике запроса Django.
+    """
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    call = partial(context.run, _call_with_connections, func, *args, **kwargs)
+    return await loop.run_in_executor(get_io_executor(), call)
+
+
+async def gather_io(func, items, chunk_size=256):
+    """
+    Применить func к кускам items параллельно в пуле, результаты склеиваются по порядку.
+
+    func получает список и возвращает список.
+    """
+    items = list(items)
+    chunks = [items[start:start + chunk_size] for start in range(0, len(items), chunk_size)]
+    results = await asyncio.gather(*(run_io(func, chunk) for chunk in chunks))
+    return [item for result in results for item in result]
+
+
+_done = object()
+
+
+async def iterate_in_pool(iterator):
+    """
+    Async итератор поверх блокирующего: каждый next() выполняется в пуле.
+
+    Шаги могут попасть в разные потоки, и после каждого соединения с базой
+    закрываются, поэтому итератор не должен держать курсор между шагами.
+    """
+    iterator = iter(iterator)
+    try:
+        while True:
+            item = await run_io(next, iterator, _done)
+            if item is _done:
+                break
+            yield item
+    finally:
+        close = getattr(iterator, 'close', None)
+        if close is not None:
+            await run_io(close)
@@ -0,0 +1,372 @@
+import os
+import json
+import time
+import base64
+import binascii
+import hashlib
+import threading
+from bisect import bisect_left, insort
+from django.conf import settings
+from django.utils import timezone
+from . import metrics
+from .storage import get_storage
+from .records import MovieRecord
+
+
+def get_json_dir():
+    """Каталог, в котором хранятся JSON файлы фильмов"""
+    return os.path.join(settings.MEDIA_ROOT, 'json_files')
+
+
+def dedup_key(movie):
+    """Нормализованный ключ (название, режиссер, год) для поиска дубликатов"""
+    def normalize(value):
+        return ' '.join(str(value or '').split()).casefold()
+    try:
+        year = int(movie.get('year'))
+    except (TypeError, ValueError):
+        year = None
+    return (normalize(movie.get('title')), normalize(movie.get('director')), year)
+
+
+def _entry_hash(file_id, stamp):
+    # Стабильный между процессами хеш записи (в отличие от встроенного hash)
+    digest = hashlib.blake2b(f'{file_id}:{stamp!r}'.encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'big')
+
+
+class MovieCatalog:
+    """
+    Индекс каталога фильмов в памяти процесса.
+
+    Хранит отображение file_id -> MovieRecord, порядок сортировки по created_at
+    и индекс дубликатов по dedup_key.
+    При обращении сверяет version() хранилища и перечитывает только те
+    записи, у которых изменилась отметка версии (для файлов - mtime).
+    Все операции защищены блокировкой, поэтому один экземпляр можно
+    использовать из нескольких потоков.
+
+    Производные индексы (поиск, статистика) подключаются через extension():
+    они получают put(file_id, movie) и remove(file_id) при каждом изменении.
+
+    generation растет при каждом изменении индекса в этом процессе,
+    fingerprint - XOR хешей (id, отметка версии) всех записей - одинаков
+    во всех процессах с одинаковым содержимым хранилища.
+    """
+
+    def __init__(self, storage, rescan_interval=60):
+        self.storage = storage
+        self.rescan_interval = rescan_interval
+        self.generation = 0
+        self.last_modified = timezone.now()
+        self._checksum = 0
+        self._lock = threading.RLock()
+        self._movies = {}
+        self._stamps = {}
+        self._order = []
+        self._dedup = {}
+        self._version = None
+        self._last_scan = 0.0
+        self._extensions = {}
+        self.load_report = None
+
+    def _bump(self):
+        self.generation += 1
+        self.last_modified = timezone.now()
+
+    @property
+    def fingerprint(self):
+        """Версия содержимого каталога для ETag"""
+        self.refresh()
+        with self._lock:
+            return f'{len(self._movies)}-{self._checksum:016x}'
+
+    def extension(self, name, factory):
+        """
+        Производный индекс, который обновляется вместе с каталогом.
+
+        При первом обращении создается через factory() и заполняется
+        текущим содержимым каталога; дальше получает только изменения.
+        """
+        self.refresh()
+        with self._lock:
+            extension = self._extensions.get(name)
+            if extension is None:
+                extension = factory()
+                for file_id, movie in self._movies.items():
+                    extension.put(file_id, movie)
+                self._extensions[name] = extension
+            return extension
+
+    def _sort_key(self, file_id, movie):
+        return (movie.created_ts, file_id)
+
+    def _unlink(self, file_id, old):
+        self._order.pop(bisect_left(self._order, self._sort_key(file_id, old)))
+        key = dedup_key(old)
+        file_ids = self._dedup.get(key)
+        if file_ids is not None:
+            file_ids.discard(file_id)
+            if not file_ids:
+                del self._dedup[key]
+
+    def _put(self, file_id, movie, stamp):
+        old = self._movies.get(file_id)
+        if old is not None:
+            self._unlink(file_id, old)
+            self._checksum ^= _entry_hash(file_id, self._stamps[file_id])
+        self._checksum ^= _entry_hash(file_id, stamp)
+        movie = MovieRecord.from_dict(movie, file_id)
+        self._movies[file_id] = movie
+        self._stamps[file_id] = stamp
+        insort(self._order, self._sort_key(file_id, movie))
+        self._dedup.setdefault(dedup_key(movie), set()).add(file_id)
+        for extension in self._extensions.values():
+            extension.put(file_id, movie)
+
+    def _remove(self, file_id):
+        old = self._movies.pop(file_id, None)
+        stamp = self._stamps.pop(file_id, None)
+        if old is not None:
+            self._unlink(file_id, old)
+            self._checksum ^= _entry_hash(file_id, stamp)
+            for extension in self._extensions.values():
+                extension.remove(file_id)
+
+    def _load(self, stamps):
+        """Перечитать записи с новыми отметками, True если индекс изменился"""
+        changed = False
+        for file_id, movie in self.storage.load_many(list(stamps)).items():
+            if movie is None:
+                changed = changed or file_id in self._movies
+                self._remove(file_id)
+            else:
+                self._put(file_id, movie, stamps[file_id])
+                changed = True
+        return changed
+
+    def _bulk_load(self, stamps):
+        """
+        Холодная загрузка в пустой индекс.
+
+        Хранилище отдает записи уже отсортированными по (created_at, id),
+        поэтому порядок строится одним списком, а не вставками по одной.
+        """
+        entries, report = self.storage.load_sorted(list(stamps))
+        started = time.perf_counter()
+        for (_, file_id), movie in entries:
+            stamp = stamps[file_id]
+            movie = MovieRecord.from_dict(movie, file_id)
+            self._movies[file_id] = movie
+            self._stamps[file_id] = stamp
+            self._checksum ^= _entry_hash(file_id, stamp)
+            self._dedup.setdefault(dedup_key(movie), set()).add(file_id)
+            for extension in self._extensions.values():
+                extension.put(file_id, movie)
+        self._order = [key for key, _ in entries]
+        report['phases']['index'] = time.perf_counter() - started
+        self.load_report = report
+        return bool(entries)
+
+    def refresh(self, force=False):
+        """Синхронизировать индекс с хранилищем, перечитывая только измененные записи"""
+        version = self.storage.version()
+
+        stale = time.monotonic() - self._last_scan > self.rescan_interval
+        if not force and not stale and version == self._version:
+            return
+
+        with self._lock:
+            # Сначала только отметки версий: данные читаются лишь для измененных записей
+            started = time.perf_counter()
+            stamps = self.storage.stamps()
+            list_time = time.perf_counter() - started
+            metrics.add_time('scan', list_time)
+            if stamps is None:
+                if self._movies:
+                    for file_id in list(self._movies):
+                        self._remove(file_id)
+                    self._bump()
+                self._version = version
+                self._last_scan = time.monotonic()
+                return
+
+            changed = False
+            for file_id in self._stamps.keys() - stamps.keys():
+                self._remove(file_id)
+                changed = True
+            modified = {
+                file_id: stamp for file_id, stamp in stamps.items()
+                if self._stamps.get(file_id) != stamp
+            }
+            if modified and not self._movies:
+                changed = self._bulk_load(modified) or changed
+                self.load_report['phases'] = {'list': list_time, **self.load_report['phases']}
+            elif modified:
+                changed = self._load(modified) or changed
+
+            if changed:
+                self._bump()
+            self._version = version
+            self._last_scan = time.monotonic()
+
+    def reload_file(self, file_id):
+        """Перечитать запись после сохранения"""
+        self.reload_files([file_id])
+
+    def reload_files(self, file_ids):
+        """Перечитать группу сохраненных записей одним обновлением индекса"""
+        with self._lock:
+            changed = False
+            stamps = {}
+            for file_id in file_ids:
+                stamp = self.storage.stamp(file_id)
+                if stamp is None:
+                    if file_id in self._movies:
+                        self._remove(file_id)
+                        changed = True
+                else:
+                    stamps[file_id] = stamp
+            if stamps:
+                changed = self._load(stamps) or changed
+            if changed:
+                self._bump()
+
+    def discard(self, file_id):
+        """Убрать фильм из индекса после удаления файла"""
+        with self._lock:
+            if file_id in self._movies:
+                self._remove(file_id)
+                self._bump()
+
+    def discard_many(self, file_ids):
+        """Убрать группу фильмов из индекса одним обновлением"""
+        with self._lock:
+            removed = [file_id for file_id in file_ids if file_id in self._movies]
+            for file_id in removed:
+                self._remove(file_id)
+            if removed:
+                self._bump()
+
+    def get(self, file_id):
+        """Копия фильма по file_id или None"""
+        self.refresh()
+        with self._lock:
+            movie = self._movies.get(file_id)
+            return movie.to_dict() if movie is not None else None
+
+    def revision(self, file_id):
+        """
+        Ревизия записи для ключей кеша: version и хеш отметки хранилища.
+
+        Отметка учитывает и записи без увеличения version (импорт, перенос).
+        """
+        with self._lock:
+            movie = self._movies.get(file_id)
+            if movie is None:
+                return None
+            return f"{movie.get('version', 1)}-{_entry_hash(file_id, self._stamps[file_id]):016x}"
+
+    def find_duplicate(self, movie):
+        """file_id фильма с тем же dedup_key или None"""
+        self.refresh()
+        with self._lock:
+            file_ids = self._dedup.get(dedup_key(movie))
+            return min(file_ids) if file_ids else None
+
+    def get_many(self, file_ids):
+        """Копии фильмов в порядке file_ids, отсутствующие пропускаются"""
+        self.refresh()
+        with self._lock:
+            return [self._movies[file_id].to_dict() for file_id in file_ids if file_id in self._movies]
+
+    def movies(self):
+        """Копии всех фильмов, новые сверху"""
+        self.refresh()
+        with self._lock:
+            return [self._movies[file_id].to_dict() for _, file_id in reversed(self._order)]
+
+    def iter_movies(self, predicate=None):
+        """
+        Лениво отдавать копии фильмов (новые сверху), подходящие под predicate.
+
+        Под блокировкой копируется только список ключей, сами записи
+        копируются по одной, поэтому весь каталог не дублируется в памяти.
+        """
+        self.refresh()
+        with self._lock:
+            keys = list(self._order)
+        for _, file_id in reversed(keys):
+            with self._lock:
+                movie = self._movies.get(file_id)
+                movie = movie.to_dict() if movie is not None else None
+            if movie is not None and (predicate is None or predicate(movie)):
+                yield movie
+
+    def page(self, cursor=None, limit=20):
+        """
+        Страница фильмов (новые сверху) после курсора.
+
+        Курсор - ключ сортировки последнего показанного фильма, поэтому
+        поиск начала страницы стоит O(log N) независимо от ее номера.
+        Возвращает (фильмы, курсор следующей страницы или None).
+        """
+        self.refresh()
+        with self._lock:
+            end = len(self._order) if cursor is None else bisect_left(self._order, cursor)
+            start = max(end - limit, 0)
+            keys = self._order[start:end]
+            movies = [self._movies[file_id].to_dict() for _, file_id in reversed(keys)]
+            next_cursor = keys[0] if start > 0 and keys else None
+        return movies, next_cursor
+
+    def ordered_ids(self, offset=0, limit=20):
+        """id фильмов (новые сверху) со смещением offset, сами записи не копируются"""
+        self.refresh()
+        with self._lock:
+            end = max(len(self._order) - offset, 0)
+            return [file_id for _, file_id in reversed(self._order[max(end - limit, 0):end])]
+
+    def __len__(self):
+        self.refresh()
+        with self._lock:
+            return len(self._movies)
+
+
+def encode_cursor(key):
+    """Упаковать ключ сортировки в строку для GET параметра"""
+    raw = json.dumps(list(key), ensure_ascii=False).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(value):
+    """Распаковать курсор из GET параметра, None если он поврежден"""
+    try:
+        raw = base64.urlsafe_b64decode(value + '=' * (-len(value) % 4))
+        created_at, file_id = json.loads(raw.decode('utf-8'))
+    except (binascii.Error, UnicodeDecodeError, ValueError, TypeError):
+        return None
+    # created_at в курсоре - метка времени, как в ключе сортировки каталога
+    if isinstance(created_at, bool) or not isinstance(created_at, (int, float)) or not isinstance(file_id, str):
+        return None
+    return (float(created_at), file_id)
+
+
+_catalogs = {}
+_catalogs_lock = threading.Lock()
+
+
+def get_catalog():
+    """Общий для процесса индекс каталога для текущего хранилища"""
+    storage = get_storage()
+    catalog = _catalogs.get(storage.key)
+    if catalog is None:
+        with _catalogs_lock:
+            catalog = _catalogs.get(storage.key)
+            if catalog is None:
+                catalog = MovieCatalog(
+                    storage,
+                    rescan_interval=getattr(settings, 'MOVIE_CATALOG_RESCAN_INTERVAL', 60),
+                )
+                _catalogs[storage.key] = catalog
+    return catalog
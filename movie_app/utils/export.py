@@ -0,0 +1,68 @@
+import json
+import zlib
+import textwrap
+
+EXPORT_FORMATS = ('pretty', 'compact', 'ndjson')
+SERVICE_FIELDS = ('file_id', 'version', 'source', 'import_batch')
+CHUNK_SIZE = 64 * 1024
+
+
+def clean_movie(movie):
+    """Убрать служебные поля перед экспортом"""
+    for field in SERVICE_FIELDS:
+        movie.pop(field, None)
+    return movie
+
+
+def _pretty(movies):
+    # Тот же вывод, что json.dumps(movies, ensure_ascii=False, indent=2)
+    first = True
+    for movie in movies:
+        body = textwrap.indent(json.dumps(movie, ensure_ascii=False, indent=2), '  ')
+        yield ('[\n' if first else ',\n') + body
+        first = False
+    yield '[]' if first else '\n]'
+
+
+def _compact(movies):
+    first = True
+    for movie in movies:
+        yield ('[' if first else ',') + json.dumps(movie, ensure_ascii=False, separators=(',', ':'))
+        first = False
+    yield '[]' if first else ']'
+
+
+def _ndjson(movies):
+    for movie in movies:
+        yield json.dumps(movie, ensure_ascii=False, separators=(',', ':')) + '\n'
+
+
+def iter_export(movies, export_format='pretty', chunk_size=CHUNK_SIZE):
+    """
+    Сериализовать фильмы по одному и отдавать байты кусками ~chunk_size.
+
+    В памяти одновременно находится только текущий фильм и один кусок.
+    """
+    encoder = {'pretty': _pretty, 'compact': _compact, 'ndjson': _ndjson}[export_format]
+    buffer = []
+    size = 0
+    for part in encoder(clean_movie(movie) for movie in movies):
+        data = part.encode('utf-8')
+        buffer.append(data)
+        size += len(data)
+        if size >= chunk_size:
+            yield b''.join(buffer)
+            buffer = []
+            size = 0
+    if buffer:
+        yield b''.join(buffer)
+
+
+def gzip_stream(chunks, level=6):
+    """Сжимать поток кусков в gzip на лету"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
@@ -0,0 +1,134 @@
+import os
+import re
+from stat import S_ISREG
+from functools import partial
+from .aio import run_io, gather_io
+from .catalog import get_json_dir
+
+RAW_FILE_EXTENSIONS = ('.json', '.jsonl', '.ndjson')
+CHUNK_SIZE = 64 * 1024
+
+_range_re = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def list_json_files():
+    """Метаданные JSON файлов хранилища: только stat, содержимое не читается"""
+    json_dir = get_json_dir()
+    files = []
+    if not os.path.exists(json_dir):
+        return files
+
+    with os.scandir(json_dir) as entries:
+        for entry in entries:
+            if not entry.name.endswith(RAW_FILE_EXTENSIONS) or not entry.is_file():
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            files.append(_file_info(entry.name, stat))
+
+    files.sort(key=lambda x: x['name'])
+    return files
+
+
+def _file_info(name, stat):
+    return {
+        'name': name,
+        'size': stat.st_size,
+        'modified': stat.st_mtime,
+    }
+
+
+def _json_file_names(json_dir):
+    if not os.path.exists(json_dir):
+        return []
+    with os.scandir(json_dir) as entries:
+        return [entry.name for entry in entries if entry.name.endswith(RAW_FILE_EXTENSIONS)]
+
+
+def _stat_files(json_dir, names):
+    files = []
+    for name in names:
+        try:
+            stat = os.stat(os.path.join(json_dir, name))
+        except FileNotFoundError:
+            continue
+        if S_ISREG(stat.st_mode):
+            files.append(_file_info(name, stat))
+    return files
+
+
+async def alist_json_files():
+    """То же, что list_json_files(), но stat файлов выполняется кусками параллельно в пуле"""
+    json_dir = get_json_dir()
+    names = await run_io(_json_file_names, json_dir)
+    files = await gather_io(partial(_stat_files, json_dir), names)
+    files.sort(key=lambda x: x['name'])
+    return files
+
+
+def resolve_json_file(filename):
+    """Путь к файлу хранилища или None, если имя недопустимо"""
+    if os.path.basename(filename) != filename or not filename.endswith(RAW_FILE_EXTENSIONS):
+        return None
+    return os.path.join(get_json_dir(), filename)
+
+
+def stat_json_file(filename):
+    """os.stat файла хранилища или None, если имя недопустимо или файла нет"""
+    file_path = resolve_json_file(filename)
+    if not file_path:
+        return None
+    try:
+        stat = os.stat(file_path)
+    except OSError:
+        return None
+    return stat if S_ISREG(stat.st_mode) else None
+
+
+def file_etag(stat):
+    """Строгий ETag файла из размера и mtime в наносекундах, без чтения содержимого"""
+    return f'{stat.st_size:x}-{stat.st_mtime_ns:x}'
+
+
+def parse_range(header, size):
+    """
+    Разобрать заголовок Range для одного диапазона.
+
+    Возвращает (start, end) включительно, None если заголовка нет или он
+    не поддерживается (тогда отдается весь файл), и False если диапазон
+    не пересекается с файлом.
+    """
+    if not header:
+        return None
+    match = _range_re.match(header.strip())
+    if not match or match.groups() == ('', ''):
+        return None
+
+    first, last = match.groups()
+    if first == '':
+        # Суффикс: последние N байт
+        length = int(last)
+        if length == 0:
+            return False
+        return max(size - length, 0), size - 1
+
+    start = int(first)
+    end = int(last) if last else size - 1
+    if start >= size or end < start:
+        return False
+    return start, min(end, size - 1)
+
+
+def iter_file_range(file_path, start, length, chunk_size=CHUNK_SIZE):
+    """Читать файл кусками, не загружая его в память целиком"""
+    with open(file_path, 'rb') as f:
+        f.seek(start)
+        remaining = length
+        while remaining > 0:
+            chunk = f.read(min(chunk_size, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
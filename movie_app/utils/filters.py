@@ -0,0 +1,73 @@
+from urllib.parse import urlencode
+from .search import normalize
+
+
+class MovieFilter:
+    """
+    Фильтр фильмов по GET параметрам.
+
+    genre - точное совпадение, director - подстрока (оба после normalize(),
+    как в поисковом индексе), *_min / *_max - границы включительно для года,
+    рейтинга и длительности, *_below - верхняя граница не включительно
+    (полуоткрытые интервалы фасетов: 8 <= рейтинг < 9).
+    """
+
+    text_params = ('genre', 'director')
+    range_params = {
+        'year': int,
+        'rating': float,
+        'duration': int,
+    }
+    range_suffixes = ('min', 'max', 'below')
+
+    def __init__(self, **params):
+        self.params = {key: value for key, value in params.items() if value is not None}
+
+    @classmethod
+    def from_query(cls, query):
+        """Собрать фильтр из QueryDict, ValueError при неверном числе"""
+        params = {}
+        for name in cls.text_params:
+            value = query.get(name, '').strip()
+            if value:
+                params[name] = value
+        for name, convert in cls.range_params.items():
+            for suffix in cls.range_suffixes:
+                key = f'{name}_{suffix}'
+                value = query.get(key, '').strip()
+                if value:
+                    try:
+                        params[key] = convert(value)
+                    except ValueError:
+                        raise ValueError(f'Неверное значение параметра {key}: {value}')
+        return cls(**params)
+
+    def __bool__(self):
+        return bool(self.params)
+
+    def query_string(self):
+        """Канонический вид фильтра для ключей кеша и ETag"""
+        return urlencode(sorted(self.params.items()))
+
+    def __call__(self, movie):
+        params = self.params
+        if 'genre' in params and normalize(str(movie.get('genre', '')).strip()) != normalize(params['genre']):
+            return False
+        if 'director' in params and normalize(params['director']) not in normalize(movie.get('director', '')):
+            return False
+        for name in self.range_params:
+            low = params.get(f'{name}_min')
+            high = params.get(f'{name}_max')
+            below = params.get(f'{name}_below')
+            if low is None and high is None and below is None:
+                continue
+            value = movie.get(name)
+            if not isinstance(value, (int, float)):
+                return False
+            if low is not None and value < low:
+                return False
+            if high is not None and value > high:
+                return False
+            if below is not None and value >= below:
+                return False
+        return True
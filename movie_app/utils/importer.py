@@ -0,0 +1,129 @@
+from collections import Counter
+from .catalog import get_catalog, dedup_key
+from .export import clean_movie
+
+IMPORTED = 'imported'
+DUPLICATE = 'duplicate'
+DUPLICATE_IN_FILE = 'duplicate_in_file'
+FAILED = 'failed'
+INVALID = 'invalid'
+
+STATUS_LABELS = {
+    IMPORTED: 'импортирован',
+    DUPLICATE: 'уже есть в базе',
+    DUPLICATE_IN_FILE: 'повторяется в файле',
+    FAILED: 'ошибка сохранения',
+    INVALID: 'не прошел проверку',
+}
+
+
+class MovieImporter:
+    """
+    Импорт фильмов с проверкой дубликатов по индексу каталога.
+
+    Дубликаты в базе ищутся за O(1) через индекс dedup_key каталога,
+    дубликаты внутри загружаемого файла - через словарь уже встреченных ключей.
+    Для каждой записи сохраняется результат импорта.
+
+    Новые записи копятся в пачку и сохраняются через save_batch по
+    batch_size штук, поэтому в памяти одновременно не больше одной пачки.
+    Если передана партия batch (ImportBatch), записи помечаются ее id, а
+    id сохраненных записей дописываются в манифест импорта.
+    """
+
+    def __init__(self, save_batch, catalog=None, batch_size=500, source=None, batch=None):
+        self.save_batch = save_batch
+        self.source = source
+        self.batch = batch
+        self.catalog = catalog or get_catalog()
+        self.batch_size = batch_size
+        self.results = []
+        self.stats = Counter()
+        self._seen = {}
+        self._pending = []
+
+    def add(self, movie_data):
+        """Импортировать одну запись и вернуть ее результат"""
+        index = len(self.results)
+        key = dedup_key(movie_data)
+        result = {
+            'index': index,
+            'title': movie_data.get('title', ''),
+            'status': IMPORTED,
+            'file_id': None,
+            'duplicate_of': None,
+        }
+
+        if key in self._seen:
+            result['status'] = DUPLICATE_IN_FILE
+            result['duplicate_of'] = self._seen[key]
+        else:
+            self._seen[key] = index
+            existing = self.catalog.find_duplicate(movie_data)
+            if existing:
+                result['status'] = DUPLICATE
+                result['duplicate_of'] = existing
+            else:
+                # id и версию назначает хранилище, а не загружаемый файл
+                movie_data = clean_movie(movie_data)
+                if self.source:
+                    movie_data['source'] = self.source
+                if self.batch:
+                    movie_data['import_batch'] = self.batch.id
+                self._pending.append((result, movie_data))
+
+        self.results.append(result)
+        if result['status'] != IMPORTED:
+            self.stats[result['status']] += 1
+        if len(self._pending) >= self.batch_size:
+            self.flush()
+        return result
+
+    def reject(self, movie_data, error):
+        """Пропустить запись, не прошедшую проверку, сохранив причину"""
+        result = {
+            'index': len(self.results),
+            'title': movie_data.get('title', '') if isinstance(movie_data, dict) else '',
+            'status': INVALID,
+            'file_id': None,
+            'duplicate_of': None,
+            'error': error,
+        }
+        self.results.append(result)
+        self.stats[INVALID] += 1
+        return result
+
+    def flush(self):
+        """Сохранить накопленную пачку новых записей"""
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, []
+        try:
+            file_ids = self.save_batch([movie_data for _, movie_data in pending])
+        except Exception:
+            for result, _ in pending:
+                result['status'] = FAILED
+            self.stats[FAILED] += len(pending)
+            raise
+        for (result, _), file_id in zip(pending, file_ids):
+            result['file_id'] = file_id
+        if self.batch:
+            self.batch.record(file_ids)
+        self.stats[IMPORTED] += len(pending)
+
+    def counts(self):
+        """Количество записей по каждому результату"""
+        return Counter(self.stats)
+
+    def skipped(self):
+        """Записи, которые не были импортированы"""
+        return [result for result in self.results if result['status'] != IMPORTED]
+
+
+def import_movies(movies_data, save_batch, catalog=None, batch_size=500, source=None, batch=None):
+    """Импортировать фильмы из итератора, вернуть MovieImporter с результатами"""
+    importer = MovieImporter(save_batch, catalog, batch_size, source, batch)
+    for movie_data in movies_data:
+        importer.add(movie_data)
+    importer.flush()
+    return importer
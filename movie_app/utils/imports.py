@@ -0,0 +1,178 @@
+import os
+import re
+import json
+import uuid
+import threading
+from django.conf import settings
+from django.utils import timezone
+from .storage import VersionConflict
+
+BATCH_ID_RE = re.compile(r'^[0-9a-f]{8,32}$')
+
+# Описание партии переписывается целиком, дозапись id и изменения описания
+# из разных потоков процесса идут по очереди
+_lock = threading.Lock()
+
+UNCHANGED = 'unchanged'
+MODIFIED = 'modified'
+DELETED = 'deleted'
+ROLLED_BACK = 'rolled_back'
+
+
+class ImportBatch:
+    """Открытая партия импорта: id для пометки записей и дозапись их id в манифест"""
+
+    def __init__(self, manifest, batch_id):
+        self.manifest = manifest
+        self.id = batch_id
+
+    def record(self, file_ids):
+        """Добавить id сохраненной пачки записей"""
+        self.manifest.record(self.id, file_ids)
+
+    def finish(self, status):
+        """Отметить окончание импорта со статусом задачи"""
+        self.manifest.update(self.id, status=status, finished_at=timezone.now().isoformat())
+
+
+class ImportManifest:
+    """
+    Манифест импортов в MEDIA_ROOT/imports.
+
+    На каждую партию два файла: <batch>.json с описанием (загруженный
+    файл, статус, время) и <batch>.ids - id созданных записей по одному
+    на строку, дописываются после каждой сохраненной пачки. По манифесту
+    партию можно показать, сравнить с каталогом и откатить, не просматривая
+    весь каталог.
+    """
+
+    def __init__(self, location):
+        self.location = location
+
+    def _path(self, batch_id, suffix):
+        if not BATCH_ID_RE.match(batch_id or ''):
+            raise KeyError(batch_id)
+        return os.path.join(self.location, f'{batch_id}{suffix}')
+
+    def _write_meta(self, batch_id, meta):
+        path = self._path(batch_id, '.json')
+        tmp_path = f'{path}.{uuid.uuid4().hex[:8]}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, path)
+
+    def create(self, batch_id, **meta):
+        """Начать партию, вернуть ImportBatch"""
+        os.makedirs(self.location, exist_ok=True)
+        with _lock:
+            self._write_meta(batch_id, {
+                'id': batch_id,
+                'status': 'running',
+                'created_at': timezone.now().isoformat(),
+                **meta,
+            })
+            open(self._path(batch_id, '.ids'), 'a').close()
+        return ImportBatch(self, batch_id)
+
+    def record(self, batch_id, file_ids):
+        with _lock, open(self._path(batch_id, '.ids'), 'a', encoding='utf-8') as f:
+            f.writelines(f'{file_id}\n' for file_id in file_ids)
+
+    def update(self, batch_id, **fields):
+        with _lock:
+            meta = self.get(batch_id)
+            if meta is None:
+                return None
+            meta.update(fields)
+            self._write_meta(batch_id, meta)
+            return meta
+
+    def get(self, batch_id):
+        """Описание партии, None если ее нет"""
+        try:
+            with open(self._path(batch_id, '.json'), encoding='utf-8') as f:
+                return json.load(f)
+        except (KeyError, OSError, ValueError):
+            return None
+
+    def record_ids(self, batch_id):
+        """id записей партии в порядке импорта"""
+        try:
+            with open(self._path(batch_id, '.ids'), encoding='utf-8') as f:
+                return [line.strip() for line in f if line.strip()]
+        except (KeyError, OSError):
+            return []
+
+    def batches(self):
+        """Описания всех партий, новые сверху, с количеством записей"""
+        try:
+            names = os.listdir(self.location)
+        except FileNotFoundError:
+            return []
+        batches = []
+        for name in names:
+            batch_id, ext = os.path.splitext(name)
+            if ext != '.json':
+                continue
+            meta = self.get(batch_id)
+            if meta is not None:
+                meta['records'] = len(self.record_ids(batch_id))
+                batches.append(meta)
+        return sorted(batches, key=lambda meta: meta.get('created_at', ''), reverse=True)
+
+    def diff(self, batch_id, catalog):
+        """
+        Состояние записей партии в каталоге: id -> unchanged, modified или deleted.
+
+        Записи берутся из индекса каталога по id из манифеста. Измененной
+        считается запись с версией больше 1 (импорт создает версию 1),
+        удаленной - отсутствующая или принадлежащая другой партии.
+        """
+        file_ids = self.record_ids(batch_id)
+        current = {movie['file_id']: movie for movie in catalog.get_many(file_ids)}
+        states = {}
+        for file_id in file_ids:
+            movie = current.get(file_id)
+            if movie is None or movie.get('import_batch') != batch_id:
+                states[file_id] = DELETED
+            elif movie.get('version', 1) > 1:
+                states[file_id] = MODIFIED
+            else:
+                states[file_id] = UNCHANGED
+        return states
+
+    def rollback(self, batch_id, catalog, delete_records, force=False):
+        """
+        Удалить записи партии одним вызовом delete_records(ids, expected_versions).
+
+        Измененные после импорта записи остаются, если не указан force.
+        Возвращает id -> rolled_back, modified (оставлена) или deleted (уже не было).
+        """
+        states = self.diff(batch_id, catalog)
+        targets = [
+            file_id for file_id, state in states.items()
+            if state == UNCHANGED or (force and state == MODIFIED)
+        ]
+        results = dict(states)
+        if targets:
+            # Неизмененные записи удаляются только в версии 1: правка, сделанная
+            # после сверки с каталогом, сохраняется
+            expected_versions = {file_id: 1 for file_id in targets if states[file_id] == UNCHANGED}
+            for file_id, found in delete_records(targets, expected_versions).items():
+                if isinstance(found, VersionConflict):
+                    results[file_id] = MODIFIED
+                else:
+                    results[file_id] = ROLLED_BACK if found else DELETED
+        meta = self.get(batch_id) or {}
+        self.update(
+            batch_id,
+            rolled_back_at=timezone.now().isoformat(),
+            rolled_back=meta.get('rolled_back', 0) + sum(1 for state in results.values() if state == ROLLED_BACK),
+        )
+        return results
+
+
+def get_import_manifest():
+    """Манифест импортов в MOVIE_IMPORT_MANIFEST_DIR (по умолчанию MEDIA_ROOT/imports)"""
+    location = getattr(settings, 'MOVIE_IMPORT_MANIFEST_DIR', None)
+    return ImportManifest(location or os.path.join(settings.MEDIA_ROOT, 'imports'))
@@ -0,0 +1,222 @@
+import os
+import json
+import uuid
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+from .importer import MovieImporter, IMPORTED, DUPLICATE, DUPLICATE_IN_FILE, FAILED, INVALID
+from .imports import get_import_manifest
+from .json_validator import iter_movies, validate_movie
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+ERROR = 'error'
+CANCELLED = 'cancelled'
+
+FINISHED_STATUSES = (DONE, ERROR, CANCELLED)
+
+STATUS_LABELS = {
+    QUEUED: 'в очереди',
+    RUNNING: 'импорт',
+    DONE: 'завершен',
+    ERROR: 'ошибка',
+    CANCELLED: 'отменен',
+}
+
+
+class ImportJob:
+    """Задача импорта загруженного файла и ее прогресс"""
+
+    def __init__(self, file_path, original_name, delete_upload=False):
+        self.id = uuid.uuid4().hex[:12]
+        self.file_path = file_path
+        self.original_name = original_name
+        self.delete_upload = delete_upload
+        self.status = QUEUED
+        self.message = ''
+        self.created_at = timezone.now()
+        self.finished_at = None
+        self.importer = None
+        self.batch = None
+        self._cancel = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def is_finished(self):
+        return self.status in FINISHED_STATUSES
+
+    def cancel(self):
+        """
+        Запросить отмену: задача в очереди отменяется сразу,
+        запущенная остановится перед следующей записью
+        """
+        with self._lock:
+            self._cancel.set()
+            if self.status == QUEUED:
+                self.status = CANCELLED
+                self.message = 'Импорт отменен до начала'
+                self.finished_at = timezone.now()
+                self.remove_upload()
+
+    @property
+    def cancel_requested(self):
+        return self._cancel.is_set()
+
+    def remove_upload(self):
+        """Удалить загруженный файл, если задача создана с delete_upload"""
+        if not self.delete_upload:
+            return
+        try:
+            os.remove(self.file_path)
+        except FileNotFoundError:
+            pass
+
+    def to_dict(self, skipped_limit=50):
+        """Состояние задачи для страницы статуса и JSON ответа"""
+        counts = self.importer.counts() if self.importer else {}
+        skipped = self.importer.skipped()[:skipped_limit] if self.importer else []
+        return {
+            'id': self.id,
+            'batch_id': self.batch.id if self.batch else None,
+            'file': self.original_name,
+            'status': self.status,
+            'status_label': STATUS_LABELS[self.status],
+            'message': self.message,
+            'processed': len(self.importer.results) if self.importer else 0,
+            'imported': counts.get(IMPORTED, 0),
+            'duplicates': counts.get(DUPLICATE, 0) + counts.get(DUPLICATE_IN_FILE, 0),
+            'failed': counts.get(FAILED, 0),
+            'invalid': counts.get(INVALID, 0),
+            'skipped': skipped,
+            'created_at': self.created_at.isoformat(),
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+        }
+
+
+def run_import_job(job, save_batch, batch_size=500):
+    """
+    Проверить и импортировать файл задачи за один проход, обновляя ее прогресс.
+
+    Каждая запись проверяется перед импортом; записи с ошибками пропускаются
+    с причиной и номером. Если файл оказался битым JSON, уже сохраненные
+    пачки остаются в партии импорта, и ее можно откатить.
+    """
+    job.status = RUNNING
+    # Фильмы помечаются именем загруженного файла и партией импорта (id задачи),
+    # id созданных записей попадают в манифест, по которому партию можно откатить
+    source = os.path.basename(job.file_path)
+    job.batch = get_import_manifest().create(job.id, file=job.original_name, source=source)
+    job.importer = MovieImporter(save_batch, batch_size=batch_size, source=source, batch=job.batch)
+    try:
+        for i, movie_data in enumerate(iter_movies(job.file_path)):
+            if job.cancel_requested:
+                break
+            is_valid, message = validate_movie(movie_data, i)
+            if is_valid:
+                job.importer.add(movie_data)
+            else:
+                job.importer.reject(movie_data, message)
+    except (json.JSONDecodeError, TypeError, ValueError) as e:
+        job.importer.flush()
+        job.status = ERROR
+        if isinstance(e, json.JSONDecodeError):
+            job.message = f'Невалидный JSON формат после записи {len(job.importer.results)}: {e}'
+        else:
+            job.message = f'Ошибка валидации: {e}'
+        if job.importer.counts()[IMPORTED]:
+            job.message += '. Уже импортированные фильмы можно откатить вместе с партией'
+        return
+    job.importer.flush()
+
+    if job.cancel_requested:
+        job.status = CANCELLED
+        job.message = 'Импорт отменен, уже сохраненные фильмы остались в базе'
+    elif not job.importer.results:
+        job.status = ERROR
+        job.message = 'Ошибка валидации: JSON файл пуст'
+    else:
+        job.status = DONE
+
+
+class ImportJobQueue:
+    """
+    Очередь задач импорта на пуле потоков.
+
+    Задачи хранятся в памяти процесса; завершенные задачи сверх keep
+    удаляются, начиная с самых старых. Загруженные файлы остаются в
+    json_files; с delete_uploads файл задачи удаляется, как только она
+    завершилась или была отменена.
+    """
+
+    def __init__(self, max_workers=2, keep=100, delete_uploads=False):
+        self.keep = keep
+        self.delete_uploads = delete_uploads
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='movie-import')
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, file_path, original_name, save_batch, batch_size=500):
+        """Поставить файл в очередь на импорт, вернуть задачу"""
+        job = ImportJob(file_path, original_name, delete_upload=self.delete_uploads)
+        with self._lock:
+            self._jobs[job.id] = job
+            self._prune()
+        self._executor.submit(self._run, job, save_batch, batch_size)
+        return job
+
+    def _run(self, job, save_batch, batch_size):
+        with job._lock:
+            if job.cancel_requested:
+                # Отменена в очереди: статус и файл уже обработал cancel()
+                return
+            job.status = RUNNING
+        close_old_connections()
+        try:
+            run_import_job(job, save_batch, batch_size)
+        except Exception as e:
+            job.status = ERROR
+            job.message = f'Ошибка при импорте данных: {str(e)}'
+        finally:
+            close_old_connections()
+            job.remove_upload()
+        job.finished_at = timezone.now()
+        if job.batch:
+            job.batch.finish(job.status)
+
+    def _prune(self):
+        finished = [job for job in self._jobs.values() if job.is_finished]
+        for job in sorted(finished, key=lambda x: x.created_at)[:max(len(finished) - self.keep, 0)]:
+            del self._jobs[job.id]
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id):
+        """Отменить задачу, False если задача не найдена или уже завершена"""
+        job = self.get(job_id)
+        if job is None or job.is_finished:
+            return False
+        job.cancel()
+        return True
+
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def get_job_queue():
+    """Общая для процесса очередь задач импорта"""
+    global _queue
+    if _queue is None:
+        with _queue_lock:
+            if _queue is None:
+                _queue = ImportJobQueue(
+                    max_workers=getattr(settings, 'MOVIE_IMPORT_WORKERS', 2),
+                    keep=getattr(settings, 'MOVIE_IMPORT_JOBS_KEEP', 100),
+                    delete_uploads=getattr(settings, 'MOVIE_IMPORT_DELETE_UPLOADS', False),
+                )
+    return _queue
@@ -1,55 +1,172 @@
 import json
 import os
 
+JSON_LINES_EXTENSIONS = ('.jsonl', '.ndjson')
+CHUNK_SIZE = 64 * 1024
+MAX_ITEM_SIZE = 16 * 1024 * 1024
+
+_decoder = json.JSONDecoder()
+
+
+def is_json_lines(file_path):
+    """Файл в формате JSON Lines (один фильм на строку)"""
+    return file_path.lower().endswith(JSON_LINES_EXTENSIONS)
+
+
+def iter_json_array(file, chunk_size=CHUNK_SIZE, max_item_size=MAX_ITEM_SIZE):
+    """
+    Инкрементально разобрать массив верхнего уровня, отдавая элементы по одному.
+
+    В памяти держится только текущий кусок файла и разбираемый элемент,
+    поэтому размер файла на потребление памяти не влияет. Элемент больше
+    max_item_size считается ошибкой, чтобы битый файл не читался целиком.
+    """
+    buffer = ''
+    pos = 0
+    eof = False
+
+    def fill():
+        nonlocal buffer, pos, eof
+        chunk = file.read(chunk_size)
+        if not chunk:
+            eof = True
+        buffer = buffer[pos:] + chunk
+        pos = 0
+
+    def skip_whitespace():
+        nonlocal pos
+        while True:
+            while pos < len(buffer) and buffer[pos] in ' \t\r\n':
+                pos += 1
+            if pos < len(buffer) or eof:
+                return
+            fill()
+
+    skip_whitespace()
+    if pos >= len(buffer):
+        raise ValueError("JSON файл пуст")
+    if buffer[pos] != '[':
+        raise TypeError("JSON должен содержать массив объектов")
+    pos += 1
+
+    first = True
+    while True:
+        skip_whitespace()
+        if pos >= len(buffer):
+            raise json.JSONDecodeError("Массив не закрыт", buffer, pos)
+        if buffer[pos] == ']':
+            pos += 1
+            break
+        if not first:
+            if buffer[pos] != ',':
+                raise json.JSONDecodeError("Ожидалась запятая", buffer, pos)
+            pos += 1
+            skip_whitespace()
+
+        # Элемент может не поместиться в буфер - дочитываем, пока не разберется
+        while True:
+            try:
+                item, end = _decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                if eof or len(buffer) - pos > max_item_size:
+                    raise
+                fill()
+                continue
+            # Число на границе куска могло быть обрезано
+            if end == len(buffer) and not eof:
+                fill()
+                continue
+            break
+
+        pos = end
+        first = False
+        yield item
+
+    skip_whitespace()
+    if pos < len(buffer):
+        raise json.JSONDecodeError("Лишние данные после массива", buffer, pos)
+
+
+def iter_json_lines(file):
+    """Разобрать JSON Lines: по одному объекту на непустую строку"""
+    for line_number, line in enumerate(file, start=1):
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError as e:
+            raise json.JSONDecodeError(f"строка {line_number}: {e.msg}", e.doc, e.pos)
+
+
+def iter_movies(file_path):
+    """Потоково читать фильмы из JSON массива или JSON Lines файла"""
+    with open(file_path, 'r', encoding='utf-8') as file:
+        if is_json_lines(file_path):
+            yield from iter_json_lines(file)
+        else:
+            yield from iter_json_array(file)
+
+
+def validate_movie(movie, i):
+    """
+    Проверить один фильм, i - порядковый номер с нуля
+    """
+    required_fields = ['title', 'director', 'year', 'genre', 'duration', 'rating']
+
+    # Проверяем, что каждый элемент - словарь
+    if not isinstance(movie, dict):
+        return False, f"Элемент {i} должен быть объектом"
+
+    # Проверяем наличие обязательных полей
+    for field in required_fields:
+        if field not in movie:
+            return False, f"Отсутствует обязательное поле: '{field}' в фильме {i+1}"
+
+    # Проверяем типы данных
+    if not isinstance(movie['title'], str) or not movie['title'].strip():
+        return False, f"Название фильма {i+1} должно быть непустой строкой"
+
+    if not isinstance(movie['director'], str) or not movie['director'].strip():
+        return False, f"Режиссер фильма {i+1} должен быть непустой строкой"
+
+    if not isinstance(movie['year'], int) or movie['year'] < 1895 or movie['year'] > 2030:
+        return False, f"Год фильма {i+1} должен быть целым числом между 1895 и 2030"
+
+    if not isinstance(movie['genre'], str) or not movie['genre'].strip():
+        return False, f"Жанр фильма {i+1} должен быть непустой строкой"
+
+    if not isinstance(movie['duration'], int) or movie['duration'] <= 0:
+        return False, f"Продолжительность фильма {i+1} должна быть положительным целым числом"
+
+    if not isinstance(movie['rating'], (int, float)) or movie['rating'] < 0 or movie['rating'] > 10:
+        return False, f"Рейтинг фильма {i+1} должен быть числом между 0 и 10"
+
+    return True, ""
+
+
 def validate_movie_json(file_path):
     """
-    Валидация JSON файла с данными о фильмах
+    Валидация JSON файла с данными о фильмах.
+
+    Файл разбирается потоково, поэтому целиком в память не загружается.
+    Поддерживаются JSON массив и JSON Lines (.jsonl, .ndjson).
     """
     try:
-        with open(file_path, 'r', encoding='utf-8') as file:
-            data = json.load(file)
-        
-        # Проверяем, является ли data списком
-        if not isinstance(data, list):
-            return False, "JSON должен содержать массив объектов"
-        
-        if len(data) == 0:
+        count = 0
+        for i, movie in enumerate(iter_movies(file_path)):
+            is_valid, message = validate_movie(movie, i)
+            if not is_valid:
+                return False, message
+            count += 1
+
+        if count == 0:
             return False, "JSON файл пуст"
-        
-        required_fields = ['title', 'director', 'year', 'genre', 'duration', 'rating']
-        
-        for i, movie in enumerate(data):
-            # Проверяем, что каждый элемент - словарь
-            if not isinstance(movie, dict):
-                return False, f"Элемент {i} должен быть объектом"
-            
-            # Проверяем наличие обязательных полей
-            for field in required_fields:
-                if field not in movie:
-                    return False, f"Отсутствует обязательное поле: '{field}' в фильме {i+1}"
-            
-            # Проверяем типы данных
-            if not isinstance(movie['title'], str) or not movie['title'].strip():
-                return False, f"Название фильма {i+1} должно быть непустой строкой"
-            
-            if not isinstance(movie['director'], str) or not movie['director'].strip():
-                return False, f"Режиссер фильма {i+1} должен быть непустой строкой"
-            
-            if not isinstance(movie['year'], int) or movie['year'] < 1895 or movie['year'] > 2030:
-                return False, f"Год фильма {i+1} должен быть целым числом между 1895 и 2030"
-            
-            if not isinstance(movie['genre'], str) or not movie['genre'].strip():
-                return False, f"Жанр фильма {i+1} должен быть непустой строкой"
-            
-            if not isinstance(movie['duration'], int) or movie['duration'] <= 0:
-                return False, f"Продолжительность фильма {i+1} должна быть положительным целым числом"
-            
-            if not isinstance(movie['rating'], (int, float)) or movie['rating'] < 0 or movie['rating'] > 10:
-                return False, f"Рейтинг фильма {i+1} должен быть числом между 0 и 10"
-        
+
         return True, "Файл валиден"
-    
+
     except json.JSONDecodeError as e:
         return False, f"Невалидный JSON формат: {str(e)}"
+    except (TypeError, ValueError) as e:
+        return False, str(e)
     except Exception as e:
-        return False, f"Ошибка при чтении файла: {str(e)}"
\ No newline at end of file
+        return False, f"Ошибка при чтении файла: {str(e)}"
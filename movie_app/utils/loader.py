@@ -0,0 +1,135 @@
+import os
+import json
+import time
+import heapq
+from operator import itemgetter
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from django.conf import settings
+from .records import created_timestamp
+
+try:
+    import orjson
+except ImportError:  # Необязательная зависимость: без нее используется json
+    orjson = None
+
+JSON_BACKEND = 'orjson' if orjson is not None else 'json'
+EXECUTORS = {
+    'thread': ThreadPoolExecutor,
+    'process': ProcessPoolExecutor,
+}
+
+_entry_key = itemgetter(0)
+
+
+def loads(data):
+    """Разобрать JSON из bytes: orjson, если установлен, иначе стандартный json"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dumps_pretty(data):
+    """JSON с отступом в 2 пробела в bytes, как json.dumps(indent=2, ensure_ascii=False); orjson, если установлен"""
+    if orjson is not None:
+        try:
+            return orjson.dumps(data, option=orjson.OPT_INDENT_2)
+        except TypeError:  # Например, целые больше 64 бит
+            pass
+    return json.dumps(data, ensure_ascii=False, indent=2).encode('utf-8')
+
+
+def read_shard(directory, file_ids):
+    """
+    Прочитать и разобрать кусок файлов фильмов.
+
+    Выполняется в потоке или процессе пула, поэтому не обращается к Django.
+    Возвращает записи ((created_at, id), фильм), отсортированные по ключу,
+    и статистику куска: время чтения и разбора, байты, нечитаемые файлы.
+    """
+    entries = []
+    stats = {'read': 0.0, 'decode': 0.0, 'bytes': 0, 'failed': []}
+    for file_id in file_ids:
+        started = time.perf_counter()
+        try:
+            # Файл читается целиком одним вызовом, разбор идет из bytes
+            with open(os.path.join(directory, file_id), 'rb') as f:
+                data = f.read()
+        except OSError:
+            stats['failed'].append(file_id)
+            continue
+        read_done = time.perf_counter()
+        try:
+            movie_data = loads(data)
+        except ValueError:
+            movie_data = None
+        stats['read'] += read_done - started
+        stats['decode'] += time.perf_counter() - read_done
+        stats['bytes'] += len(data)
+
+        if isinstance(movie_data, list) and movie_data and isinstance(movie_data[0], dict):
+            movie = movie_data[0]
+            entries.append(((created_timestamp(movie.get('created_at')), file_id), movie))
+        else:
+            stats['failed'].append(file_id)
+    entries.sort(key=_entry_key)
+    return entries, stats
+
+
+class ParallelLoader:
+    """
+    Параллельная загрузка файлов фильмов при холодном старте каталога.
+
+    Список файлов делится на куски по shard_size, куски читаются и
+    разбираются в пуле из workers потоков (executor='thread') или процессов
+    ('process' - разбор JSON не упирается в GIL, но фильмы копируются между
+    процессами). Отсортированные куски сливаются k-way слиянием по created_at.
+    """
+
+    def __init__(self, workers=None, shard_size=1000, executor='thread'):
+        if executor not in EXECUTORS:
+            raise ValueError(f'Неизвестный тип пула: {executor}')
+        self.workers = workers or min(32, (os.cpu_count() or 1) + 4)
+        self.shard_size = shard_size
+        self.executor = executor
+
+    def load(self, directory, file_ids):
+        """
+        Загрузить файлы, вернуть записи ((created_at, id), фильм) по возрастанию
+        ключа и отчет по фазам.
+        """
+        file_ids = list(file_ids)
+        shards = [file_ids[start:start + self.shard_size] for start in range(0, len(file_ids), self.shard_size)]
+
+        started = time.perf_counter()
+        workers = max(min(self.workers, len(shards)), 1)
+        with EXECUTORS[self.executor](max_workers=workers) as pool:
+            results = list(pool.map(partial(read_shard, directory), shards))
+        loaded = time.perf_counter()
+        entries = list(heapq.merge(*(shard_entries for shard_entries, _ in results), key=_entry_key))
+        merged = time.perf_counter()
+
+        failed = [file_id for _, stats in results for file_id in stats['failed']]
+        report = {
+            'files': len(file_ids),
+            'loaded': len(entries),
+            'failed': len(failed),
+            'bytes': sum(stats['bytes'] for _, stats in results),
+            'shards': len(shards),
+            'workers': workers,
+            'executor': self.executor,
+            'json_backend': JSON_BACKEND,
+            'phases': {
+                'load': loaded - started,
+                # Суммарное время всех потоков/процессов, не настенное
+                'read_total': sum(stats['read'] for _, stats in results),
+                'decode_total': sum(stats['decode'] for _, stats in results),
+                'merge': merged - loaded,
+            },
+        }
+        return entries, report
+
+
+def get_loader():
+    """Загрузчик с параметрами из MOVIE_PARALLEL_LOADER"""
+    return ParallelLoader(**getattr(settings, 'MOVIE_PARALLEL_LOADER', {}))
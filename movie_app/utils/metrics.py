@@ -0,0 +1,201 @@
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# Границы гистограммы длительности запроса, секунды
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_current = ContextVar('movie_request_metrics', default=None)
+
+
+class RequestMetrics:
+    """
+    Счетчики и время фаз одного запроса.
+
+    Заполняются хуками хранилища, шаблонов и кеша через count() и timed()
+    из любого потока, куда скопирован контекст запроса (run_io копирует),
+    поэтому изменения идут под блокировкой.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.counters = {}
+        self.timings = {}
+        self._active = {}
+        self._lock = threading.Lock()
+
+    def count(self, name, value=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def add_time(self, name, seconds):
+        with self._lock:
+            self.timings[name] = self.timings.get(name, 0.0) + seconds
+
+    def enter(self, name):
+        """Начать фазу; вложенный вход в ту же фазу не считается второй раз"""
+        with self._lock:
+            depth = self._active.get(name, 0)
+            self._active[name] = depth + 1
+            return depth == 0
+
+    def leave(self, name, seconds, outermost):
+        with self._lock:
+            self._active[name] -= 1
+            if outermost:
+                self.timings[name] = self.timings.get(name, 0.0) + seconds
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+
+def current():
+    """Метрики текущего запроса или None вне запроса"""
+    return _current.get()
+
+
+def start():
+    """Начать сбор метрик в текущем контексте, вернуть (метрики, токен для finish)"""
+    metrics = RequestMetrics()
+    return metrics, _current.set(metrics)
+
+
+def finish(token):
+    _current.reset(token)
+
+
+def count(name, value=1):
+    """Увеличить счетчик текущего запроса (вне запроса - ничего)"""
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.count(name, value)
+
+
+def add_time(name, seconds):
+    """Добавить уже измеренное время к фазе текущего запроса"""
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.add_time(name, seconds)
+
+
+@contextmanager
+def timed(name):
+    """Измерить время блока как фазу name текущего запроса; годится и как декоратор"""
+    metrics = _current.get()
+    if metrics is None:
+        yield
+        return
+    outermost = metrics.enter(name)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.leave(name, time.perf_counter() - started, outermost)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(**labels):
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + '}'
+
+
+class MetricsRegistry:
+    """
+    Накопленные метрики запросов процесса в формате Prometheus.
+
+    Счетчики живут в памяти процесса: при нескольких процессах каждый
+    отдает свои, их складывает сборщик метрик.
+    """
+
+    def __init__(self, buckets=DURATION_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._requests = {}
+        self._durations = {}
+        self._timings = {}
+        self._counters = {}
+
+    def observe(self, view, method, status, metrics):
+        """Учесть завершенный запрос"""
+        duration = metrics.elapsed
+        with self._lock:
+            key = (view, method, str(status))
+            self._requests[key] = self._requests.get(key, 0) + 1
+
+            histogram = self._durations.get(view)
+            if histogram is None:
+                histogram = self._durations[view] = [[0] * len(self.buckets), 0.0, 0]
+            index = bisect.bisect_left(self.buckets, duration)
+            if index < len(self.buckets):
+                histogram[0][index] += 1
+            histogram[1] += duration
+            histogram[2] += 1
+
+            for name, seconds in metrics.timings.items():
+                self._timings[(view, name)] = self._timings.get((view, name), 0.0) + seconds
+            for name, value in metrics.counters.items():
+                self._counters[(view, name)] = self._counters.get((view, name), 0) + value
+
+    def render(self):
+        """Текст для /metrics/ (text exposition format 0.0.4)"""
+        with self._lock:
+            requests = sorted(self._requests.items())
+            durations = sorted((view, (list(buckets), total, number)) for view, (buckets, total, number) in self._durations.items())
+            timings = sorted(self._timings.items())
+            counters = sorted(self._counters.items())
+
+        lines = [
+            '# HELP movie_requests_total Обработанные запросы',
+            '# TYPE movie_requests_total counter',
+        ]
+        for (view, method, status), value in requests:
+            lines.append(f'movie_requests_total{_labels(view=view, method=method, status=status)} {value}')
+
+        lines += [
+            '# HELP movie_request_duration_seconds Время обработки запроса до отдачи заголовков',
+            '# TYPE movie_request_duration_seconds histogram',
+        ]
+        for view, (buckets, total, number) in durations:
+            cumulative = 0
+            for bound, value in zip(self.buckets, buckets):
+                cumulative += value
+                lines.append(f'movie_request_duration_seconds_bucket{_labels(view=view, le=bound)} {cumulative}')
+            lines.append(f'movie_request_duration_seconds_bucket{_labels(view=view, le="+Inf")} {number}')
+            lines.append(f'movie_request_duration_seconds_sum{_labels(view=view)} {total:.6f}')
+            lines.append(f'movie_request_duration_seconds_count{_labels(view=view)} {number}')
+
+        lines += [
+            '# HELP movie_request_phase_seconds_total Время фаз запросов: чтение, разбор JSON, запись, база, шаблоны',
+            '# TYPE movie_request_phase_seconds_total counter',
+        ]
+        for (view, phase), value in timings:
+            lines.append(f'movie_request_phase_seconds_total{_labels(view=view, phase=phase)} {value:.6f}')
+
+        lines += [
+            '# HELP movie_request_events_total События запросов: открытые файлы, прочитанные байты, попадания в кеш',
+            '# TYPE movie_request_events_total counter',
+        ]
+        for (view, event), value in counters:
+            lines.append(f'movie_request_events_total{_labels(view=view, event=event)} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+_registry = MetricsRegistry()
+
+
+def get_registry():
+    """Общий для процесса реестр метрик"""
+    return _registry
+
+
+def server_timing(metrics):
+    """Значение заголовка Server-Timing: фазы в миллисекундах, счетчики в desc"""
+    parts = [f'total;dur={metrics.elapsed * 1000:.1f}']
+    parts += [f'{name};dur={seconds * 1000:.1f}' for name, seconds in sorted(metrics.timings.items())]
+    parts += [f'{name};desc="{value}"' for name, value in sorted(metrics.counters.items())]
+    return ', '.join(parts)
@@ -0,0 +1,486 @@
+import io
+import os
+import re
+import time
+import socket
+import hashlib
+import ipaddress
+import logging
+import mimetypes
+import threading
+import http.client
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+from django.conf import settings
+from django.urls import reverse
+from django.utils.module_loading import import_string
+from . import metrics
+from .render_cache import get_render_cache
+from .writes import WriteBatcher
+
+try:
+    from PIL import Image
+except ImportError:  # Без Pillow кеш постеров отключен, см. movie_app.checks
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+# Имя миниатюры - хеш ее содержимого, поэтому файл по имени никогда не меняется
+POSTER_NAME_RE = re.compile(r'^[0-9a-f]{32}\.jpg$')
+POSTER_CONTENT_TYPE = 'image/jpeg'
+# Время изменения этого файла - время последнего вытеснения миниатюр
+EVICTED_MARKER = '.evicted'
+
+
+class PosterFetchError(Exception):
+    """Постер не удалось получить или он не похож на изображение"""
+
+
+def is_public_address(address):
+    """Адрес в интернете: не loopback, не частная сеть, не link-local и не служебный"""
+    address = ipaddress.ip_address(address.split('%', 1)[0])
+    if address.version == 6 and address.ipv4_mapped is not None:
+        address = address.ipv4_mapped
+    return address.is_global and not address.is_multicast
+
+
+def resolve_public(host, port):
+    """
+    Разрешить имя и вернуть адрес для подключения, если все адреса имени публичные.
+
+    Проверяются все адреса из DNS, а подключение идет к проверенному
+    адресу, поэтому имя нельзя подменить между проверкой и запросом.
+    """
+    try:
+        infos = socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+    except (socket.gaierror, UnicodeError) as e:
+        raise PosterFetchError(f'Не удалось разрешить {host}: {e}')
+    for *_, sockaddr in infos:
+        if not is_public_address(sockaddr[0]):
+            raise PosterFetchError(f'{host} указывает на непубличный адрес {sockaddr[0]}')
+    family, socktype, proto, _, sockaddr = infos[0]
+    return family, socktype, proto, sockaddr
+
+
+class _PublicHTTPConnection(http.client.HTTPConnection):
+    def connect(self):
+        family, socktype, proto, sockaddr = resolve_public(self.host, self.port)
+        self.sock = socket.socket(family, socktype, proto)
+        try:
+            self.sock.settimeout(self.timeout)
+            self.sock.connect(sockaddr)
+        except OSError:
+            self.sock.close()
+            raise
+
+
+class _PublicHTTPSConnection(http.client.HTTPSConnection):
+    def connect(self):
+        _PublicHTTPConnection.connect(self)
+        self.sock = self._context.wrap_socket(self.sock, server_hostname=self.host)
+
+
+class _PublicHTTPHandler(urllib.request.HTTPHandler):
+    def http_open(self, req):
+        return self.do_open(_PublicHTTPConnection, req)
+
+
+class _PublicHTTPSHandler(urllib.request.HTTPSHandler):
+    def https_open(self, req):
+        return self.do_open(_PublicHTTPSConnection, req, context=self._context)
+
+
+class _RedirectHandler(urllib.request.HTTPRedirectHandler):
+    max_redirections = 5
+
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        if urlparse(newurl).scheme not in ('http', 'https'):
+            raise PosterFetchError(f'Перенаправление на неподдерживаемый адрес: {newurl}')
+        return super().redirect_request(req, fp, code, msg, headers, newurl)
+
+
+class HTTPFetcher:
+    """
+    Загрузка постера по http(s) с таймаутом и ограничением размера ответа.
+
+    Адрес постера задает пользователь, поэтому запросы идут только на
+    публичные адреса: имя разрешается при каждом подключении, включая
+    перенаправления, а loopback, частные, link-local и служебные адреса
+    (метаданные облака) отклоняются. Прокси из окружения не используются.
+    """
+
+    def __init__(self, timeout=5, max_bytes=5 * 1024 * 1024, user_agent='movie-catalog'):
+        self.timeout = timeout
+        self.max_bytes = max_bytes
+        self.user_agent = user_agent
+        self._opener = urllib.request.OpenerDirector()
+        for handler in (
+            _PublicHTTPHandler(),
+            _PublicHTTPSHandler(),
+            _RedirectHandler(),
+            urllib.request.HTTPDefaultErrorHandler(),
+            urllib.request.HTTPErrorProcessor(),
+            urllib.request.UnknownHandler(),
+        ):
+            self._opener.add_handler(handler)
+
+    def fetch(self, url):
+        """Вернуть (bytes, content type)"""
+        if urlparse(url).scheme not in ('http', 'https'):
+            raise PosterFetchError(f'Неподдерживаемая схема адреса: {url}')
+        request = urllib.request.Request(url, headers={'User-Agent': self.user_agent, 'Accept': 'image/*'})
+        try:
+            with self._opener.open(request, timeout=self.timeout) as response:
+                content_type = response.headers.get_content_type()
+                length = response.headers.get('Content-Length')
+                # Заявленный размер проверяется до чтения тела, фактический - при чтении
+                if length and length.isdigit() and int(length) > self.max_bytes:
+                    raise PosterFetchError(f'{url}: больше {self.max_bytes} байт')
+                data = response.read(self.max_bytes + 1)
+        except (urllib.error.URLError, http.client.HTTPException, OSError, ValueError) as e:
+            raise PosterFetchError(f'{url}: {e}')
+        if len(data) > self.max_bytes:
+            raise PosterFetchError(f'{url}: больше {self.max_bytes} байт')
+        return data, content_type
+
+
+class LocalFetcher:
+    """
+    Постеры из локального каталога: файл ищется по имени из пути адреса.
+
+    Замена HTTPFetcher для тестов и разработки без сети:
+    https://example.com/img/matrix.jpg читается как <root>/matrix.jpg.
+    """
+
+    def __init__(self, root):
+        self.root = root
+
+    def fetch(self, url):
+        name = os.path.basename(urlparse(url).path)
+        if not name:
+            raise PosterFetchError(f'В адресе нет имени файла: {url}')
+        path = os.path.join(self.root, name)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except OSError as e:
+            raise PosterFetchError(f'{url}: {e}')
+        return data, mimetypes.guess_type(name)[0] or 'application/octet-stream'
+
+
+FETCHER_ALIASES = {
+    'http': 'movie_app.utils.posters.HTTPFetcher',
+    'local': 'movie_app.utils.posters.LocalFetcher',
+}
+
+
+def make_thumbnail(data, size):
+    """
+    Миниатюра постера в JPEG не больше size (ширина, высота).
+
+    Пересохраняется любое изображение, даже меньше size: в кеш не попадают
+    исходные файлы с лишними метаданными и чужим форматом. Прозрачность
+    заменяется белым фоном.
+    """
+    if Image is None:
+        raise PosterFetchError('Pillow не установлен, миниатюры постеров не создаются')
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            # JPEG сразу декодируется в уменьшенном масштабе, не в полном размере
+            image.draft('RGB', size)
+            image.thumbnail(size)
+            if image.mode in ('RGBA', 'LA', 'P'):
+                image = image.convert('RGBA')
+                background = Image.new('RGB', image.size, (255, 255, 255))
+                background.paste(image, mask=image.getchannel('A'))
+                image = background
+            output = io.BytesIO()
+            image.convert('RGB').save(output, 'JPEG', quality=82, optimize=True, progressive=True)
+    except Exception as e:  # Pillow бросает разные исключения на битых и огромных файлах
+        raise PosterFetchError(f'Не удалось уменьшить изображение: {e}')
+    return output.getvalue()
+
+
+class PosterCache:
+    """
+    Локальные миниатюры постеров в одном каталоге.
+
+    Миниатюра лежит в файле <хеш содержимого>.jpg, одинаковые
+    постеры с разных адресов хранятся один раз. Для каждого адреса рядом
+    лежит <хеш адреса>.url с именем миниатюры. Время изменения миниатюры -
+    время последнего использования: выдача его обновляет, а при превышении
+    max_bytes удаляются давно не использованные файлы (LRU). Ссылка .url на
+    удаленную миниатюру считается промахом, постер загружается заново.
+    state() и epoch() - отметки для кеша рендеринга и ETag: первая меняется
+    при любой записи и удалении миниатюр, вторая - только при вытеснении,
+    после которого собранные раньше карточки могут ссылаться на удаленные
+    файлы.
+
+    Загрузка идет в пуле из workers потоков (0 - сразу в вызывающем потоке),
+    адрес загружается один раз, даже если его запросили несколько раз.
+    Когда миниатюра готова, карточки ожидавших ее фильмов сбрасываются из
+    кеша рендеринга. После ошибки адрес не запрашивается retry_after секунд.
+    """
+
+    touch_interval = 3600  # Чаще раза в час время использования не обновляется
+
+    def __init__(self, location, fetcher, size=(300, 450), max_bytes=200 * 1024 * 1024,
+                 workers=2, retry_after=600):
+        self.location = location
+        self.fetcher = fetcher
+        self.size = tuple(size)
+        self.max_bytes = max_bytes
+        self.retry_after = retry_after
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='movie-posters') if workers else None
+        self._lock = threading.Lock()
+        self._pending = {}  # адрес -> id фильмов, ожидающих миниатюру
+        self._failed = {}  # адрес -> время ошибки
+        self._total = None  # Оценка занятого места, None - еще не считали
+
+    @property
+    def background(self):
+        return self._executor is not None
+
+    def _url_path(self, url):
+        digest = hashlib.blake2b(url.encode('utf-8'), digest_size=16).hexdigest()
+        return os.path.join(self.location, f'{digest}.url')
+
+    def path(self, name):
+        """Путь к миниатюре или None для недопустимого имени"""
+        if not POSTER_NAME_RE.match(name):
+            return None
+        return os.path.join(self.location, name)
+
+    def state(self):
+        """Время последней записи или удаления миниатюры, нс (0 - кеш пуст)"""
+        try:
+            return os.stat(self.location).st_mtime_ns
+        except FileNotFoundError:
+            return 0
+
+    def epoch(self):
+        """Время последнего вытеснения миниатюр, нс (0 - не было)"""
+        try:
+            return os.stat(os.path.join(self.location, EVICTED_MARKER)).st_mtime_ns
+        except FileNotFoundError:
+            return 0
+
+    def lookup(self, url):
+        """Имя готовой миниатюры для адреса или None"""
+        try:
+            with open(self._url_path(url), encoding='ascii') as f:
+                name = f.read().strip()
+        except (OSError, ValueError):
+            return None
+        path = self.path(name)
+        if path is None or not os.path.exists(path):
+            return None
+        return name
+
+    def ensure(self, url):
+        """Миниатюра для адреса: из кеша или загруженная сейчас; PosterFetchError при ошибке"""
+        name = self.lookup(url)
+        if name is not None:
+            return name
+        with metrics.timed('poster_fetch'):
+            data, _ = self.fetcher.fetch(url)
+        return self.store(url, data)
+
+    def store(self, url, data):
+        """Сохранить миниатюру изображения data как постер адреса url, вернуть ее имя"""
+        thumbnail = make_thumbnail(data, self.size)
+        name = f'{hashlib.blake2b(thumbnail, digest_size=16).hexdigest()}.jpg'
+
+        os.makedirs(self.location, exist_ok=True)
+        added = 0
+        # Кеш восстанавливается повторной загрузкой, fsync ему не нужен
+        with WriteBatcher(self.location, fsync='none') as batch:
+            if not os.path.exists(os.path.join(self.location, name)):
+                batch.add(name, thumbnail)
+                added = len(thumbnail)
+            batch.add(os.path.basename(self._url_path(url)), name.encode('ascii'))
+        metrics.count('posters_fetched')
+        self._account(added)
+        return name
+
+    def schedule(self, url, file_ids=()):
+        """Загрузить миниатюру для адреса (в пуле, если он есть), если ее еще нет"""
+        if not url:
+            return
+        with self._lock:
+            failed_at = self._failed.get(url)
+            if failed_at is not None and time.monotonic() - failed_at < self.retry_after:
+                return
+            if url in self._pending:
+                self._pending[url].update(file_ids)
+                return
+            self._pending[url] = set(file_ids)
+        if self._executor is None:
+            self._fetch(url)
+        else:
+            self._executor.submit(self._fetch, url)
+
+    def _fetch(self, url):
+        name = None
+        try:
+            name = self.ensure(url)
+        except (PosterFetchError, OSError) as e:
+            logger.warning('Постер не загружен: %s', e)
+            metrics.count('poster_errors')
+        finally:
+            with self._lock:
+                file_ids = self._pending.pop(url, set())
+                if name is None:
+                    now = time.monotonic()
+                    if len(self._failed) >= 10000:
+                        self._failed = {
+                            failed_url: failed_at for failed_url, failed_at in self._failed.items()
+                            if now - failed_at < self.retry_after
+                        }
+                    self._failed[url] = now
+                else:
+                    self._failed.pop(url, None)
+        if name is not None and file_ids:
+            get_render_cache().invalidate(file_ids)
+
+    def touch(self, name):
+        """Отметить использование миниатюры для LRU"""
+        path = self.path(name)
+        if path is None:
+            return
+        try:
+            if time.time() - os.stat(path).st_mtime > self.touch_interval:
+                os.utime(path)
+        except OSError:
+            pass
+
+    def _account(self, added):
+        with self._lock:
+            if self._total is not None:
+                self._total += added
+            over = self._total is None or self._total > self.max_bytes
+        if over:
+            self.evict()
+
+    def _scan(self):
+        """Миниатюры каталога: (время использования, размер, путь)"""
+        files = []
+        try:
+            entries = list(os.scandir(self.location))
+        except FileNotFoundError:
+            return files
+        for entry in entries:
+            if not POSTER_NAME_RE.match(entry.name):
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, entry.path))
+        return files
+
+    def evict(self):
+        """Удалить давно не использованные миниатюры сверх max_bytes, вернуть число удаленных"""
+        files = self._scan()
+        total = sum(size for _, size, _ in files)
+        removed = 0
+        if total > self.max_bytes:
+            # Освобождаем с запасом, чтобы не сканировать каталог на каждой записи
+            target = self.max_bytes * 0.9
+            for _, size, path in sorted(files):
+                if total <= target:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+                removed += 1
+            metrics.count('posters_evicted', removed)
+        if removed:
+            marker = os.path.join(self.location, EVICTED_MARKER)
+            with open(marker, 'a'):
+                pass
+            os.utime(marker)
+        with self._lock:
+            self._total = total
+        return removed
+
+    def stats(self):
+        """Число миниатюр и занятое ими место"""
+        files = self._scan()
+        return {'count': len(files), 'bytes': sum(size for _, size, _ in files), 'max_bytes': self.max_bytes}
+
+
+_poster_caches = {}
+_poster_caches_lock = threading.Lock()
+
+
+def get_poster_cache():
+    """
+    Общий для процесса кеш постеров или None, если MOVIE_POSTER_FETCHER = None
+    или не установлен Pillow (тогда карточки показывают исходные image_url).
+
+    Каталог - MOVIE_POSTER_DIR (по умолчанию MEDIA_ROOT/posters).
+    """
+    backend = getattr(settings, 'MOVIE_POSTER_FETCHER', 'http')
+    if not backend or Image is None:
+        return None
+    location = getattr(settings, 'MOVIE_POSTER_DIR', None) or os.path.join(settings.MEDIA_ROOT, 'posters')
+    cache_key = (backend, str(location))
+    cache = _poster_caches.get(cache_key)
+    if cache is None:
+        with _poster_caches_lock:
+            cache = _poster_caches.get(cache_key)
+            if cache is None:
+                fetcher_class = import_string(FETCHER_ALIASES.get(backend, backend))
+                fetcher = fetcher_class(**getattr(settings, 'MOVIE_POSTER_FETCHER_OPTIONS', {}))
+                cache = PosterCache(location, fetcher, **getattr(settings, 'MOVIE_POSTER_OPTIONS', {}))
+                _poster_caches[cache_key] = cache
+    return cache
+
+
+def poster_state():
+    """Отметка кеша постеров для ключей страниц, ETag и Last-Modified (0 - кеш отключен)"""
+    cache = get_poster_cache()
+    return cache.state() if cache is not None else 0
+
+
+def poster_epoch():
+    """Отметка вытеснения для проверки закешированных карточек (0 - кеш отключен)"""
+    cache = get_poster_cache()
+    return cache.epoch() if cache is not None else 0
+
+
+def schedule_posters(movies):
+    """Поставить в загрузку постеры фильмов: пары (id фильма, image_url)"""
+    cache = get_poster_cache()
+    if cache is None:
+        return
+    for file_id, url in movies:
+        if url:
+            cache.schedule(url, [file_id])
+
+
+def poster_url(movie):
+    """
+    Адрес локальной миниатюры постера фильма или None.
+
+    При промахе и фоновой загрузке постер ставится в очередь: так
+    возвращаются вытесненные и не загруженные раньше постеры.
+    """
+    url = movie.get('image_url')
+    cache = get_poster_cache() if url else None
+    if cache is None:
+        return None
+    name = cache.lookup(url)
+    if name is None:
+        metrics.count('poster_misses')
+        if cache.background:
+            file_id = movie.get('file_id')
+            cache.schedule(url, [file_id] if file_id else [])
+        return None
+    metrics.count('poster_hits')
+    return reverse('movie_app:poster', args=[name])
@@ -0,0 +1,141 @@
+import sys
+from datetime import datetime, timezone
+
+FORM_FIELDS = (
+    'title', 'director', 'year', 'genre', 'duration', 'rating',
+    'description', 'cast', 'image_url',
+)
+
+
+def parse_timestamp(value):
+    """
+    Разобрать created_at в datetime с часовым поясом, None если не удалось.
+
+    Время без пояса считается UTC, чтобы любые две записи можно было сравнить.
+    """
+    if isinstance(value, datetime):
+        parsed = value
+    else:
+        try:
+            parsed = datetime.fromisoformat(str(value).strip())
+        except ValueError:
+            return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
+
+
+def created_timestamp(value):
+    """Числовой ключ сортировки по created_at; неразборчивые даты - самые старые"""
+    parsed = parse_timestamp(value)
+    return parsed.timestamp() if parsed is not None else 0.0
+
+
+class MovieRecord:
+    """
+    Компактная запись фильма в индексе каталога.
+
+    Поля хранятся в __slots__ вместо словаря на каждый фильм, created_at
+    разобран в datetime, режиссер и жанр интернированы (у тысяч фильмов
+    одни и те же строки). Неизвестные поля из загруженных файлов лежат в
+    extra и возвращаются в to_dict(). Для чтения поддерживается get(),
+    как у словаря, поэтому фильтры и производные индексы работают с
+    записью без преобразования.
+    """
+
+    __slots__ = FORM_FIELDS + ('file_id', 'created_at', 'created_raw', 'version', 'source', 'import_batch', 'extra')
+
+    def __init__(self, file_id=None, title='', director='', year=None, genre='', duration=None,
+                 rating=None, description='', cast='', image_url='', created_at=None, version=1, source='',
+                 import_batch='', extra=None):
+        self.file_id = file_id
+        self.title = title
+        self.director = sys.intern(str(director)) if director is not None else None
+        self.year = year
+        self.genre = sys.intern(str(genre)) if genre is not None else None
+        self.duration = duration
+        self.rating = rating
+        self.description = description
+        self.cast = cast
+        self.image_url = image_url
+        # Исходная строка хранится, только если to_dict() не восстановит ее из
+        # datetime: дата без времени, формат с 'T', неразборчивое значение
+        self.created_at = parse_timestamp(created_at) if created_at not in (None, '') else None
+        self.created_raw = None
+        if isinstance(created_at, str) and (self.created_at is None or str(self.created_at) != created_at):
+            self.created_raw = created_at
+        self.version = version
+        # Имя загруженного файла, из которого импортирован фильм
+        self.source = sys.intern(str(source)) if source else ''
+        # id партии импорта (см. utils/imports.py)
+        self.import_batch = sys.intern(str(import_batch)) if import_batch else ''
+        self.extra = extra or None
+
+    @classmethod
+    def from_dict(cls, data, file_id=None):
+        """Запись из JSON формы фильма (как в файле или ответе хранилища)"""
+        known = {key: data[key] for key in cls.__slots__ if key in data and key not in ('created_raw', 'extra')}
+        extra = {key: value for key, value in data.items() if key not in cls.__slots__}
+        if file_id is not None:
+            known['file_id'] = file_id
+        return cls(extra=extra, **known)
+
+    @classmethod
+    def from_form(cls, cleaned_data, **fields):
+        """Запись из cleaned_data формы MovieForm; fields дополняют или заменяют поля"""
+        data = {field: cleaned_data.get(field) for field in FORM_FIELDS}
+        data['image_url'] = data['image_url'] or ''
+        data.update(fields)
+        return cls(**data)
+
+    @property
+    def created_ts(self):
+        """Ключ сортировки по дате добавления"""
+        return self.created_at.timestamp() if self.created_at is not None else 0.0
+
+    @property
+    def created_at_str(self):
+        if self.created_raw is not None:
+            return self.created_raw
+        return str(self.created_at) if self.created_at is not None else ''
+
+    def get(self, name, default=None):
+        """Чтение поля как у словаря фильма"""
+        if name == 'created_at':
+            return self.created_at_str
+        if name in self.__slots__ and name not in ('created_raw', 'extra'):
+            value = getattr(self, name)
+            return default if value is None else value
+        if self.extra:
+            return self.extra.get(name, default)
+        return default
+
+    def to_dict(self, with_file_id=True):
+        """JSON форма фильма; file_id - служебное поле индекса"""
+        data = {field: getattr(self, field) for field in FORM_FIELDS}
+        data['created_at'] = self.created_at_str
+        data['version'] = self.version
+        if self.source:
+            data['source'] = self.source
+        if self.import_batch:
+            data['import_batch'] = self.import_batch
+        if self.extra:
+            data.update(self.extra)
+        if with_file_id and self.file_id is not None:
+            data['file_id'] = self.file_id
+        return data
+
+    def to_form_initial(self):
+        """Начальные данные для MovieForm"""
+        return {field: '' if getattr(self, field) is None else getattr(self, field) for field in FORM_FIELDS}
+
+    def __eq__(self, other):
+        if not isinstance(other, MovieRecord):
+            return NotImplemented
+        return self.to_dict() == other.to_dict()
+
+    # Запись изменяемая, поэтому, как и словарь фильма, не хешируется
+    __hash__ = None
+
+    def __repr__(self):
+        return f'<MovieRecord {self.file_id}: {self.title!r}>'
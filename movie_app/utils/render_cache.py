@@ -0,0 +1,129 @@
+import threading
+from collections import Counter
+from django.conf import settings
+from django.core.cache import caches
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+from . import metrics
+
+CARD_TEMPLATE = 'movie_app/movie_card.html'
+PAGES_GENERATION_KEY = 'pages:generation'
+
+
+class RenderCache:
+    """
+    Кеш отрендеренных карточек фильмов и целых страниц поверх кеша Django.
+
+    Карточка хранится под ключом card:<file_id> вместе с ревизией записи и
+    отметкой epoch (вытеснение постеров, на которые ссылается карточка) и
+    отдается только при совпадении обеих, поэтому устаревшая карточка не
+    может попасть на страницу. Ключ страницы включает поколение страниц и
+    fingerprint каталога. invalidate() вызывается при добавлении, изменении,
+    удалении и импорте: удаляет карточки и увеличивает поколение страниц.
+
+    Ограничение размера и вытеснение (LRU у locmem) задаются MAX_ENTRIES и
+    CULL_FREQUENCY бэкенда; счетчики попаданий и промахов - на процесс.
+    """
+
+    def __init__(self, cache=None):
+        self.cache = cache
+        self._lock = threading.Lock()
+        self._stats = Counter()
+
+    @property
+    def enabled(self):
+        return self.cache is not None
+
+    def _count(self, kind, hits, misses):
+        with self._lock:
+            self._stats[f'{kind}_hits'] += hits
+            self._stats[f'{kind}_misses'] += misses
+        if hits:
+            metrics.count(f'{kind}_cache_hits', hits)
+        if misses:
+            metrics.count(f'{kind}_cache_misses', misses)
+
+    def cards(self, movies, catalog, epoch=0):
+        """HTML карточек фильмов в том же порядке; промахи рендерятся и кешируются"""
+        if not self.enabled:
+            return [mark_safe(render_to_string(CARD_TEMPLATE, {'movie': movie})) for movie in movies]
+
+        keys = [f"card:{movie['file_id']}" for movie in movies]
+        cached = self.cache.get_many(keys)
+        cards = []
+        missing = {}
+        for key, movie in zip(keys, movies):
+            revision = catalog.revision(movie['file_id'])
+            entry = cached.get(key)
+            if entry is not None and entry[0] == (revision, epoch):
+                html = entry[1]
+            else:
+                html = render_to_string(CARD_TEMPLATE, {'movie': movie})
+                if revision is not None:
+                    missing[key] = ((revision, epoch), html)
+            cards.append(mark_safe(html))
+        if missing:
+            self.cache.set_many(missing)
+        self._count('card', len(movies) - len(missing), len(missing))
+        return cards
+
+    def _generation(self):
+        generation = self.cache.get(PAGES_GENERATION_KEY)
+        if generation is None:
+            self.cache.add(PAGES_GENERATION_KEY, 0, timeout=None)
+            generation = self.cache.get(PAGES_GENERATION_KEY, 0)
+        return generation
+
+    def page_key(self, name, catalog, *parts):
+        """Ключ страницы: поколение страниц, fingerprint каталога и параметры"""
+        return ':'.join(['page', str(self._generation()), catalog.fingerprint, name, *map(str, parts)])
+
+    def get_page(self, key):
+        if not self.enabled:
+            return None
+        content = self.cache.get(key)
+        self._count('page', int(content is not None), int(content is None))
+        return content
+
+    def set_page(self, key, content):
+        if self.enabled:
+            self.cache.set(key, content)
+
+    def invalidate(self, file_ids=()):
+        """Сбросить карточки указанных фильмов и все закешированные страницы"""
+        if not self.enabled:
+            return
+        self.cache.delete_many([f'card:{file_id}' for file_id in file_ids])
+        try:
+            self.cache.incr(PAGES_GENERATION_KEY)
+        except ValueError:
+            self.cache.add(PAGES_GENERATION_KEY, 1, timeout=None)
+        with self._lock:
+            self._stats['invalidations'] += 1
+
+    def stats(self):
+        """Счетчики попаданий и промахов по карточкам и страницам"""
+        with self._lock:
+            stats = dict(self._stats)
+        for kind in ('card', 'page'):
+            hits = stats.setdefault(f'{kind}_hits', 0)
+            misses = stats.setdefault(f'{kind}_misses', 0)
+            stats[f'{kind}_hit_ratio'] = round(hits / (hits + misses), 4) if hits + misses else None
+        stats.setdefault('invalidations', 0)
+        stats['enabled'] = self.enabled
+        return stats
+
+
+_render_cache = None
+_render_cache_lock = threading.Lock()
+
+
+def get_render_cache():
+    """Общий для процесса кеш рендеринга, псевдоним кеша - MOVIE_RENDER_CACHE"""
+    global _render_cache
+    if _render_cache is None:
+        with _render_cache_lock:
+            if _render_cache is None:
+                alias = getattr(settings, 'MOVIE_RENDER_CACHE', None)
+                _render_cache = RenderCache(caches[alias] if alias else None)
+    return _render_cache
@@ -0,0 +1,276 @@
+import re
+import heapq
+import threading
+from bisect import bisect_left, bisect_right, insort
+from collections import Counter
+from .catalog import get_catalog
+from .records import created_timestamp
+
+TEXT_FIELDS = ('title', 'director', 'cast', 'description')
+TITLE_WEIGHT = 3
+
+_token_re = re.compile(r'\w+')
+
+DURATION_BUCKETS = (
+    (0, 89, 'до 90 мин'),
+    (90, 120, '90-120 мин'),
+    (121, 150, '121-150 мин'),
+    (151, None, 'больше 150 мин'),
+)
+
+
+def normalize(text):
+    """Привести текст к виду для поиска: casefold и ё -> е"""
+    return str(text or '').casefold().replace('ё', 'е')
+
+
+def tokenize(text):
+    """Слова текста (кириллица, латиница, цифры) в нормализованном виде"""
+    return _token_re.findall(normalize(text))
+
+
+def duration_bucket(duration):
+    """Интервал DURATION_BUCKETS, в который попадает длительность, или None"""
+    for low, high, label in DURATION_BUCKETS:
+        if duration >= low and (high is None or duration <= high):
+            return (low, high, label)
+    return None
+
+
+def build_facets(genres, genre_labels, decades, ratings, durations):
+    """
+    Фасеты из счетчиков: жанры (ключ normalize -> число), десятилетия,
+    целые части рейтинга и интервалы длительности из duration_bucket().
+
+    Интервал рейтинга полуоткрытый (min <= r < below), последний 9-10
+    включает 10: граница 8.99 теряла бы значения вроде 8.995.
+    """
+    return {
+        'genre': [
+            {'value': genre_labels[genre], 'count': count}
+            for genre, count in sorted(genres.items(), key=lambda x: (-x[1], x[0]))
+        ],
+        'year': [
+            {'label': f'{decade}-е', 'min': decade, 'max': decade + 9, 'count': count}
+            for decade, count in sorted(decades.items())
+        ],
+        'rating': [
+            {'label': f'{rating}-{rating + 1}', 'min': rating, **({'max': 10} if rating == 9 else {'below': rating + 1}), 'count': count}
+            for rating, count in sorted(ratings.items(), reverse=True)
+        ],
+        'duration': [
+            {'label': label, 'min': low, 'max': high, 'count': durations[(low, high, label)]}
+            for low, high, label in DURATION_BUCKETS if durations.get((low, high, label))
+        ],
+    }
+
+
+class _RangeIndex:
+    """Отсортированный список (значение, id) для выборки по диапазону"""
+
+    def __init__(self):
+        self._entries = []
+
+    def add(self, value, file_id):
+        insort(self._entries, (value, file_id))
+
+    def remove(self, value, file_id):
+        i = bisect_left(self._entries, (value, file_id))
+        if i < len(self._entries) and self._entries[i] == (value, file_id):
+            self._entries.pop(i)
+
+    def between(self, low=None, high=None, below=None):
+        """id с low <= value <= high и value < below; None - без границы"""
+        start = 0 if low is None else bisect_left(self._entries, (low, ''))
+        end = len(self._entries)
+        if high is not None:
+            # Все id с value == high: любой id меньше строки '\uffff'
+            end = bisect_right(self._entries, (high, '\uffff'))
+        if below is not None:
+            end = min(end, bisect_left(self._entries, (below, '')))
+        return {file_id for _, file_id in self._entries[start:end]}
+
+
+class SearchIndex:
+    """
+    Инвертированный индекс по названию, режиссеру, актерам и описанию.
+
+    Обновляется каталогом инкрементально через put()/remove(). Жанр,
+    режиссер и числовые поля индексируются отдельно, поэтому ни запрос, ни
+    фильтры не перебирают все записи: кандидаты - пересечение множеств id.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._postings = {}
+        self._vocabulary = []
+        self._docs = {}
+        self._genres = {}
+        self._directors = {}
+        self._ranges = {'year': _RangeIndex(), 'rating': _RangeIndex(), 'duration': _RangeIndex()}
+
+    def put(self, file_id, movie):
+        with self._lock:
+            if file_id in self._docs:
+                self.remove(file_id)
+
+            tokens = set()
+            for field in TEXT_FIELDS:
+                tokens.update(tokenize(movie.get(field)))
+            doc = {
+                'tokens': frozenset(tokens),
+                'title_tokens': frozenset(tokenize(movie.get('title'))),
+                'genre': str(movie.get('genre', '')).strip(),
+                'director': str(movie.get('director', '')),
+                'created_at': created_timestamp(movie.get('created_at')),
+            }
+            for token in tokens:
+                postings = self._postings.get(token)
+                if postings is None:
+                    postings = self._postings[token] = set()
+                    insort(self._vocabulary, token)
+                postings.add(file_id)
+
+            self._genres.setdefault(normalize(doc['genre']), set()).add(file_id)
+            self._directors.setdefault(normalize(doc['director']), set()).add(file_id)
+            for name, index in self._ranges.items():
+                value = movie.get(name)
+                if isinstance(value, (int, float)):
+                    doc[name] = value
+                    index.add(value, file_id)
+            self._docs[file_id] = doc
+
+    def remove(self, file_id):
+        with self._lock:
+            doc = self._docs.pop(file_id, None)
+            if doc is None:
+                return
+            for token in doc['tokens']:
+                postings = self._postings.get(token)
+                if postings is None:
+                    continue
+                postings.discard(file_id)
+                if not postings:
+                    del self._postings[token]
+                    self._vocabulary.pop(bisect_left(self._vocabulary, token))
+            for ids_by_key, key in ((self._genres, normalize(doc['genre'])), (self._directors, normalize(doc['director']))):
+                ids = ids_by_key.get(key)
+                if ids is not None:
+                    ids.discard(file_id)
+                    if not ids:
+                        del ids_by_key[key]
+            for name, index in self._ranges.items():
+                if name in doc:
+                    index.remove(doc[name], file_id)
+
+    def _token_matches(self, token, prefix):
+        """id документов со словом (или словами с этим префиксом)"""
+        if not prefix:
+            return self._postings.get(token, set())
+        matches = set()
+        i = bisect_left(self._vocabulary, token)
+        while i < len(self._vocabulary) and self._vocabulary[i].startswith(token):
+            matches |= self._postings[self._vocabulary[i]]
+            i += 1
+        return matches
+
+    def search(self, query='', movie_filter=None, limit=20, offset=0):
+        """
+        Найти фильмы: все слова запроса должны встретиться (последнее - как префикс).
+
+        Возвращает словарь с общим числом, id страницы результатов и фасетами.
+        """
+        params = movie_filter.params if movie_filter else {}
+        tokens = tokenize(query)
+
+        with self._lock:
+            candidate_sets = []
+            for i, token in enumerate(tokens):
+                candidate_sets.append(self._token_matches(token, prefix=i == len(tokens) - 1))
+            if 'genre' in params:
+                candidate_sets.append(self._genres.get(normalize(params['genre']), set()))
+            if 'director' in params:
+                # Подстрока ищется среди разных режиссеров, а не среди всех фильмов
+                director = normalize(params['director'])
+                candidate_sets.append(set().union(*(
+                    ids for name, ids in self._directors.items() if director in name
+                )))
+            for name, index in self._ranges.items():
+                low = params.get(f'{name}_min')
+                high = params.get(f'{name}_max')
+                below = params.get(f'{name}_below')
+                if low is not None or high is not None or below is not None:
+                    candidate_sets.append(index.between(low, high, below))
+
+            if candidate_sets:
+                candidate_sets.sort(key=len)
+                matched = set(candidate_sets[0])
+                for ids in candidate_sets[1:]:
+                    matched &= ids
+                    if not matched:
+                        break
+            else:
+                matched = set(self._docs)
+
+            def score(file_id):
+                doc = self._docs[file_id]
+                points = sum(TITLE_WEIGHT if token in doc['title_tokens'] else 1 for token in tokens)
+                return (points, doc['created_at'], file_id)
+
+            # Сортируется только нужная часть: O(M log k) вместо O(M log M)
+            ranked = heapq.nlargest(offset + limit, matched, key=score)
+            facets = self._facets(matched)
+
+        return {
+            'total': len(matched),
+            'file_ids': ranked[offset:offset + limit],
+            'facets': facets,
+        }
+
+    def _facets(self, file_ids):
+        """Количество найденных фильмов по жанрам, десятилетиям, рейтингу и длительности"""
+        genres = Counter()
+        genre_labels = {}
+        decades = Counter()
+        ratings = Counter()
+        durations = Counter()
+        for file_id in file_ids:
+            doc = self._docs[file_id]
+            if doc['genre']:
+                # Жанры различаются только регистром - считаем их одним
+                genre_key = normalize(doc['genre'])
+                genres[genre_key] += 1
+                genre_labels.setdefault(genre_key, doc['genre'])
+            if 'year' in doc:
+                decades[int(doc['year']) // 10 * 10] += 1
+            if 'rating' in doc:
+                ratings[min(int(doc['rating']), 9)] += 1
+            if 'duration' in doc:
+                bucket = duration_bucket(doc['duration'])
+                if bucket:
+                    durations[bucket] += 1
+        return build_facets(genres, genre_labels, decades, ratings, durations)
+
+
+def get_search_index():
+    """Поисковый индекс текущего каталога"""
+    return get_catalog().extension('search', SearchIndex)
+
+
+def search_catalog(query='', movie_filter=None, limit=20, offset=0):
+    """
+    Поиск по текущему каталогу.
+
+    Без запроса и фильтров ничего не ищется: страница берется из порядка
+    каталога, а фасеты - из счетчиков статистики, поэтому записи каталога
+    не перебираются и не сортируются.
+    """
+    if tokenize(query) or movie_filter:
+        return get_search_index().search(query, movie_filter, limit=limit, offset=offset)
+    from .stats import get_catalog_stats  # stats сам импортирует этот модуль
+    catalog = get_catalog()
+    return {
+        'total': len(catalog),
+        'file_ids': catalog.ordered_ids(offset, limit),
+        'facets': get_catalog_stats().facets(),
+    }
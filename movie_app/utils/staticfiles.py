@@ -0,0 +1,18 @@
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+
+
+class HashedStaticFilesStorage(ManifestStaticFilesStorage):
+    """
+    Статика с хешем содержимого в имени (brutal.<hash>.css) после collectstatic.
+
+    Имя меняется вместе с содержимым, поэтому файлы можно кешировать
+    навсегда. Если collectstatic еще не запускался, отдается исходное имя.
+    """
+
+    manifest_strict = False
+
+    def stored_name(self, name):
+        try:
+            return super().stored_name(name)
+        except ValueError:
+            return name
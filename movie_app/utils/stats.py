@@ -0,0 +1,248 @@
+import heapq
+import threading
+from array import array
+from collections import Counter
+from .catalog import get_catalog
+from .search import build_facets, duration_bucket, normalize
+
+try:
+    import numpy
+except ImportError:  # Необязательная зависимость: без нее диапазоны считаются циклом по массивам
+    numpy = None
+
+MISSING = -1
+
+
+def _count(counter, key, sign):
+    counter[key] += sign
+    if counter[key] <= 0:
+        del counter[key]
+
+
+def _number(value):
+    return value if isinstance(value, (int, float)) and not isinstance(value, bool) else None
+
+
+class _Snapshot:
+    """Колоночный снимок каталога: по массиву array на каждое числовое поле"""
+
+    def __init__(self, contributions):
+        self.genre_codes = {}
+        self.genre = array('i')
+        self.year = array('i')
+        self.duration = array('i')
+        self.rating = array('d')
+        self.director = []
+        for genre_key, _, year, director, rating, duration in contributions:
+            self.genre.append(self.genre_codes.setdefault(genre_key, len(self.genre_codes)))
+            self.year.append(MISSING if year is None else int(year))
+            self.duration.append(MISSING if duration is None else int(duration))
+            self.rating.append(float('nan') if rating is None else float(rating))
+            self.director.append(director)
+
+    def aggregate(self, params):
+        """Количество, средний рейтинг и суммарная длительность фильмов под фильтром"""
+        genre_code = None
+        if 'genre' in params:
+            genre_code = self.genre_codes.get(normalize(params['genre']), MISSING - 1)
+        if numpy is not None:
+            return self._aggregate_numpy(params, genre_code)
+        return self._aggregate_python(params, genre_code)
+
+    def _aggregate_numpy(self, params, genre_code):
+        columns = {
+            'year': numpy.frombuffer(self.year, dtype=numpy.int32),
+            'duration': numpy.frombuffer(self.duration, dtype=numpy.int32),
+            'rating': numpy.frombuffer(self.rating, dtype=numpy.float64),
+        }
+        mask = numpy.ones(len(self.year), dtype=bool)
+        if genre_code is not None:
+            mask &= numpy.frombuffer(self.genre, dtype=numpy.int32) == genre_code
+        for name, column in columns.items():
+            low, high, below = (params.get(f'{name}_{suffix}') for suffix in ('min', 'max', 'below'))
+            if low is not None or high is not None or below is not None:
+                mask &= (column != MISSING) if name != 'rating' else ~numpy.isnan(column)
+            if low is not None:
+                mask &= column >= low
+            if high is not None:
+                mask &= column <= high
+            if below is not None:
+                mask &= column < below
+        if 'director' in params:
+            director = normalize(params['director'])
+            mask &= numpy.fromiter((director in normalize(name) for name in self.director), dtype=bool, count=len(self.director))
+
+        ratings = columns['rating'][mask]
+        ratings = ratings[~numpy.isnan(ratings)]
+        durations = columns['duration'][mask]
+        durations = durations[durations != MISSING]
+        return {
+            'count': int(mask.sum()),
+            'avg_rating': round(float(ratings.mean()), 2) if len(ratings) else None,
+            'total_duration': int(durations.sum()),
+        }
+
+    def _aggregate_python(self, params, genre_code):
+        ranges = []
+        for name in ('year', 'duration', 'rating'):
+            low, high, below = (params.get(f'{name}_{suffix}') for suffix in ('min', 'max', 'below'))
+            if low is not None or high is not None or below is not None:
+                ranges.append((getattr(self, name), low, high, below))
+        director = normalize(params['director']) if 'director' in params else None
+
+        count = rating_count = total_duration = 0
+        rating_sum = 0.0
+        for i in range(len(self.year)):
+            if genre_code is not None and self.genre[i] != genre_code:
+                continue
+            matched = True
+            for column, low, high, below in ranges:
+                value = column[i]
+                # MISSING и NaN не проходят ни одну границу
+                if (value == MISSING or value != value or (low is not None and value < low)
+                        or (high is not None and value > high) or (below is not None and value >= below)):
+                    matched = False
+                    break
+            if not matched or (director is not None and director not in normalize(self.director[i])):
+                continue
+            count += 1
+            if self.rating[i] == self.rating[i]:
+                rating_sum += self.rating[i]
+                rating_count += 1
+            if self.duration[i] != MISSING:
+                total_duration += self.duration[i]
+        return {
+            'count': count,
+            'avg_rating': round(rating_sum / rating_count, 2) if rating_count else None,
+            'total_duration': total_duration,
+        }
+
+
+class CatalogStats:
+    """
+    Статистика каталога, которая обновляется инкрементально.
+
+    Подключается к каталогу через extension(): при каждом добавлении,
+    изменении, удалении и импорте вклад записи вычитается и добавляется
+    заново, поэтому счетчики и гистограммы не пересчитываются полностью.
+    Запросы по произвольным диапазонам считаются по колоночному снимку,
+    снимок и результаты живут до следующего изменения каталога.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._contributions = {}
+        self.generation = 0
+        self.count = 0
+        self.rating_sum = 0.0
+        self.rating_count = 0
+        self.duration_sum = 0
+        self.duration_count = 0
+        self.genres = Counter()
+        self._genre_labels = {}
+        self.years = Counter()
+        self.ratings = Counter()
+        self.directors = Counter()
+        self.durations = Counter()
+        self._snapshot = None
+        self._range_cache = {}
+
+    def put(self, file_id, movie):
+        with self._lock:
+            if file_id in self._contributions:
+                self.remove(file_id)
+            genre = str(movie.get('genre') or '').strip()
+            contribution = (
+                normalize(genre),
+                genre,
+                _number(movie.get('year')),
+                str(movie.get('director') or '').strip(),
+                _number(movie.get('rating')),
+                _number(movie.get('duration')),
+            )
+            self._apply(contribution, 1)
+            self._contributions[file_id] = contribution
+
+    def remove(self, file_id):
+        with self._lock:
+            contribution = self._contributions.pop(file_id, None)
+            if contribution is not None:
+                self._apply(contribution, -1)
+
+    def _apply(self, contribution, sign):
+        genre_key, genre, year, director, rating, duration = contribution
+        self.count += sign
+        if genre_key:
+            self._genre_labels.setdefault(genre_key, genre)
+            _count(self.genres, genre_key, sign)
+            if genre_key not in self.genres:
+                del self._genre_labels[genre_key]
+        if year is not None:
+            _count(self.years, int(year), sign)
+        if director:
+            _count(self.directors, director, sign)
+        if rating is not None:
+            self.rating_sum += sign * rating
+            self.rating_count += sign
+            _count(self.ratings, min(int(rating), 9), sign)
+        if duration is not None:
+            self.duration_sum += sign * duration
+            self.duration_count += sign
+            bucket = duration_bucket(duration)
+            if bucket:
+                _count(self.durations, bucket, sign)
+        self.generation += 1
+        self._snapshot = None
+        self._range_cache.clear()
+
+    def summary(self, top=10):
+        """Сводка для страницы статистики и JSON ответа"""
+        with self._lock:
+            return {
+                'count': self.count,
+                'avg_rating': round(self.rating_sum / self.rating_count, 2) if self.rating_count else None,
+                'total_duration': self.duration_sum,
+                'avg_duration': round(self.duration_sum / self.duration_count) if self.duration_count else None,
+                'genres': [
+                    {'value': self._genre_labels[genre], 'count': count}
+                    for genre, count in sorted(self.genres.items(), key=lambda x: (-x[1], x[0]))
+                ],
+                'years': [
+                    {'year': year, 'count': count}
+                    for year, count in sorted(self.years.items())
+                ],
+                'ratings': [
+                    {'label': f'{rating}-{rating + 1}', 'count': count}
+                    for rating, count in sorted(self.ratings.items(), reverse=True)
+                ],
+                'top_directors': [
+                    {'director': director, 'count': count}
+                    for director, count in heapq.nsmallest(top, self.directors.items(), key=lambda x: (-x[1], x[0]))
+                ],
+            }
+
+    def facets(self):
+        """Фасеты поиска по всему каталогу из счетчиков, без перебора записей"""
+        with self._lock:
+            decades = Counter()
+            for year, count in self.years.items():
+                decades[year // 10 * 10] += count
+            return build_facets(self.genres, self._genre_labels, decades, self.ratings, self.durations)
+
+    def aggregate(self, movie_filter):
+        """Количество, средний рейтинг и длительность по произвольному фильтру (кеш до изменения каталога)"""
+        key = movie_filter.query_string()
+        with self._lock:
+            result = self._range_cache.get(key)
+            if result is None:
+                if self._snapshot is None:
+                    self._snapshot = _Snapshot(self._contributions.values())
+                result = self._snapshot.aggregate(movie_filter.params)
+                result['generation'] = self.generation
+                self._range_cache[key] = result
+            return dict(result)
+
+
+def get_catalog_stats():
+    """Статистика текущего каталога"""
+    return get_catalog().extension('stats', CatalogStats)
@@ -0,0 +1,874 @@
+import os
+import re
+import json
+import time
+import uuid
+import logging
+import threading
+from contextlib import contextmanager
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Max
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.utils.module_loading import import_string
+from . import metrics
+from .loader import get_loader, loads, dumps_pretty
+from .records import created_timestamp
+from .writes import WriteBatcher, fsync_directory, get_fsync_mode
+
+logger = logging.getLogger(__name__)
+
+try:
+    import fcntl
+except ImportError:  # Windows: межпроцессная блокировка недоступна
+    fcntl = None
+
+
+class VersionConflict(Exception):
+    """Запись изменилась с момента чтения (оптимистичная блокировка)"""
+
+    def __init__(self, current_version):
+        self.current_version = current_version
+        super().__init__(f'Текущая версия записи: {current_version}')
+
+
+def check_version(current_version, expected_version):
+    """VersionConflict, если ожидаемая версия записи не совпадает с текущей"""
+    if expected_version is not None and current_version != expected_version:
+        raise VersionConflict(current_version)
+
+
+def version_conflict(current_version, expected_version):
+    """VersionConflict для итога групповой операции, None если версия совпала"""
+    try:
+        check_version(current_version, expected_version)
+    except VersionConflict as e:
+        return e
+    return None
+
+
+def new_file_id():
+    """Новый идентификатор фильма в формате имени файла"""
+    return f"movie_{uuid.uuid4().hex[:12]}.json"
+
+
+def is_movie_file(filename):
+    """Является ли файл файлом отдельного фильма"""
+    return filename.startswith('movie_') and filename.endswith('.json')
+
+
+def read_movie_file(file_path):
+    """Прочитать фильм из файла, None если файл пуст или поврежден"""
+    with open(file_path, 'rb') as f:
+        data = f.read()
+    metrics.count('files_opened')
+    metrics.count('bytes_read', len(data))
+    with metrics.timed('decode'):
+        movie_data = loads(data)
+    if isinstance(movie_data, list) and len(movie_data) > 0 and isinstance(movie_data[0], dict):
+        return movie_data[0]
+    return None
+
+
+class MovieStorage:
+    """
+    Интерфейс хранилища фильмов.
+
+    Индекс каталога опрашивает хранилище через version() и stamps():
+    version() - дешевый маркер, который меняется при любом изменении,
+    stamps() - отображение id -> отметка версии записи без чтения данных.
+    Записи с изменившейся отметкой каталог перечитывает через load().
+    """
+
+    def __init__(self, location):
+        self.location = location
+
+    @property
+    def key(self):
+        return (type(self).__name__, str(self.location))
+
+    def version(self):
+        raise NotImplementedError
+
+    def stamps(self):
+        """id -> отметка версии, None если хранилище еще не создано"""
+        raise NotImplementedError
+
+    def stamp(self, file_id):
+        """Отметка версии одной записи или None"""
+        raise NotImplementedError
+
+    def load(self, file_id):
+        """Фильм по id или None"""
+        raise NotImplementedError
+
+    def load_many(self, file_ids):
+        """Несколько фильмов сразу: id -> фильм или None"""
+        movies = {}
+        for file_id in file_ids:
+            try:
+                movies[file_id] = self.load(file_id)
+            except Exception as e:
+                logger.warning('Ошибка чтения записи %s: %s', file_id, e)
+                metrics.count('read_errors')
+                movies[file_id] = None
+        return movies
+
+    def load_sorted(self, file_ids):
+        """
+        Загрузить записи для холодного старта каталога.
+
+        Возвращает записи ((created_at, id), фильм) по возрастанию ключа,
+        без отсутствующих, и отчет по фазам загрузки.
+        """
+        started = time.perf_counter()
+        movies = self.load_many(file_ids)
+        loaded = time.perf_counter()
+        entries = sorted(
+            (((created_timestamp(movie.get('created_at')), file_id), movie) for file_id, movie in movies.items() if movie is not None),
+            key=lambda entry: entry[0],
+        )
+        report = {
+            'files': len(movies),
+            'loaded': len(entries),
+            'failed': len(movies) - len(entries),
+            'phases': {'load': loaded - started, 'merge': time.perf_counter() - loaded},
+        }
+        return entries, report
+
+    def save(self, movie_data, file_id=None, expected_version=None):
+        """
+        Сохранить фильм, вернуть id.
+
+        Без file_id создается новая запись с version 1. С file_id запись
+        обновляется на месте и ее version увеличивается; если передан
+        expected_version и он не равен текущей версии - VersionConflict.
+        """
+        raise NotImplementedError
+
+    def save_many(self, movies_data, file_ids=None):
+        """
+        Записать пачку фильмов как есть (новых, если file_ids не указаны).
+
+        Версии не проверяются и не увеличиваются: так пишутся импорт и перенос
+        между хранилищами. Возвращает список id.
+        """
+        raise NotImplementedError
+
+    def delete(self, file_id, expected_version=None):
+        """Удалить фильм, False если его не было; VersionConflict как в save()"""
+        raise NotImplementedError
+
+    def update_many(self, file_ids, fields, expected_versions=None):
+        """
+        Записать одни и те же поля в группу записей одним проходом.
+
+        Версия каждой записи увеличивается. Возвращает id -> новая версия,
+        None для отсутствующих записей. Записи, версия которых не совпала с
+        expected_versions (id -> версия), не меняются, для них в итоге
+        VersionConflict с текущей версией.
+        """
+        raise NotImplementedError
+
+    def delete_many(self, file_ids, expected_versions=None):
+        """
+        Удалить группу записей одним проходом, вернуть id -> была ли запись.
+
+        expected_versions - как в update_many: для несовпавших записей в
+        итоге VersionConflict, а сами записи остаются.
+        """
+        raise NotImplementedError
+
+    def items(self):
+        """Все записи хранилища: (id, фильм)"""
+        for file_id in sorted(self.stamps() or {}):
+            movie = self.load(file_id)
+            if movie is not None:
+                yield file_id, movie
+
+    @staticmethod
+    def _prepare(movie_data):
+        # Добавляем временную метку если её нет
+        if 'created_at' not in movie_data:
+            movie_data['created_at'] = str(timezone.now())
+        movie_data.setdefault('version', 1)
+        movie_data.pop('file_id', None)
+        return movie_data
+
+    @staticmethod
+    def _version_of(movie):
+        return movie.get('version', 1) if movie is not None else None
+
+
+class JSONFilesStorage(MovieStorage):
+    """
+    Каждый фильм - отдельный файл movie_<id>.json в MEDIA_ROOT/json_files.
+
+    Файлы пишутся группами через WriteBatcher: временный файл и os.replace,
+    поэтому читатель видит либо старую, либо новую версию целиком; fsync
+    по MOVIE_FSYNC. Проверка версии и запись идут под блокировкой файла
+    .lock (между процессами - flock).
+    """
+
+    def __init__(self, location, loader=None, fsync=None):
+        super().__init__(location)
+        self._lock = threading.RLock()
+        self.loader = loader
+        self.parallel_load_min = getattr(settings, 'MOVIE_PARALLEL_LOAD_MIN', 1000)
+        self.fsync = fsync or get_fsync_mode()
+
+    @contextmanager
+    def _locked(self):
+        os.makedirs(self.location, exist_ok=True)
+        with self._lock:
+            with open(os.path.join(self.location, '.lock'), 'a') as lock_file:
+                if fcntl:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)
+                yield
+
+    def _batcher(self):
+        return WriteBatcher(self.location, self.fsync)
+
+    @staticmethod
+    def _encode(movie_data):
+        return dumps_pretty([movie_data])
+
+    def _write(self, file_id, movie_data):
+        with self._batcher() as batch:
+            batch.add(file_id, self._encode(movie_data))
+
+    def _removed(self):
+        # Удаление файла надежно только после fsync каталога
+        if self.fsync != 'none':
+            fsync_directory(self.location)
+
+    def version(self):
+        try:
+            return os.stat(self.location).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def stamps(self):
+        if not os.path.exists(self.location):
+            return None
+        # Только stat: файлы открываются лишь при смене mtime
+        stamps = {}
+        with os.scandir(self.location) as entries:
+            for entry in entries:
+                if is_movie_file(entry.name):
+                    try:
+                        stamps[entry.name] = entry.stat().st_mtime_ns
+                    except FileNotFoundError:
+                        continue
+        return stamps
+
+    def stamp(self, file_id):
+        try:
+            return os.stat(os.path.join(self.location, file_id)).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def load(self, file_id):
+        try:
+            return read_movie_file(os.path.join(self.location, file_id))
+        except FileNotFoundError:
+            return None
+
+    def load_sorted(self, file_ids):
+        # Много файлов читаем и разбираем параллельно кусками
+        file_ids = list(file_ids)
+        if len(file_ids) < self.parallel_load_min:
+            return super().load_sorted(file_ids)
+        entries, report = (self.loader or get_loader()).load(self.location, file_ids)
+        # Потоки загрузчика не видят метрики запроса, переносим их из отчета
+        metrics.count('files_opened', report['files'])
+        metrics.count('bytes_read', report['bytes'])
+        metrics.add_time('decode', report['phases']['decode_total'])
+        return entries, report
+
+    def save(self, movie_data, file_id=None, expected_version=None):
+        movie_data = self._prepare(movie_data)
+        if file_id is None:
+            os.makedirs(self.location, exist_ok=True)
+            file_id = new_file_id()
+            movie_data['version'] = 1
+            self._write(file_id, movie_data)
+            return file_id
+
+        with self._locked():
+            current_version = self._version_of(self.load(file_id))
+            check_version(current_version, expected_version)
+            movie_data['version'] = (current_version or 0) + 1
+            self._write(file_id, movie_data)
+        return file_id
+
+    def save_many(self, movies_data, file_ids=None):
+        os.makedirs(self.location, exist_ok=True)
+        file_ids = file_ids or [new_file_id() for _ in movies_data]
+        # Вся пачка - одна группа записи: один fsync каталога на пачку
+        with self._batcher() as batch:
+            for file_id, movie_data in zip(file_ids, movies_data):
+                batch.add(file_id, self._encode(self._prepare(movie_data)))
+        return file_ids
+
+    def delete(self, file_id, expected_version=None):
+        file_path = os.path.join(self.location, file_id)
+        # Наличие файла проверяется под блокировкой: удаление уже удаленного
+        # фильма с ожидаемой версией - VersionConflict с current_version None
+        with self._locked():
+            current_version = self._version_of(self.load(file_id))
+            check_version(current_version, expected_version)
+            if current_version is None:
+                return False
+            os.remove(file_path)
+            self._removed()
+        return True
+
+    def update_many(self, file_ids, fields, expected_versions=None):
+        expected_versions = expected_versions or {}
+        results = {}
+        # Сначала все новые версии во временные файлы: ошибка чтения или
+        # записи любой из них отменяет всю операцию
+        with self._locked(), self._batcher() as batch:
+            for file_id in file_ids:
+                movie = self.load(file_id)
+                if movie is None:
+                    results[file_id] = None
+                    continue
+                conflict = version_conflict(self._version_of(movie), expected_versions.get(file_id))
+                if conflict:
+                    results[file_id] = conflict
+                    continue
+                movie.update(fields)
+                movie['version'] = self._version_of(movie) + 1
+                batch.add(file_id, self._encode(movie))
+                results[file_id] = movie['version']
+        return results
+
+    def delete_many(self, file_ids, expected_versions=None):
+        expected_versions = expected_versions or {}
+        results = {}
+        with self._locked():
+            for file_id in file_ids:
+                if file_id in expected_versions:
+                    conflict = version_conflict(self._version_of(self.load(file_id)), expected_versions[file_id])
+                    if conflict and conflict.current_version is not None:
+                        results[file_id] = conflict
+                        continue
+                try:
+                    os.remove(os.path.join(self.location, file_id))
+                    results[file_id] = True
+                except FileNotFoundError:
+                    results[file_id] = False
+            if any(found is True for found in results.values()):
+                self._removed()
+        return results
+
+
+class SegmentLogStorage(MovieStorage):
+    """
+    Все фильмы в одном журнале movies.log с добавлением в конец.
+
+    Каждая строка - компактный JSON {"id": ..., "op": "put"/"del", ...}.
+    В памяти держится индекс id -> (смещение, длина) последней версии
+    записи; при изменении файла дочитывается только новый хвост журнала.
+    Когда доля устаревших байт превышает compact_ratio, журнал
+    перезаписывается только с живыми записями.
+    """
+
+    _line_re = re.compile(rb'^\{"id":"([^"]+)","op":"(put|del)"')
+
+    def __init__(self, location, compact_ratio=0.5, compact_min_size=1024 * 1024, fsync=None):
+        super().__init__(location)
+        self.path = os.path.join(location, 'movies.log')
+        self.compact_ratio = compact_ratio
+        self.compact_min_size = compact_min_size
+        # Одно добавление в журнал - одна группа, поэтому batch и each здесь совпадают
+        self.fsync = fsync or get_fsync_mode()
+        self._lock = threading.RLock()
+        self._index = {}
+        self._inode = None
+        self._size = 0
+        self._dead = 0
+
+    def _file_state(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return (st.st_ino, st.st_size)
+
+    def _sync(self):
+        """Дочитать хвост журнала, перестроить индекс если файл подменили"""
+        state = self._file_state()
+        if state is None:
+            self._index, self._inode, self._size, self._dead = {}, None, 0, 0
+            return
+        inode, size = state
+        if inode != self._inode or size < self._size:
+            self._index, self._inode, self._size, self._dead = {}, inode, 0, 0
+        if size == self._size:
+            return
+
+        with open(self.path, 'rb') as f:
+            f.seek(self._size)
+            offset = self._size
+            for line in f:
+                if not line.endswith(b'\n'):
+                    # Запись еще дописывается другим процессом
+                    break
+                self._apply_line(line, offset)
+                offset += len(line)
+        self._size = offset
+
+    def _apply_line(self, line, offset):
+        match = self._line_re.match(line)
+        if not match:
+            self._dead += len(line)
+            return
+        file_id = match.group(1).decode('utf-8')
+        old = self._index.pop(file_id, None)
+        if old is not None:
+            self._dead += old[1]
+        if match.group(2) == b'put':
+            self._index[file_id] = (offset, len(line))
+        else:
+            self._dead += len(line)
+
+    def version(self):
+        return self._file_state()
+
+    def stamps(self):
+        with self._lock:
+            self._sync()
+            if self._inode is None:
+                return None
+            return {file_id: offset for file_id, (offset, _) in self._index.items()}
+
+    def stamp(self, file_id):
+        with self._lock:
+            self._sync()
+            entry = self._index.get(file_id)
+            return entry[0] if entry else None
+
+    def load(self, file_id):
+        return self.load_many([file_id])[file_id]
+
+    def load_many(self, file_ids):
+        # Один проход по журналу в порядке смещений вместо открытия на каждую запись
+        movies = {file_id: None for file_id in file_ids}
+        with self._lock:
+            self._sync()
+            if self._inode is None:
+                return movies
+            f = open(self.path, 'rb')
+            if os.fstat(f.fileno()).st_ino != self._inode:
+                # Журнал только что сжал другой процесс
+                f.close()
+                self._sync()
+                f = open(self.path, 'rb')
+            metrics.count('files_opened')
+            with f:
+                entries = sorted(
+                    (self._index[file_id], file_id) for file_id in file_ids if file_id in self._index
+                )
+                for (offset, length), file_id in entries:
+                    f.seek(offset)
+                    data = f.read(length)
+                    metrics.count('bytes_read', len(data))
+                    try:
+                        with metrics.timed('decode'):
+                            movies[file_id] = json.loads(data).get('movie')
+                    except ValueError as e:
+                        logger.warning('Ошибка чтения записи %s: %s', file_id, e)
+                        metrics.count('read_errors')
+        return movies
+
+    def _encode(self, file_id, op, movie_data=None):
+        record = {'id': file_id, 'op': op}
+        if movie_data is not None:
+            record['movie'] = movie_data
+        return (json.dumps(record, ensure_ascii=False, separators=(',', ':')) + '\n').encode('utf-8')
+
+    def _open_locked(self):
+        """Открыть журнал на добавление под эксклюзивной блокировкой"""
+        while True:
+            f = open(self.path, 'ab')
+            if not fcntl:
+                return f
+            fcntl.flock(f, fcntl.LOCK_EX)
+            # Пока ждали блокировку, журнал мог быть сжат и подменен
+            try:
+                if os.fstat(f.fileno()).st_ino == os.stat(self.path).st_ino:
+                    return f
+            except FileNotFoundError:
+                pass
+            f.close()
+
+    def _append(self, build_lines):
+        """
+        Дописать строки в журнал.
+
+        build_lines вызывается под блокировкой после чтения хвоста журнала,
+        поэтому может проверить текущую версию записи.
+        """
+        os.makedirs(self.location, exist_ok=True)
+        with self._lock:
+            with self._open_locked() as f:
+                self._sync()
+                if fcntl and f.tell() > self._size:
+                    # Недописанная строка после сбоя: под блокировкой ее уже никто не допишет,
+                    # а новая запись, приклеенная к ней, стала бы нечитаемой
+                    f.truncate(self._size)
+                lines = build_lines()
+                if lines:
+                    with metrics.timed('write'):
+                        f.write(b''.join(lines))
+                        f.flush()
+                        if self.fsync != 'none':
+                            os.fsync(f.fileno())
+                            metrics.count('fsyncs')
+            self._sync()
+            if self._size >= self.compact_min_size and self._dead > self._size * self.compact_ratio:
+                self.compact()
+            return lines
+
+    def save(self, movie_data, file_id=None, expected_version=None):
+        movie_data = self._prepare(movie_data)
+        if file_id is None:
+            file_id = new_file_id()
+            movie_data['version'] = 1
+            self._append(lambda: [self._encode(file_id, 'put', movie_data)])
+            return file_id
+
+        def build_lines():
+            current_version = self._version_of(self.load(file_id))
+            check_version(current_version, expected_version)
+            movie_data['version'] = (current_version or 0) + 1
+            return [self._encode(file_id, 'put', movie_data)]
+
+        self._append(build_lines)
+        return file_id
+
+    def save_many(self, movies_data, file_ids=None):
+        file_ids = file_ids or [new_file_id() for _ in movies_data]
+        lines = [
+            self._encode(file_id, 'put', self._prepare(movie_data))
+            for file_id, movie_data in zip(file_ids, movies_data)
+        ]
+        self._append(lambda: lines)
+        return file_ids
+
+    def delete(self, file_id, expected_version=None):
+        def build_lines():
+            current_version = self._version_of(self.load(file_id))
+            check_version(current_version, expected_version)
+            if current_version is None:
+                return []
+            return [self._encode(file_id, 'del')]
+
+        return bool(self._append(build_lines))
+
+    def update_many(self, file_ids, fields, expected_versions=None):
+        expected_versions = expected_versions or {}
+        results = {}
+
+        def build_lines():
+            # Все новые версии дописываются одной записью в журнал
+            lines = []
+            for file_id in file_ids:
+                movie = self.load(file_id)
+                if movie is None:
+                    results[file_id] = None
+                    continue
+                conflict = version_conflict(self._version_of(movie), expected_versions.get(file_id))
+                if conflict:
+                    results[file_id] = conflict
+                    continue
+                movie.update(fields)
+                movie['version'] = self._version_of(movie) + 1
+                lines.append(self._encode(file_id, 'put', movie))
+                results[file_id] = movie['version']
+            return lines
+
+        self._append(build_lines)
+        return results
+
+    def delete_many(self, file_ids, expected_versions=None):
+        expected_versions = expected_versions or {}
+        results = {}
+
+        def build_lines():
+            lines = []
+            for file_id in file_ids:
+                results[file_id] = file_id in self._index
+                if results[file_id] and file_id in expected_versions:
+                    conflict = version_conflict(self._version_of(self.load(file_id)), expected_versions[file_id])
+                    if conflict:
+                        results[file_id] = conflict
+                        continue
+                if results[file_id]:
+                    lines.append(self._encode(file_id, 'del'))
+            return lines
+
+        self._append(build_lines)
+        return results
+
+    def compact(self):
+        """Переписать журнал, оставив только последние версии живых записей"""
+        with self._lock:
+            self._sync()
+            if self._inode is None:
+                return
+            tmp_path = self.path + '.compact'
+            with self._open_locked() as lock_file:
+                # Под блокировкой никто не пишет, дочитываем последние записи
+                self._sync()
+                with open(self.path, 'rb') as src, open(tmp_path, 'wb') as dst:
+                    for offset, length in sorted(self._index.values()):
+                        src.seek(offset)
+                        dst.write(src.read(length))
+                    dst.flush()
+                    os.fsync(dst.fileno())
+                os.replace(tmp_path, self.path)
+            self._inode = None
+            self._sync()
+
+
+class DatabaseStorage(MovieStorage):
+    """
+    Фильмы в таблице модели Movie; location - псевдоним базы данных.
+
+    При json_dual_write каждая запись дублируется в файлы movie_<id>.json,
+    чтобы старые инструменты и экспорт по файлам продолжали работать.
+    """
+
+    fields = (
+        'title', 'director', 'year', 'genre', 'duration', 'rating',
+        'description', 'cast', 'image_url', 'created_at', 'version', 'source',
+        'import_batch',
+    )
+    batch_size = 500
+
+    def __init__(self, location='default', json_dual_write=None, json_location=None):
+        super().__init__(location)
+        if json_dual_write is None:
+            json_dual_write = getattr(settings, 'MOVIE_JSON_DUAL_WRITE', False)
+        self.mirror = None
+        if json_dual_write:
+            self.mirror = JSONFilesStorage(json_location or os.path.join(settings.MEDIA_ROOT, 'json_files'))
+
+    @property
+    def objects(self):
+        from ..models import Movie
+        return Movie.objects.using(self.location)
+
+    def version(self):
+        state = self.objects.aggregate(count=Count('id'), last=Max('updated_at'))
+        return (state['count'], state['last'])
+
+    def stamps(self):
+        return dict(self.objects.order_by().values_list('file_id', 'updated_at'))
+
+    def stamp(self, file_id):
+        return self.objects.filter(file_id=file_id).values_list('updated_at', flat=True).first()
+
+    def _to_dict(self, row):
+        movie = {field: row[field] for field in self.fields}
+        movie['image_url'] = movie['image_url'] or ''
+        movie['created_at'] = str(movie['created_at'])
+        return movie
+
+    def _to_fields(self, movie_data):
+        fields = {field: movie_data.get(field) for field in self.fields}
+        return self._normalize_fields(fields)
+
+    @staticmethod
+    def _normalize_fields(fields):
+        # Пустые значения в форме, которую принимают колонки таблицы
+        for field in ('description', 'cast', 'source', 'import_batch'):
+            if field in fields:
+                fields[field] = fields[field] or ''
+        if 'image_url' in fields:
+            fields['image_url'] = fields['image_url'] or None
+        if 'created_at' in fields:
+            created_at = fields['created_at']
+            if isinstance(created_at, str):
+                created_at = parse_datetime(created_at)
+            fields['created_at'] = created_at or timezone.now()
+        return fields
+
+    def load(self, file_id):
+        return self.load_many([file_id])[file_id]
+
+    @metrics.timed('db')
+    def load_many(self, file_ids):
+        file_ids = list(file_ids)
+        movies = {file_id: None for file_id in file_ids}
+        for start in range(0, len(file_ids), self.batch_size):
+            rows = self.objects.filter(
+                file_id__in=file_ids[start:start + self.batch_size]
+            ).values('file_id', *self.fields)
+            for row in rows:
+                movies[row['file_id']] = self._to_dict(row)
+        return movies
+
+    @metrics.timed('db')
+    def save(self, movie_data, file_id=None, expected_version=None):
+        if file_id is None:
+            movie_data['version'] = 1
+            return self.save_many([movie_data])[0]
+
+        movie_data = self._prepare(movie_data)
+        fields = self._to_fields(movie_data)
+        fields.pop('version')
+        with transaction.atomic(using=self.location):
+            # Сравнение версии и запись - один UPDATE ... WHERE version = ...
+            queryset = self.objects.filter(file_id=file_id)
+            if expected_version is not None:
+                queryset = queryset.filter(version=expected_version)
+            updated = queryset.update(version=F('version') + 1, updated_at=timezone.now(), **fields)
+            if not updated:
+                current_version = self.objects.filter(file_id=file_id).values_list('version', flat=True).first()
+                check_version(current_version, expected_version)
+                self.objects.create(file_id=file_id, version=1, **fields)
+            if self.mirror:
+                movie_data['version'] = self.objects.filter(file_id=file_id).values_list('version', flat=True).get()
+                self.mirror.save_many([movie_data], [file_id])
+        return file_id
+
+    @metrics.timed('db')
+    def save_many(self, movies_data, file_ids=None):
+        file_ids = [file_id or new_file_id() for file_id in (file_ids or [None] * len(movies_data))]
+        movies_data = [self._prepare(movie_data) for movie_data in movies_data]
+        from ..models import Movie
+
+        objs = [
+            Movie(file_id=file_id, **self._to_fields(movie_data))
+            for file_id, movie_data in zip(file_ids, movies_data)
+        ]
+        with transaction.atomic(using=self.location):
+            # Новые записи вставляются пачками, существующие id обновляются
+            self.objects.bulk_create(
+                objs,
+                batch_size=self.batch_size,
+                update_conflicts=True,
+                unique_fields=['file_id'],
+                update_fields=list(self.fields) + ['updated_at'],
+            )
+            if self.mirror:
+                self.mirror.save_many(movies_data, file_ids)
+        return file_ids
+
+    @metrics.timed('db')
+    def delete(self, file_id, expected_version=None):
+        with transaction.atomic(using=self.location):
+            queryset = self.objects.filter(file_id=file_id)
+            if expected_version is not None:
+                queryset = queryset.filter(version=expected_version)
+            deleted, _ = queryset.delete()
+            if not deleted:
+                current_version = self.objects.filter(file_id=file_id).values_list('version', flat=True).first()
+                check_version(current_version, expected_version)
+        if self.mirror:
+            self.mirror.delete(file_id)
+        return deleted > 0
+
+    def _chunks(self, file_ids):
+        file_ids = list(file_ids)
+        for start in range(0, len(file_ids), self.batch_size):
+            yield file_ids[start:start + self.batch_size]
+
+    def _conflicts(self, chunk, expected_versions):
+        """Записи пачки с несовпавшей версией; строки блокируются до конца транзакции"""
+        expected = {file_id: expected_versions[file_id] for file_id in chunk if file_id in expected_versions}
+        if not expected:
+            return {}
+        current = self.objects.select_for_update().filter(file_id__in=expected).values_list('file_id', 'version')
+        conflicts = {file_id: version_conflict(version, expected[file_id]) for file_id, version in current}
+        return {file_id: conflict for file_id, conflict in conflicts.items() if conflict}
+
+    @metrics.timed('db')
+    def update_many(self, file_ids, fields, expected_versions=None):
+        fields = self._normalize_fields({field: value for field, value in fields.items() if field in self.fields})
+        fields.pop('version', None)
+        results = dict.fromkeys(file_ids)
+        with transaction.atomic(using=self.location):
+            # Один UPDATE на пачку id; версия каждой строки увеличивается в базе
+            for chunk in self._chunks(file_ids):
+                conflicts = self._conflicts(chunk, expected_versions or {})
+                results.update(conflicts)
+                queryset = self.objects.filter(file_id__in=[file_id for file_id in chunk if file_id not in conflicts])
+                queryset.update(version=F('version') + 1, updated_at=timezone.now(), **fields)
+                results.update(queryset.values_list('file_id', 'version'))
+            if self.mirror:
+                changed = [file_id for file_id, version in results.items() if isinstance(version, int)]
+                movies = self.load_many(changed)
+                self.mirror.save_many([movies[file_id] for file_id in changed], changed)
+        return results
+
+    @metrics.timed('db')
+    def delete_many(self, file_ids, expected_versions=None):
+        results = dict.fromkeys(file_ids, False)
+        with transaction.atomic(using=self.location):
+            for chunk in self._chunks(file_ids):
+                conflicts = self._conflicts(chunk, expected_versions or {})
+                results.update(conflicts)
+                queryset = self.objects.filter(file_id__in=[file_id for file_id in chunk if file_id not in conflicts])
+                results.update(dict.fromkeys(queryset.values_list('file_id', flat=True), True))
+                queryset.delete()
+        if self.mirror:
+            self.mirror.delete_many([file_id for file_id, deleted in results.items() if deleted is True])
+        return results
+
+    def items(self):
+        rows = self.objects.order_by('file_id').values('file_id', *self.fields)
+        for row in rows.iterator(chunk_size=self.batch_size):
+            yield row['file_id'], self._to_dict(row)
+
+
+STORAGE_ALIASES = {
+    'files': 'movie_app.utils.storage.JSONFilesStorage',
+    'segment': 'movie_app.utils.storage.SegmentLogStorage',
+    'database': 'movie_app.utils.storage.DatabaseStorage',
+}
+
+_storages = {}
+_storages_lock = threading.Lock()
+
+
+def build_storage(backend, location=None, **options):
+    """Создать хранилище по псевдониму или пути к классу"""
+    backend_class = import_string(STORAGE_ALIASES.get(backend, backend))
+    if location is None:
+        location = default_location(backend_class)
+    return backend_class(location, **options)
+
+
+def default_location(backend_class):
+    """Каталог хранилища по умолчанию внутри MEDIA_ROOT"""
+    if issubclass(backend_class, DatabaseStorage):
+        return 'default'
+    if issubclass(backend_class, SegmentLogStorage):
+        return os.path.join(settings.MEDIA_ROOT, 'segments')
+    return os.path.join(settings.MEDIA_ROOT, 'json_files')
+
+
+def get_storage():
+    """Общее для процесса хранилище, заданное MOVIE_STORAGE_BACKEND"""
+    backend = getattr(settings, 'MOVIE_STORAGE_BACKEND', 'files')
+    options = dict(getattr(settings, 'MOVIE_STORAGE_OPTIONS', {}))
+    location = options.pop('location', None)
+    backend_class = import_string(STORAGE_ALIASES.get(backend, backend))
+    location = location or default_location(backend_class)
+
+    cache_key = (backend_class, str(location))
+    storage = _storages.get(cache_key)
+    if storage is None:
+        with _storages_lock:
+            storage = _storages.get(cache_key)
+            if storage is None:
+                storage = backend_class(location, **options)
+                _storages[cache_key] = storage
+    return storage
@@ -0,0 +1,25 @@
+from django.template import TemplateDoesNotExist
+from django.template.backends import django as django_backend
+from django.template.backends.django import reraise
+from . import metrics
+
+
+class Template(django_backend.Template):
+    """Шаблон, время рендеринга которого попадает в метрики запроса (фаза render)"""
+
+    def render(self, context=None, request=None):
+        with metrics.timed('render'):
+            return super().render(context, request)
+
+
+class DjangoTemplates(django_backend.DjangoTemplates):
+    """Стандартный движок шаблонов Django с замером времени рендеринга"""
+
+    def from_string(self, template_code):
+        return Template(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return Template(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            reraise(exc, self)
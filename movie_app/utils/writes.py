@@ -0,0 +1,130 @@
+import os
+import uuid
+from django.conf import settings
+from . import metrics
+
+# none  - временный файл и os.replace без fsync: файл не бывает записан наполовину,
+#         но после сбоя питания последние записи могут пропасть
+# batch - данные файлов группы сбрасываются на диск после записи всей группы,
+#         затем все переименования и один fsync каталога на группу
+# each  - fsync файла и каталога после каждой записи
+FSYNC_MODES = ('none', 'batch', 'each')
+
+
+def get_fsync_mode():
+    """Уровень надежности записи из MOVIE_FSYNC"""
+    mode = getattr(settings, 'MOVIE_FSYNC', 'batch')
+    if mode not in FSYNC_MODES:
+        raise ValueError(f'MOVIE_FSYNC должен быть одним из: {", ".join(FSYNC_MODES)}')
+    return mode
+
+
+def fsync_file(path):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+    metrics.count('fsyncs')
+
+
+def fsync_directory(path):
+    """Сбросить на диск записи каталога (созданные, переименованные, удаленные файлы)"""
+    if os.name == 'nt':  # Windows не открывает каталоги как файлы
+        return
+    fsync_file(path)
+
+
+class WriteBatcher:
+    """
+    Группа записей файлов в одном каталоге.
+
+    add() пишет данные во временный файл рядом с целевым, commit()
+    переименовывает все временные файлы в целевые через os.replace, поэтому
+    читатель видит каждый файл либо старым, либо новым целиком. Сколько
+    стоит надежность, задает fsync (см. FSYNC_MODES): в режиме batch группа
+    из N файлов - это N fsync данных подряд и один fsync каталога вместо
+    N пар fsync. При ошибке до commit() временные файлы удаляются, целевые
+    не меняются (в режиме each каждый файл заменяется сразу в add()).
+
+        with WriteBatcher(directory) as batch:
+            batch.add('movie_1.json', data)
+    """
+
+    def __init__(self, directory, fsync=None):
+        self.directory = directory
+        self.fsync = fsync or get_fsync_mode()
+        if self.fsync not in FSYNC_MODES:
+            raise ValueError(f'Неизвестный режим fsync: {self.fsync}')
+        self._pending = []
+
+    def __len__(self):
+        return len(self._pending)
+
+    def add(self, name, data):
+        """Записать bytes во временный файл для name"""
+        tmp_path = os.path.join(self.directory, f'.{name}.{uuid.uuid4().hex[:8]}.tmp')
+        metrics.count('files_written')
+        with metrics.timed('write'):
+            try:
+                with open(tmp_path, 'wb') as f:
+                    f.write(data)
+                    if self.fsync == 'each':
+                        f.flush()
+                        os.fsync(f.fileno())
+                        metrics.count('fsyncs')
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+            if self.fsync == 'each':
+                os.replace(tmp_path, os.path.join(self.directory, name))
+                fsync_directory(self.directory)
+            else:
+                self._pending.append((name, tmp_path))
+
+    def commit(self):
+        """Сделать записанные файлы видимыми (и надежными в режиме batch)"""
+        pending, self._pending = self._pending, []
+        if not pending:
+            return
+        with metrics.timed('write'):
+            if self.fsync == 'batch':
+                try:
+                    # Данные всех файлов на диск до переименований: после сбоя
+                    # целевой файл не окажется пустым
+                    for _, tmp_path in pending:
+                        fsync_file(tmp_path)
+                except BaseException:
+                    self._pending = pending
+                    self.abort()
+                    raise
+            for i, (name, tmp_path) in enumerate(pending):
+                try:
+                    os.replace(tmp_path, os.path.join(self.directory, name))
+                except BaseException:
+                    # Уже замененные файлы остаются новыми, временные остальных удаляются
+                    self._pending = pending[i:]
+                    self.abort()
+                    raise
+            if self.fsync == 'batch':
+                fsync_directory(self.directory)
+
+    def abort(self):
+        """Удалить временные файлы незавершенной группы"""
+        pending, self._pending = self._pending, []
+        for _, tmp_path in pending:
+            try:
+                os.remove(tmp_path)
+            except FileNotFoundError:
+                pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.commit()
+        else:
+            self.abort()
+        return False
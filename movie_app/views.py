@@ -2,96 +2,253 @@ import os
 import json
 import uuid
 import time
+import hashlib
+from datetime import datetime, timezone as dt_timezone
+from django import forms
 from django.shortcuts import render, redirect
-from django.http import HttpResponse
+from django.http import FileResponse, HttpResponse, HttpResponseBadRequest, JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import condition, require_POST
+from django.urls import reverse
 from django.conf import settings
 from django.contrib import messages
+from django.contrib.messages import get_messages
 from django.core.files.storage import FileSystemStorage
 from django.utils import timezone
+from django.utils.http import http_date, parse_etags, quote_etag
 from .forms import MovieForm, JSONUploadForm
-from .utils.json_validator import validate_movie_json
+from .utils.catalog import get_catalog, encode_cursor, decode_cursor
+from .utils.storage import get_storage, VersionConflict
+from .utils.importer import STATUS_LABELS as IMPORT_STATUS_LABELS
+from .utils.jobs import get_job_queue
+from .utils.imports import get_import_manifest
+from .utils.export import EXPORT_FORMATS, iter_export, gzip_stream
+from .utils.filters import MovieFilter
+from .utils.search import search_catalog
+from .utils.stats import get_catalog_stats
+from .utils.render_cache import get_render_cache
+from .utils.metrics import get_registry
+from .utils.posters import POSTER_CONTENT_TYPE, get_poster_cache, poster_epoch, poster_state, schedule_posters
+from .utils.records import MovieRecord
+from .utils.files import list_json_files, resolve_json_file, stat_json_file, file_etag, parse_range, iter_file_range
 
 def get_movies_from_json():
-    """Получить все фильмы из JSON файлов"""
-    movies = []
-    json_dir = os.path.join(settings.MEDIA_ROOT, 'json_files')
-    
-    if not os.path.exists(json_dir):
-        return movies
-    
-    for filename in os.listdir(json_dir):
-        if filename.endswith('.json') and filename.startswith('movie_'):
-            file_path = os.path.join(json_dir, filename)
-            try:
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    movie_data = json.load(f)
-                    if isinstance(movie_data, list) and len(movie_data) > 0:
-                        # Добавляем ID файла для редактирования/удаления
-                        movie_data[0]['file_id'] = filename
-                        movies.append(movie_data[0])
-            except Exception as e:
-                print(f"Ошибка чтения файла {filename}: {e}")
-                continue
-    
-    # Сортируем по дате создания (новые сверху)
-    movies.sort(key=lambda x: x.get('created_at', ''), reverse=True)
-    return movies
+    """Получить все фильмы из индекса каталога (новые сверху)"""
+    return get_catalog().movies()
 
 def save_movie_to_json(movie_data):
-    """Сохранить фильм в JSON файл"""
-    json_dir = os.path.join(settings.MEDIA_ROOT, 'json_files')
-    os.makedirs(json_dir, exist_ok=True)
-    
-    filename = f"movie_{uuid.uuid4().hex[:12]}.json"
-    file_path = os.path.join(json_dir, filename)
-    
-    # Добавляем временную метку если её нет
-    if 'created_at' not in movie_data:
-        movie_data['created_at'] = str(timezone.now())
-    
-    with open(file_path, 'w', encoding='utf-8') as f:
-        json.dump([movie_data], f, ensure_ascii=False, indent=2)
-    
+    """Сохранить фильм в хранилище"""
+    filename = get_storage().save(movie_data)
+    get_catalog().reload_file(filename)
+    get_render_cache().invalidate([filename])
+    schedule_posters([(filename, movie_data.get('image_url'))])
+    return filename
+
+def save_movies_to_json(movies_data):
+    """Сохранить пачку фильмов, индекс каталога обновляется один раз"""
+    filenames = get_storage().save_many(movies_data)
+    get_catalog().reload_files(filenames)
+    get_render_cache().invalidate(filenames)
+    schedule_posters((filename, movie.get('image_url')) for filename, movie in zip(filenames, movies_data))
+    return filenames
+
+def update_movie_in_json(filename, movie_data, expected_version=None):
+    """Изменить фильм на месте, id не меняется; VersionConflict при устаревшей версии"""
+    get_storage().save(movie_data, filename, expected_version=expected_version)
+    get_catalog().reload_file(filename)
+    get_render_cache().invalidate([filename])
+    schedule_posters([(filename, movie_data.get('image_url'))])
     return filename
 
-def delete_movie_file(filename):
-    """Удалить файл фильма"""
-    file_path = os.path.join(settings.MEDIA_ROOT, 'json_files', filename)
-    if os.path.exists(file_path):
-        os.remove(file_path)
+def delete_movie_file(filename, expected_version=None):
+    """Удалить фильм из хранилища"""
+    if get_storage().delete(filename, expected_version=expected_version):
+        get_catalog().discard(filename)
+        get_render_cache().invalidate([filename])
         return True
     return False
 
+def update_movies_in_json(file_ids, fields, expected_versions=None):
+    """Записать поля в группу фильмов одним проходом, вернуть id -> новая версия"""
+    versions = get_storage().update_many(file_ids, fields, expected_versions)
+    changed = [file_id for file_id, version in versions.items() if isinstance(version, int)]
+    # Несовпавшие версии значат, что индекс отстал: перечитываем и их
+    conflicts = [file_id for file_id, version in versions.items() if isinstance(version, VersionConflict)]
+    get_catalog().reload_files(changed + conflicts)
+    get_render_cache().invalidate(changed + conflicts)
+    if fields.get('image_url'):
+        schedule_posters((file_id, fields['image_url']) for file_id in changed)
+    return versions
+
+def delete_movie_files(file_ids, expected_versions=None):
+    """Удалить группу фильмов одним проходом, вернуть id -> был ли фильм"""
+    deleted = get_storage().delete_many(file_ids, expected_versions)
+    removed = [file_id for file_id, found in deleted.items() if found is True]
+    conflicts = [file_id for file_id, found in deleted.items() if isinstance(found, VersionConflict)]
+    get_catalog().discard_many(removed)
+    get_catalog().reload_files(conflicts)
+    get_render_cache().invalidate(removed + conflicts)
+    return deleted
+
+def get_expected_version(request):
+    """Версия записи, которую видел пользователь: поле формы или If-Match"""
+    value = request.POST.get('version')
+    if not value:
+        # Одна метка "N" или W/"N"; '*' и список меток версию не задают
+        header = request.headers.get('If-Match', '').strip()
+        etags = parse_etags(header)
+        value = etags[0] if len(etags) == 1 else header
+        value = value.removeprefix('W/')
+        if len(value) >= 2 and value[0] == value[-1] == '"':
+            value = value[1:-1]
+    try:
+        return int(value)
+    except ValueError:
+        return None
+
+def _list_etag(request):
+    # Сообщения показываются один раз, страницу с ними нельзя отдать как 304
+    if get_messages(request):
+        return None
+    # Появление и вытеснение постеров меняют адреса картинок на странице
+    key = f"{get_catalog().fingerprint}|{poster_state()}|{request.GET.get('after', '')}|{request.GET.get('limit', '')}"
+    return hashlib.md5(key.encode('utf-8')).hexdigest()
+
+def _list_last_modified(request):
+    if get_messages(request):
+        return None
+    last_modified = get_catalog().last_modified
+    posters_changed = poster_state()
+    if posters_changed:
+        last_modified = max(last_modified, datetime.fromtimestamp(posters_changed / 1e9, tz=dt_timezone.utc))
+    return last_modified
+
+@condition(etag_func=_list_etag, last_modified_func=_list_last_modified)
 def movie_list(request):
     """Главная страница со списком фильмов"""
-    movies = get_movies_from_json()
-    
-    # Получаем список всех JSON файлов для отображения
-    json_dir = os.path.join(settings.MEDIA_ROOT, 'json_files')
-    json_files = []
-    if os.path.exists(json_dir):
-        for filename in os.listdir(json_dir):
-            if filename.endswith('.json'):
-                file_path = os.path.join(json_dir, filename)
-                try:
-                    with open(file_path, 'r', encoding='utf-8') as f:
-                        file_content = f.read()
-                except:
-                    file_content = "Ошибка чтения файла"
-                
-                json_files.append({
-                    'name': filename,
-                    'size': os.path.getsize(file_path),
-                    'content': file_content
-                })
+    return movie_list_response(request)
+
+def movie_list_response(request):
+    """Страница списка; общая часть sync и async представлений"""
+    catalog = get_catalog()
+    page_size = getattr(settings, 'MOVIE_LIST_PAGE_SIZE', 20)
+    try:
+        limit = min(max(int(request.GET.get('limit', page_size)), 1), 100)
+    except ValueError:
+        limit = page_size
+    
+    # Keyset пагинация: курсор указывает на последний фильм предыдущей страницы
+    after = request.GET.get('after')
+    cursor = decode_cursor(after) if after else None
+    
+    # Страница с сообщениями (после добавления, удаления) не кешируется
+    render_cache = get_render_cache()
+    cacheable = not get_messages(request)
+    if cacheable:
+        page_key = render_cache.page_key('movie_list', catalog, poster_state(), after or '', limit)
+        content = render_cache.get_page(page_key)
+        if content is not None:
+            return HttpResponse(content)
+    
+    movies, next_key = catalog.page(cursor, limit)
     
     context = {
         'movies': movies,
-        'json_files': json_files,
-        'has_json_files': len(json_files) > 0,
-        'movies_count': len(movies)
+        'cards': render_cache.cards(movies, catalog, poster_epoch()),
+        'movies_count': len(catalog),
+        'is_first_page': cursor is None,
+        'next_cursor': encode_cursor(next_key) if next_key else None,
+        'limit': limit,
     }
-    return render(request, 'movie_app/movie_list.html', context)
+    response = render(request, 'movie_app/movie_list.html', context)
+    if cacheable:
+        render_cache.set_page(page_key, response.content)
+    return response
+
+def search_movies(request):
+    """Полнотекстовый поиск с фасетами"""
+    query = request.GET.get('q', '').strip()
+    try:
+        movie_filter = MovieFilter.from_query(request.GET)
+        page = max(int(request.GET.get('page', 1)), 1)
+    except ValueError as e:
+        if request.GET.get('format') == 'json':
+            return JsonResponse({'error': str(e)}, status=400)
+        messages.error(request, str(e))
+        movie_filter, page = MovieFilter(), 1
+    
+    limit = getattr(settings, 'MOVIE_LIST_PAGE_SIZE', 20)
+    catalog = get_catalog()
+    # Сначала синхронизируем каталог, затем ищем: индекс обновляется каталогом
+    catalog.refresh()
+    found = search_catalog(query, movie_filter, limit=limit, offset=(page - 1) * limit)
+    movies = catalog.get_many(found['file_ids'])
+    
+    if request.GET.get('format') == 'json':
+        return JsonResponse({
+            'query': query,
+            'total': found['total'],
+            'page': page,
+            'results': movies,
+            'facets': found['facets'],
+        })
+    
+    # Ссылки фасетов сохраняют текущий запрос и остальные фильтры
+    base_params = request.GET.copy()
+    base_params.pop('page', None)
+    
+    def facet_url(**params):
+        query_params = base_params.copy()
+        for key, value in params.items():
+            if value is None:
+                query_params.pop(key, None)
+            else:
+                query_params[key] = value
+        return '?' + query_params.urlencode()
+    
+    facets = found['facets']
+    for item in facets['genre']:
+        item['url'] = facet_url(genre=item['value'])
+    for name in ('year', 'rating', 'duration'):
+        for item in facets[name]:
+            # Границы, которых нет у интервала, убираются из ссылки
+            item['url'] = facet_url(**{f'{name}_{suffix}': item.get(suffix) for suffix in MovieFilter.range_suffixes})
+    
+    has_next = page * limit < found['total']
+    return render(request, 'movie_app/search.html', {
+        'query': query,
+        'movies': movies,
+        'cards': get_render_cache().cards(movies, catalog, poster_epoch()),
+        'total': found['total'],
+        'facets': facets,
+        'active_filters': movie_filter.params,
+        'reset_url': facet_url(**{key: None for key in movie_filter.params}),
+        'next_url': facet_url(page=page + 1) if has_next else None,
+        'prev_url': facet_url(page=page - 1) if page > 1 else None,
+    })
+
+def catalog_stats(request):
+    """Статистика каталога; GET параметры фильтра считают сводку по диапазону"""
+    try:
+        movie_filter = MovieFilter.from_query(request.GET)
+    except ValueError as e:
+        if request.GET.get('format') == 'json':
+            return JsonResponse({'error': str(e)}, status=400)
+        messages.error(request, str(e))
+        movie_filter = MovieFilter()
+    
+    stats = get_catalog_stats()
+    summary = stats.summary()
+    selection = stats.aggregate(movie_filter) if movie_filter else None
+    
+    if request.GET.get('format') == 'json':
+        return JsonResponse({**summary, 'filter': movie_filter.params, 'selection': selection})
+    
+    return render(request, 'movie_app/stats.html', {
+        'stats': summary,
+        'selection': selection,
+        'active_filters': movie_filter.params,
+        'range_params': MovieFilter.range_params,
+    })
 
 def add_movie(request):
     """Добавление нового фильма"""
@@ -99,18 +256,7 @@ def add_movie(request):
         form = MovieForm(request.POST)
         if form.is_valid():
             # Создаем словарь с данными фильма
-            movie_data = {
-                'title': form.cleaned_data['title'],
-                'director': form.cleaned_data['director'],
-                'year': form.cleaned_data['year'],
-                'genre': form.cleaned_data['genre'],
-                'duration': form.cleaned_data['duration'],
-                'rating': form.cleaned_data['rating'],
-                'description': form.cleaned_data['description'],
-                'cast': form.cleaned_data['cast'],
-                'image_url': form.cleaned_data['image_url'] or '',
-                'created_at': str(timezone.now())
-            }
+            movie_data = MovieRecord.from_form(form.cleaned_data, created_at=timezone.now()).to_dict()
             
             # Сохраняем в JSON
             filename = save_movie_to_json(movie_data)
@@ -122,90 +268,211 @@ def add_movie(request):
     return render(request, 'movie_app/add_movie.html', {'form': form})
 
 def edit_movie(request, file_id):
-    """Редактирование фильма"""
-    movies = get_movies_from_json()
-    movie_to_edit = None
-    
-    # Находим фильм для редактирования
-    for movie in movies:
-        if movie.get('file_id') == file_id:
-            movie_to_edit = movie
-            break
+    """Редактирование фильма на месте: id и адрес страницы не меняются"""
+    movie_to_edit = get_catalog().get(file_id)
     
     if not movie_to_edit:
         messages.error(request, 'Фильм не найден!')
         return redirect('movie_app:movie_list')
     
+    version = movie_to_edit.get('version', 1)
+    status = 200
     if request.method == 'POST':
         form = MovieForm(request.POST)
         if form.is_valid():
-            # Удаляем старый файл
-            delete_movie_file(file_id)
-            
-            # Создаем новый с обновленными данными
-            movie_data = {
-                'title': form.cleaned_data['title'],
-                'director': form.cleaned_data['director'],
-                'year': form.cleaned_data['year'],
-                'genre': form.cleaned_data['genre'],
-                'duration': form.cleaned_data['duration'],
-                'rating': form.cleaned_data['rating'],
-                'description': form.cleaned_data['description'],
-                'cast': form.cleaned_data['cast'],
-                'image_url': form.cleaned_data['image_url'] or '',
-                'created_at': movie_to_edit.get('created_at', str(timezone.now()))
-            }
+            # Дата добавления сохраняется, остальные поля берутся из формы
+            movie_data = MovieRecord.from_form(
+                form.cleaned_data,
+                created_at=movie_to_edit.get('created_at') or timezone.now(),
+            ).to_dict()
             
-            # Сохраняем обновленный фильм
-            save_movie_to_json(movie_data)
-            messages.success(request, f'Фильм "{movie_data["title"]}" успешно обновлен!')
-            return redirect('movie_app:movie_list')
+            try:
+                update_movie_in_json(file_id, movie_data, get_expected_version(request))
+            except VersionConflict as e:
+                # Кто-то сохранил фильм раньше: показываем форму снова с новой версией
+                get_catalog().reload_file(file_id)
+                messages.error(request, 'Фильм уже изменен другим пользователем. Проверьте данные и сохраните еще раз.')
+                version = e.current_version
+                status = 409
+            else:
+                messages.success(request, f'Фильм "{movie_data["title"]}" успешно обновлен!')
+                return redirect('movie_app:movie_list')
     else:
         # Заполняем форму текущими данными
-        form = MovieForm(initial={
-            'title': movie_to_edit.get('title', ''),
-            'director': movie_to_edit.get('director', ''),
-            'year': movie_to_edit.get('year', ''),
-            'genre': movie_to_edit.get('genre', ''),
-            'duration': movie_to_edit.get('duration', ''),
-            'rating': movie_to_edit.get('rating', ''),
-            'description': movie_to_edit.get('description', ''),
-            'cast': movie_to_edit.get('cast', ''),
-            'image_url': movie_to_edit.get('image_url', ''),
-        })
+        form = MovieForm(initial=MovieRecord.from_dict(movie_to_edit).to_form_initial())
     
-    return render(request, 'movie_app/edit_movie.html', {
+    response = render(request, 'movie_app/edit_movie.html', {
         'form': form, 
         'movie': movie_to_edit,
-        'file_id': file_id
-    })
+        'file_id': file_id,
+        'version': version,
+    }, status=status)
+    if version is not None:
+        response['ETag'] = f'"{version}"'
+    return response
 
 def delete_movie(request, file_id):
     """Удаление фильма"""
-    movies = get_movies_from_json()
-    movie_to_delete = None
-    
-    # Находим фильм для удаления
-    for movie in movies:
-        if movie.get('file_id') == file_id:
-            movie_to_delete = movie
-            break
+    movie_to_delete = get_catalog().get(file_id)
     
     if not movie_to_delete:
         messages.error(request, 'Фильм не найден!')
         return redirect('movie_app:movie_list')
     
+    version = movie_to_delete.get('version', 1)
+    status = 200
     if request.method == 'POST':
-        # Удаляем файл
-        if delete_movie_file(file_id):
-            messages.success(request, f'Фильм "{movie_to_delete["title"]}" успешно удален!')
+        try:
+            deleted = delete_movie_file(file_id, get_expected_version(request))
+        except VersionConflict as e:
+            get_catalog().reload_file(file_id)
+            if e.current_version is None:
+                messages.error(request, 'Фильм уже удален!')
+                return redirect('movie_app:movie_list')
+            # Фильм изменили после открытия страницы: показываем его заново с новой версией
+            movie_to_delete = get_catalog().get(file_id) or movie_to_delete
+            messages.error(request, 'Фильм был изменен после открытия страницы. Проверьте данные и подтвердите удаление еще раз.')
+            version = e.current_version
+            status = 409
         else:
-            messages.error(request, 'Ошибка при удалении фильма!')
-        return redirect('movie_app:movie_list')
+            if deleted:
+                messages.success(request, f'Фильм "{movie_to_delete["title"]}" успешно удален!')
+            else:
+                messages.error(request, 'Ошибка при удалении фильма!')
+            return redirect('movie_app:movie_list')
     
-    return render(request, 'movie_app/delete_movie.html', {
+    response = render(request, 'movie_app/delete_movie.html', {
         'movie': movie_to_delete,
-        'file_id': file_id
+        'file_id': file_id,
+        'version': version,
+    }, status=status)
+    response['ETag'] = f'"{version}"'
+    return response
+
+BULK_ACTIONS = ('update', 'delete')
+BULK_FILTER_PARAMS = ('source', 'import_batch') + MovieFilter.text_params + tuple(
+    f'{name}_{suffix}' for name in MovieFilter.range_params for suffix in MovieFilter.range_suffixes
+)
+
+def _bulk_selection(ids, filter_params):
+    """
+    Фильмы для массовой операции: id из запроса, подходящие под фильтр.
+
+    Возвращает найденные id в порядке запроса (или каталога, если id не
+    заданы) и список запрошенных id, которых нет в каталоге.
+    """
+    exact = {name: filter_params.pop(name) for name in ('source', 'import_batch') if name in filter_params}
+    movie_filter = MovieFilter.from_query(filter_params)
+
+    def predicate(movie):
+        return all(movie.get(name) == value for name, value in exact.items()) and movie_filter(movie)
+
+    catalog = get_catalog()
+    if ids is None:
+        return [movie['file_id'] for movie in catalog.iter_movies(predicate)], []
+    found = {movie['file_id']: movie for movie in catalog.get_many(ids)}
+    matched = [file_id for file_id in ids if file_id in found and predicate(found[file_id])]
+    return matched, [file_id for file_id in ids if file_id not in found]
+
+@require_POST
+def bulk_movies(request):
+    """
+    Массовое изменение или удаление фильмов.
+
+    Тело запроса - JSON: action ('update' или 'delete'), ids - список id
+    и/или filter - параметры фильтра списка плюс source (имя загруженного
+    файла) и import_batch (партия импорта), set - новые значения полей для update, dry_run - только
+    показать, что будет затронуто. versions - id -> версия, которую видел
+    клиент: записи, измененные с тех пор, не трогаются и получают итог
+    conflict с текущей версией. Все записи меняются одним проходом по
+    хранилищу и одним обновлением индекса. В ответе итог по каждому id.
+    """
+    try:
+        payload = json.loads(request.body or b'{}')
+        if not isinstance(payload, dict):
+            raise ValueError('Ожидается JSON объект')
+    except ValueError as e:
+        return JsonResponse({'error': f'Неверный JSON: {e}'}, status=400)
+    
+    action = payload.get('action')
+    if action not in BULK_ACTIONS:
+        return JsonResponse({'error': f'action должен быть одним из: {", ".join(BULK_ACTIONS)}'}, status=400)
+    
+    ids = payload.get('ids')
+    filter_params = payload.get('filter') or {}
+    if ids is None and not filter_params:
+        # Без id и фильтра операция затронула бы весь каталог
+        return JsonResponse({'error': 'Нужен список ids или filter'}, status=400)
+    if ids is not None and not (isinstance(ids, list) and all(isinstance(file_id, str) for file_id in ids)):
+        return JsonResponse({'error': 'ids должен быть списком строк'}, status=400)
+    if not isinstance(filter_params, dict):
+        return JsonResponse({'error': 'filter должен быть объектом'}, status=400)
+    unknown = sorted(set(filter_params) - set(BULK_FILTER_PARAMS))
+    if unknown:
+        return JsonResponse({'error': f'Неизвестные параметры фильтра: {", ".join(unknown)}'}, status=400)
+    versions = payload.get('versions') or {}
+    if not (isinstance(versions, dict) and all(type(version) is int for version in versions.values())):
+        return JsonResponse({'error': 'versions должен быть объектом id -> целая версия'}, status=400)
+    
+    fields = {}
+    if action == 'update':
+        values = payload.get('set')
+        if not isinstance(values, dict) or not values:
+            return JsonResponse({'error': 'Для update нужен объект set с новыми значениями'}, status=400)
+        errors = {}
+        for name, value in values.items():
+            if name not in MovieForm.base_fields:
+                errors[name] = ['Поле нельзя изменить']
+                continue
+            # Значения проверяются теми же полями формы, что и при редактировании
+            try:
+                fields[name] = MovieForm.base_fields[name].clean(value)
+            except forms.ValidationError as e:
+                errors[name] = e.messages
+        if errors:
+            return JsonResponse({'error': 'Неверные значения полей', 'fields': errors}, status=400)
+        if 'image_url' in fields:
+            fields['image_url'] = fields['image_url'] or ''
+    
+    try:
+        matched, missing = _bulk_selection(ids, {key: str(value) for key, value in filter_params.items()})
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    
+    dry_run = bool(payload.get('dry_run'))
+    results = {file_id: {'status': 'not_found'} for file_id in missing}
+    if ids is not None:
+        # Запрошенные id, которые есть в каталоге, но не подходят под фильтр
+        matched_set = set(matched)
+        results.update(
+            (file_id, {'status': 'skipped'})
+            for file_id in ids if file_id not in matched_set and file_id not in results
+        )
+    
+    if dry_run:
+        results.update((file_id, {'status': 'matched'}) for file_id in matched)
+    elif action == 'update':
+        for file_id, version in update_movies_in_json(matched, fields, versions).items():
+            if isinstance(version, VersionConflict):
+                results[file_id] = {'status': 'conflict', 'version': version.current_version}
+            else:
+                results[file_id] = {'status': 'updated', 'version': version} if version is not None else {'status': 'not_found'}
+    else:
+        for file_id, found in delete_movie_files(matched, versions).items():
+            if isinstance(found, VersionConflict):
+                results[file_id] = {'status': 'conflict', 'version': found.current_version}
+            else:
+                results[file_id] = {'status': 'deleted' if found else 'not_found'}
+    
+    counts = {}
+    for result in results.values():
+        counts[result['status']] = counts.get(result['status'], 0) + 1
+    return JsonResponse({
+        'action': action,
+        'dry_run': dry_run,
+        'matched': len(matched),
+        'counts': counts,
+        'results': results,
     })
 
 def upload_json(request):
@@ -224,79 +491,232 @@ def upload_json(request):
             filename = fs.save(safe_name, uploaded_file)
             file_path = fs.path(filename)
             
-            # Валидируем JSON
-            is_valid, message = validate_movie_json(file_path)
+            # Проверка и импорт идут в фоне, сразу возвращаем id задачи
+            job = get_job_queue().submit(
+                file_path,
+                original_name,
+                save_movies_to_json,
+                batch_size=getattr(settings, 'MOVIE_IMPORT_BATCH_SIZE', 500),
+            )
             
-            if not is_valid:
-                # Удаляем невалидный файл
-                fs.delete(filename)
-                messages.error(request, f'Ошибка валидации: {message}')
-            else:
-                try:
-                    # Читаем данные из файла
-                    with open(file_path, 'r', encoding='utf-8') as f:
-                        movies_data = json.load(f)
-                    
-                    # Импортируем фильмы
-                    imported_count = 0
-                    for movie_data in movies_data:
-                        # Проверяем, нет ли уже такого фильма
-                        existing_movies = get_movies_from_json()
-                        is_duplicate = False
-                        
-                        for existing_movie in existing_movies:
-                            if (existing_movie['title'] == movie_data['title'] and 
-                                existing_movie['director'] == movie_data['director'] and 
-                                existing_movie['year'] == movie_data['year']):
-                                is_duplicate = True
-                                break
-                        
-                        if not is_duplicate:
-                            # Сохраняем как отдельный файл фильма
-                            movie_filename = save_movie_to_json(movie_data)
-                            imported_count += 1
-                    
-                    if imported_count > 0:
-                        messages.success(request, f'Успешно импортировано {imported_count} фильмов из {len(movies_data)}!')
-                    else:
-                        messages.warning(request, 'Все фильмы из файла уже существуют в базе')
-                    
-                except Exception as e:
-                    messages.error(request, f'Ошибка при импорте данных: {str(e)}')
+            if 'application/json' in request.headers.get('Accept', ''):
+                return JsonResponse({
+                    'job_id': job.id,
+                    'status_url': reverse('movie_app:import_status', args=[job.id]),
+                }, status=202)
             
-            return redirect('movie_app:movie_list')
+            messages.info(request, f'Файл "{original_name}" поставлен в очередь на импорт')
+            return redirect('movie_app:import_status', job_id=job.id)
     
     else:
         form = JSONUploadForm()
     
     return render(request, 'movie_app/upload_json.html', {'form': form})
 
+def import_status(request, job_id):
+    """Прогресс задачи импорта"""
+    job = get_job_queue().get(job_id)
+    
+    if job is None:
+        if request.GET.get('format') == 'json':
+            return JsonResponse({'error': 'Задача не найдена'}, status=404)
+        messages.error(request, 'Задача импорта не найдена!')
+        return redirect('movie_app:movie_list')
+    
+    job_data = job.to_dict()
+    if request.GET.get('format') == 'json':
+        return JsonResponse(job_data)
+    
+    for result in job_data['skipped']:
+        result['status_label'] = IMPORT_STATUS_LABELS[result['status']]
+    
+    return render(request, 'movie_app/import_status.html', {
+        'job': job_data,
+        'is_finished': job.is_finished,
+    })
+
+def cancel_import(request, job_id):
+    """Отмена задачи импорта"""
+    if request.method == 'POST':
+        if get_job_queue().cancel(job_id):
+            messages.success(request, 'Импорт будет остановлен')
+        else:
+            messages.error(request, 'Задача не найдена или уже завершена')
+    return redirect('movie_app:import_status', job_id=job_id)
+
+def import_batches(request):
+    """Партии импорта из манифеста, новые сверху"""
+    return JsonResponse({'batches': get_import_manifest().batches()})
+
+def import_batch(request, batch_id):
+    """Партия импорта и состояние ее записей в каталоге сейчас"""
+    manifest = get_import_manifest()
+    meta = manifest.get(batch_id)
+    if meta is None:
+        return JsonResponse({'error': 'Партия импорта не найдена'}, status=404)
+    
+    states = manifest.diff(batch_id, get_catalog())
+    counts = {}
+    for state in states.values():
+        counts[state] = counts.get(state, 0) + 1
+    return JsonResponse({**meta, 'records': len(states), 'counts': counts, 'diff': states})
+
+@require_POST
+def rollback_import(request, batch_id):
+    """
+    Откат партии импорта: удалить ее записи одним проходом по хранилищу.
+
+    Записи, измененные после импорта, остаются, если не передан force=1.
+    """
+    manifest = get_import_manifest()
+    if manifest.get(batch_id) is None:
+        return JsonResponse({'error': 'Партия импорта не найдена'}, status=404)
+    
+    force = request.POST.get('force') in ('1', 'true')
+    results = manifest.rollback(batch_id, get_catalog(), delete_movie_files, force=force)
+    counts = {}
+    for state in results.values():
+        counts[state] = counts.get(state, 0) + 1
+    return JsonResponse({'batch': batch_id, 'force': force, 'counts': counts, 'results': results})
+
+def _export_options(request):
+    """Формат, сжатие и фильтр экспорта из GET параметров"""
+    export_format = request.GET.get('format', 'pretty')
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f'Неизвестный формат экспорта: {export_format}')
+    use_gzip = request.GET.get('gzip') in ('1', 'true')
+    return export_format, use_gzip, MovieFilter.from_query(request.GET)
+
+def _export_etag(request):
+    try:
+        export_format, use_gzip, movie_filter = _export_options(request)
+    except ValueError:
+        return None
+    key = f'{get_catalog().fingerprint}|{export_format}|{use_gzip}|{movie_filter.query_string()}'
+    return hashlib.md5(key.encode('utf-8')).hexdigest()
+
+def _export_last_modified(request):
+    return get_catalog().last_modified
+
+@condition(etag_func=_export_etag, last_modified_func=_export_last_modified)
 def export_all_movies(request):
-    """Экспорт всех фильмов в один JSON файл"""
-    movies = get_movies_from_json()
-    
-    # Убираем служебные поля
-    for movie in movies:
-        movie.pop('file_id', None)
-    
-    response = HttpResponse(
-        json.dumps(movies, ensure_ascii=False, indent=2),
-        content_type='application/json'
-    )
-    response['Content-Disposition'] = 'attachment; filename="all_movies.json"'
+    """Экспорт всех фильмов в один JSON файл (потоково)"""
+    return export_response(request)
+
+def export_response(request):
+    """Потоковый ответ экспорта; общая часть sync и async представлений"""
+    try:
+        export_format, use_gzip, movie_filter = _export_options(request)
+    except ValueError as e:
+        return HttpResponseBadRequest(str(e))
+    
+    movies = get_catalog().iter_movies(movie_filter or None)
+    stream = iter_export(movies, export_format)
+    
+    if export_format == 'ndjson':
+        filename = 'all_movies.ndjson'
+        content_type = 'application/x-ndjson; charset=utf-8'
+    else:
+        filename = 'all_movies.json'
+        content_type = 'application/json; charset=utf-8'
+    
+    if use_gzip:
+        stream = gzip_stream(stream)
+        filename += '.gz'
+        content_type = 'application/gzip'
+    
+    response = StreamingHttpResponse(stream, content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
     return response
 
+def json_file_list(request):
+    """Список JSON файлов хранилища (только метаданные)"""
+    files = list_json_files()
+    for file_info in files:
+        file_info['url'] = reverse('movie_app:view_json_file', args=[file_info['name']])
+    return JsonResponse({'files': files})
+
+def _json_file_etag(request, filename):
+    stat = stat_json_file(filename)
+    return file_etag(stat) if stat else None
+
+def _json_file_last_modified(request, filename):
+    stat = stat_json_file(filename)
+    return datetime.fromtimestamp(stat.st_mtime, tz=dt_timezone.utc) if stat else None
+
+@condition(etag_func=_json_file_etag, last_modified_func=_json_file_last_modified)
 def view_json_file(request, filename):
-    """Просмотр содержимого JSON файла"""
-    file_path = os.path.join(settings.MEDIA_ROOT, 'json_files', filename)
+    """Просмотр содержимого JSON файла (потоково, с поддержкой Range и 304)"""
+    return json_file_response(request, filename)
+
+def json_file_response(request, filename):
+    """Потоковый ответ с содержимым файла; общая часть sync и async представлений"""
+    file_path = resolve_json_file(filename)
+    stat = stat_json_file(filename)
     
-    if not os.path.exists(file_path):
+    if not stat:
         return HttpResponse("Файл не найден", status=404)
     
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            content = f.read()
+        size = stat.st_size
+        range_header = request.headers.get('Range')
+        # If-Range: диапазон только от той же версии файла, иначе весь файл
+        if_range = request.headers.get('If-Range')
+        if if_range and if_range not in (quote_etag(file_etag(stat)), http_date(stat.st_mtime)):
+            range_header = None
+        byte_range = parse_range(range_header, size)
+        
+        if byte_range is False:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+        
+        if byte_range is None:
+            start, end = 0, size - 1
+            status = 200
+        else:
+            start, end = byte_range
+            status = 206
         
-        return HttpResponse(f"<pre>{content}</pre><br><a href='/'>Назад</a>")
-    except Exception as e:
-        return HttpResponse(f"Ошибка при чтении файла: {str(e)}", status=500)
\ No newline at end of file
+        length = max(end - start + 1, 0)
+        response = StreamingHttpResponse(
+            iter_file_range(file_path, start, length),
+            content_type='application/json; charset=utf-8',
+            status=status,
+        )
+        response['Content-Length'] = str(length)
+        response['Accept-Ranges'] = 'bytes'
+        if status == 206:
+            response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        return response
+    except OSError as e:
+        return HttpResponse(f"Ошибка при чтении файла: {str(e)}", status=500)
+
+def render_cache_stats(request):
+    """Счетчики кеша карточек и страниц текущего процесса"""
+    return JsonResponse(get_render_cache().stats())
+
+def prometheus_metrics(request):
+    """Метрики запросов текущего процесса в текстовом формате Prometheus"""
+    return HttpResponse(get_registry().render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+def _poster_etag(request, name):
+    return name.split('.')[0]
+
+@condition(etag_func=_poster_etag)
+def poster(request, name):
+    """
+    Миниатюра постера из локального кеша.
+
+    Имя - хеш содержимого, файл по нему не меняется, поэтому ответ
+    кешируется браузером и прокси без перепроверки.
+    """
+    cache = get_poster_cache()
+    path = cache.path(name) if cache is not None else None
+    if path is None or not os.path.exists(path):
+        return HttpResponse("Постер не найден", status=404)
+    cache.touch(name)
+    response = FileResponse(open(path, 'rb'), content_type=POSTER_CONTENT_TYPE)
+    max_age = getattr(settings, 'MOVIE_POSTER_MAX_AGE', 365 * 24 * 3600)
+    response['Cache-Control'] = f'public, max-age={max_age}, immutable'
+    return response
@@ -20,6 +20,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'movie_app.middleware.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -33,7 +34,8 @@ ROOT_URLCONF = 'movie_project.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # Стандартный движок с замером времени рендеринга для метрик запроса
+        'BACKEND': 'movie_app.utils.templates.DjangoTemplates',
         'DIRS': [BASE_DIR / 'templates'],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -49,6 +51,13 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'movie_project.wsgi.application'
 
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'db.sqlite3',
+    }
+}
+
 LANGUAGE_CODE = 'ru-ru'
 TIME_ZONE = 'Europe/Moscow'
 USE_I18N = True
@@ -58,8 +67,143 @@ STATIC_URL = '/static/'
 STATICFILES_DIRS = [
     BASE_DIR / "static",
 ]
+# collectstatic кладет файлы с хешем содержимого в имени (css/brutal.<hash>.css),
+# {% static %} ссылается на них при DEBUG = False. Статику отдает прокси, а не
+# Django, поэтому долгий Cache-Control для файлов с хешем задается в нем, например nginx:
+#
+#     location /static/ {
+#         alias /path/to/staticfiles/;
+#         location ~ "\.[0-9a-f]{12}\.\w+$" {
+#             add_header Cache-Control "public, max-age=31536000, immutable";
+#         }
+#     }
+STATIC_ROOT = BASE_DIR / 'staticfiles'
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'movie_app.utils.staticfiles.HashedStaticFilesStorage',
+    },
+}
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
-DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
\ No newline at end of file
+DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Как часто (в секундах) индекс каталога делает полную сверку mtime файлов,
+# даже если mtime каталога json_files не менялся
+MOVIE_CATALOG_RESCAN_INTERVAL = 60
+
+# Количество фильмов на одной странице списка
+MOVIE_LIST_PAGE_SIZE = 20
+
+# Размер пачки записей при импорте загруженного файла
+MOVIE_IMPORT_BATCH_SIZE = 500
+
+# Загрузки больше 256 КБ Django пишет во временный файл, а не держит в памяти
+# (по умолчанию порог 2.5 МБ); сохранение такой загрузки - перенос файла, а не
+# копирование, и импорт затем читает его с диска потоково
+FILE_UPLOAD_MAX_MEMORY_SIZE = 256 * 1024
+
+# Фоновый импорт: число потоков и сколько завершенных задач хранить в памяти
+MOVIE_IMPORT_WORKERS = 2
+MOVIE_IMPORT_JOBS_KEEP = 100
+
+# Удалять загруженный файл после завершения или отмены импорта. По умолчанию
+# файл остается в json_files: он виден в списке файлов, отдается по /json/ и
+# указан в манифесте как source партии
+MOVIE_IMPORT_DELETE_UPLOADS = False
+
+# Манифест импортов: на каждую загрузку описание и список id созданных записей.
+# По нему партию можно посмотреть, сравнить с каталогом и откатить
+# (/imports/<id>/, python manage.py import_batches). None - MEDIA_ROOT/imports
+MOVIE_IMPORT_MANIFEST_DIR = None
+
+# Хранилище фильмов: 'database' (модель Movie), 'files' (файл movie_<id>.json
+# на фильм), 'segment' (журнал movies.log с индексом смещений) или путь к
+# классу MovieStorage. Перенос данных: python manage.py convert_movie_storage.
+# Фильмы из json_files переносит в таблицу миграция 0006 при migrate,
+# повторно сверить таблицу с файлами: python manage.py backfill_movie_table
+MOVIE_STORAGE_BACKEND = 'database'
+MOVIE_STORAGE_OPTIONS = {}
+
+# Необязательный режим совместимости: дублировать записи базы в файлы
+# json_files/movie_<id>.json (их раздает /json/). False - писать только в таблицу
+MOVIE_JSON_DUAL_WRITE = True
+
+# Кеш отрендеренных карточек и страниц списка. По умолчанию LRU в памяти
+# процесса; общий для нескольких процессов вариант - файловый кеш:
+#   'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+#   'LOCATION': BASE_DIR / 'cache',
+# MAX_ENTRIES ограничивает число записей, при переполнении удаляется
+# 1/CULL_FREQUENCY самых старых. MOVIE_RENDER_CACHE = None отключает кеш.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'movies': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'movie-render',
+        'TIMEOUT': 3600,
+        'OPTIONS': {
+            'MAX_ENTRIES': 5000,
+            'CULL_FREQUENCY': 10,
+        },
+    },
+}
+MOVIE_RENDER_CACHE = 'movies'
+
+# Async представления списка, экспорта, просмотра файла и загрузки.
+# asgi.py включает их через переменную окружения MOVIE_ASYNC_VIEWS=1;
+# блокирующий ввод-вывод выполняется в пуле из MOVIE_ASYNC_IO_WORKERS потоков.
+# Сравнение с sync версиями: python manage.py load_test_views
+MOVIE_ASYNC_VIEWS = os.environ.get('MOVIE_ASYNC_VIEWS', '') in ('1', 'true')
+MOVIE_ASYNC_IO_WORKERS = 8
+
+# Холодная загрузка каталога из файлов: от MOVIE_PARALLEL_LOAD_MIN файлов
+# чтение и разбор идут кусками в пуле. executor: 'thread' или 'process'.
+# Если установлен orjson, JSON разбирается им. Отчет по фазам:
+# python manage.py load_catalog
+MOVIE_PARALLEL_LOAD_MIN = 1000
+MOVIE_PARALLEL_LOADER = {
+    'workers': None,
+    'shard_size': 1000,
+    'executor': 'thread',
+}
+
+# Метрики запросов: заголовок Server-Timing и /metrics/ в формате Prometheus.
+# При MOVIE_PROFILING запрос с ?profile=1 возвращает отчет cProfile вместо
+# ответа; MOVIE_PROFILE_SAMPLE_RATE - доля запросов, профиль которых
+# сохраняется в MOVIE_PROFILE_DIR (None - MEDIA_ROOT/profiles) для snakeviz/pstats.
+# Профилируются только запросы через WSGI, под ASGI ?profile=1 отвечает 400
+MOVIE_PROFILING = DEBUG
+MOVIE_PROFILE_SAMPLE_RATE = 0
+MOVIE_PROFILE_DIR = None
+
+# Надежность записи файлов фильмов и журнала: 'none' - временный файл и
+# атомарное переименование без fsync (быстро, но последние записи могут
+# пропасть при сбое питания), 'batch' - один fsync каталога на группу записей
+# (пачку импорта), 'each' - fsync после каждого файла
+MOVIE_FSYNC = 'batch'
+
+# Локальные миниатюры постеров: image_url загружается один раз при добавлении,
+# изменении и импорте фильма, миниатюра в JPEG не больше size хранится в
+# MOVIE_POSTER_DIR (None - MEDIA_ROOT/posters) под хешем содержимого и отдается
+# с Cache-Control на MOVIE_POSTER_MAX_AGE секунд. max_bytes - место под кеш,
+# сверх него удаляются давно не показанные постеры. Нужен Pillow (есть в
+# requirements.txt); без него manage.py check предупреждает, а карточки
+# показывают исходные адреса.
+# MOVIE_POSTER_FETCHER: 'http', 'local' (каталог root вместо сети, для тестов),
+# путь к своему классу или None - постеры берутся прямо с исходных адресов.
+# Загрузить постеры уже добавленных фильмов: python manage.py fetch_posters
+MOVIE_POSTER_FETCHER = 'http'
+MOVIE_POSTER_FETCHER_OPTIONS = {'timeout': 5, 'max_bytes': 5 * 1024 * 1024}
+MOVIE_POSTER_OPTIONS = {
+    'size': (300, 450),
+    'max_bytes': 200 * 1024 * 1024,
+    'workers': 2,
+}
+MOVIE_POSTER_DIR = None
+MOVIE_POSTER_MAX_AGE = 365 * 24 * 3600